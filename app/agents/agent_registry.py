@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from langchain_openai import ChatOpenAI
+
+from app.agents.chat_agent.chat_agent import ChatAgent
+from app.agents.fused_routing_agent.fused_routing_agent import FusedRoutingAgent
+from app.agents.router_agent.router_agent import RouterAgent
+from app.agents.summary_agent.summary_agent import SummaryAgent
+from app.agents.tool_orchestration_agent.tool_orchestration_agent import ToolOrchestrationAgent
+from app.agents.tool_refinement_agent.tool_refinement_agent import ToolRefinementAgent
+from app.utils.prompt_layout import describe_prefix
+from common.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+class AgentRegistry:
+    """
+    Builds every agent once per process: prompt templates, output parsers with their rendered
+    format instructions, the streaming model client and the compiled tool orchestration graph.
+    None of them hold per-request state, so the same instances are shared by all requests.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._warmed_up: bool = False
+        self._warm_up_seconds: Optional[float] = None
+        self._router_agent: Optional[RouterAgent] = None
+        self._fused_routing_agent: Optional[FusedRoutingAgent] = None
+        self._tool_orchestration_agent: Optional[ToolOrchestrationAgent] = None
+        self._tool_refinement_agent: Optional[ToolRefinementAgent] = None
+        self._chat_agent: Optional[ChatAgent] = None
+        self._summary_agent: Optional[SummaryAgent] = None
+        self._streaming_llm: Optional[ChatOpenAI] = None
+        # ToolOrchestrationGraph; its module imports this one, so it is built lazily in warm_up.
+        self._tool_orchestration_graph: Optional[Any] = None
+
+    def warm_up(self) -> None:
+        if self._warmed_up:
+            return
+
+        with self._lock:
+            if self._warmed_up:
+                return
+
+            started_at = time.perf_counter()
+
+            try:
+                from app.agents.streaming_agent.streaming_agent import build_streaming_llm
+                from app.graph.tool_orchestration_graph import ToolOrchestrationGraph
+
+                self._router_agent = RouterAgent()
+                self._fused_routing_agent = FusedRoutingAgent()
+                self._tool_orchestration_agent = ToolOrchestrationAgent()
+                self._tool_refinement_agent = ToolRefinementAgent()
+                self._chat_agent = ChatAgent()
+                self._summary_agent = SummaryAgent()
+                self._streaming_llm = build_streaming_llm()
+                self._tool_orchestration_graph = ToolOrchestrationGraph()
+            except Exception as e:
+                logger.error(f"Failed to warm up agent registry: {e}")
+                raise
+
+            self._warm_up_seconds = time.perf_counter() - started_at
+            self._warmed_up = True
+
+        metrics.observe("agent_registry_warm_up_seconds", self._warm_up_seconds)
+        logger.info(f"Agent registry warmed up in {self._warm_up_seconds * 1000:.1f}ms")
+
+    @property
+    def router_agent(self) -> RouterAgent:
+        self.warm_up()
+        return self._router_agent
+
+    @property
+    def fused_routing_agent(self) -> FusedRoutingAgent:
+        self.warm_up()
+        return self._fused_routing_agent
+
+    @property
+    def tool_orchestration_agent(self) -> ToolOrchestrationAgent:
+        self.warm_up()
+        return self._tool_orchestration_agent
+
+    @property
+    def tool_refinement_agent(self) -> ToolRefinementAgent:
+        self.warm_up()
+        return self._tool_refinement_agent
+
+    @property
+    def chat_agent(self) -> ChatAgent:
+        self.warm_up()
+        return self._chat_agent
+
+    @property
+    def summary_agent(self) -> SummaryAgent:
+        self.warm_up()
+        return self._summary_agent
+
+    @property
+    def tool_orchestration_graph(self) -> Any:
+        self.warm_up()
+        return self._tool_orchestration_graph
+
+    def get_streaming_llm(self) -> ChatOpenAI:
+        self.warm_up()
+        return self._streaming_llm
+
+    def is_warmed_up(self) -> bool:
+        return self._warmed_up
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "warmed_up": self._warmed_up,
+            "warm_up_ms": round(self._warm_up_seconds * 1000, 3) if self._warm_up_seconds is not None else None,
+            "streaming_model": self._streaming_llm.model_name if self._streaming_llm is not None else None,
+            "prompt_prefixes": self._prompt_prefixes() if self._warmed_up else {},
+        }
+
+    def _prompt_prefixes(self) -> Dict[str, Any]:
+        """Static prefix size and hash per structured-output prompt; a changing hash means a broken cache."""
+        return {
+            "router_agent": describe_prefix(self._router_agent.router_prompt),
+            "fused_routing_agent": describe_prefix(self._fused_routing_agent.prompt),
+            "tool_orchestration_agent": describe_prefix(self._tool_orchestration_agent.prompt),
+            "tool_orchestration_agent_function_calling": describe_prefix(self._tool_orchestration_agent.function_calling_prompt),
+            "tool_refinement_agent": describe_prefix(self._tool_refinement_agent.prompt),
+            "tool_refinement_agent_batch": describe_prefix(self._tool_refinement_agent.batch_prompt),
+        }
+
+
+agent_registry = AgentRegistry()
@@ -0,0 +1,117 @@
+import logging
+
+from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+from app.agents.fused_routing_agent.fused_routing_prompts import AGENT_ROLE, EXAMPLES, OUTPUT_REQUIREMENTS
+from app.agents.router_agent.router_prompts import ROUTING_RULES
+from app.agents.tool_orchestration_agent.tool_orchestration_prompts import STRICT_TOOL_RULES, TOOL_SELECTION_RULES, \
+    STRICT_RULES
+from app.caches.conversation_store import ConversationSession
+from app.configs.app_config import config
+from app.schemas.fused_routing_decision import FusedRoutingDecision
+from app.utils.prompt_layout import build_prefix_stable_prompt
+from app.schemas.tool_summaries import ToolsSummaryByServer
+from common.utils.agent_utils import Utils
+from common.utils.model_cascade import model_cascade
+from common.utils.prompt_budget import prompt_budget, BudgetedPrompt
+from common.utils.tool_util import find_invocation_errors
+
+logger = logging.getLogger(__name__)
+
+
+class FusedRoutingAgent:
+    """Routes a message and, for tool turns, plans the tool invocations in the same LLM call."""
+
+    def __init__(self) -> None:
+        self.parser = PydanticOutputParser(pydantic_object=FusedRoutingDecision)
+        self.prompt = self.build_prompt()
+
+    def build_prompt(self) -> ChatPromptTemplate:
+        return build_prefix_stable_prompt(
+            static_sections=[
+                AGENT_ROLE,
+                ROUTING_RULES,
+                STRICT_TOOL_RULES,
+                TOOL_SELECTION_RULES,
+                STRICT_RULES,
+                EXAMPLES,
+                OUTPUT_REQUIREMENTS,
+                "Always return a valid JSON object:\n{format_instructions}"
+            ],
+            dynamic_sections=[
+                (
+                    "**Tool reference:** Here is the list of available tools, including the parameter names and types.\n"
+                    "You MUST use the parameter names and types exactly as shown for each tool:",
+                    "available_tools"
+                ),
+                ("**Conversation Context:**\n- Chat history:", "chat_history")
+            ],
+            trailing_messages=[
+                ("placeholder", "{chat_history}"),
+                ("human", "{query}"),
+                ("placeholder", "{agent_scratchpad}")
+            ],
+            format_instructions=self.parser.get_format_instructions()
+        )
+
+    @staticmethod
+    def _find_plan_errors(decision: FusedRoutingDecision, tool_summaries: ToolsSummaryByServer | None) -> str | None:
+        if decision.mode == "chat":
+            return None
+        if not decision.tools:
+            return "empty_plan"
+        return find_invocation_errors(decision.tools, tool_summaries) if tool_summaries else None
+
+    async def route_and_plan(
+            self,
+            user_input: str,
+            tool_summaries_str: str,
+            conversation_session: ConversationSession,
+            tool_summaries: ToolsSummaryByServer | None = None,
+    ) -> FusedRoutingDecision:
+        logger.info("Invoking fused routing agent with user input: %s", user_input)
+
+        chat_history = conversation_session.get_last_n_messages(n=config.ROUTER_HISTORY_WINDOW)
+
+        budgeted: BudgetedPrompt = prompt_budget.fit(
+            agent_name="fused_routing_agent",
+            chat_history=chat_history,
+            available_tools=tool_summaries_str
+        )
+
+        utils = Utils[FusedRoutingDecision]
+
+        result: FusedRoutingDecision | None = await model_cascade.run(
+            agent_name="fused_routing_agent",
+            default_model="gpt-4o-mini",
+            llm_params={
+                "temperature": 0.0,
+                "max_tokens": 2000,
+                "model_kwargs": {"response_format": {"type": "json_object"}}
+            },
+            call=lambda llm: utils.arun_agent_query(
+                llm=llm,
+                tools=[],
+                query=user_input,
+                parser=self.parser,
+                prompt=self.prompt,
+                chat_history=budgeted.chat_history,
+                available_tools=budgeted.available_tools,
+                allowed_tool_names=None,
+                previous_result=None,
+                agent_name="fused_routing_agent"
+            ),
+            validate=lambda decision: self._find_plan_errors(decision, tool_summaries)
+        )
+
+        if not result:
+            raise Exception("Could not route")
+
+        if result.mode == "tools" and not result.tools:
+            logger.warning("Fused routing agent chose tools without a plan, falling back to chat.")
+            return FusedRoutingDecision(mode="chat", tools=[])
+
+        logger.info(f"Fused routing decision: {result}")
+
+        return result
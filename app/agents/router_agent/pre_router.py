@@ -0,0 +1,232 @@
+import hashlib
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import FrozenSet, Optional, Set
+
+from pydantic import BaseModel
+
+from app.configs.app_config import config
+from app.schemas.router_decision import RouterDecision
+from app.schemas.tool_summaries import ToolsSummaryByServer
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"[a-z0-9]+")
+_CAMEL_BOUNDARY = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+_TICKER = re.compile(r"\b[A-Z]{2,5}\b")
+_CASHTAG = re.compile(r"\$[A-Z]{1,5}\b")
+# Uppercase words (USA, API, PDF) only read as tickers next to market vocabulary.
+_TICKER_CONTEXT = re.compile(
+    r"\b(stocks?|shares?|prices?|quotes?|tickers?|market|trading|earnings|dividends?|valuation|nasdaq|nyse)\b",
+    re.IGNORECASE
+)
+_URL = re.compile(r"https?://\S+")
+
+# Looked for near the end of the previous assistant turn: "Shall I send the email?"
+QUESTION_TAIL_CHARS = 200
+
+SMALL_TALK_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in (
+        r"^(hi|hello|hey|yo|hiya|howdy|greetings)( there)?\W*$",
+        r"^good (morning|afternoon|evening|night)\W*$",
+        r"^(thanks|thank you|thx|ty|cheers)( so much| a lot)?\W*$",
+        r"^(ok|okay|cool|great|nice|awesome|perfect|got it|sounds good)\W*$",
+        r"^(bye|goodbye|see you|see ya|later)\W*$",
+        r"^how are you( doing)?( today)?\W*$",
+        r"^(who|what) are you\W*$",
+        r"\b(tell|give) me a (joke|riddle|fun fact)\b",
+        r"^write (me )?a (poem|haiku|story|limerick)\b",
+    )
+]
+
+STOP_WORDS: FrozenSet[str] = frozenset(
+    "a an and are as at be by can could do does for from get give have how i in info information "
+    "is it me my of on or please show tell that the this to use using want what when where which "
+    "who why will with would you your".split()
+)
+
+ACTION_WORDS: FrozenSet[str] = frozenset(
+    "send add update create delete remove list search find lookup look fetch email message notify "
+    "calculate compute research post schedule book insert write save upload download query".split()
+)
+
+GENERIC_TOOL_TERMS: FrozenSet[str] = frozenset("tool tools server result results return returns data".split())
+
+
+class PreRouterResult(BaseModel):
+    decision: Optional[RouterDecision] = None
+    confidence: float = 0.0
+    reason: str = ""
+
+
+class ToolVocabulary(BaseModel):
+    tool_names: Set[str]
+    # Names with `_`, `-` or camelCase (send_email, getWeather) that cannot be ordinary words.
+    compound_tool_names: Set[str]
+    terms: Set[str]
+    parameter_names: Set[str]
+
+
+class PreRouter:
+    """
+    Zero-LLM lexical router that settles obvious chat vs tool messages.
+
+    Tool vocabulary (tool names, description words, parameter names) is matched against the
+    user input alongside a list of small-talk patterns. Anything it is not confident about is
+    left for RouterAgent.
+    """
+
+    def __init__(self, confidence_threshold: float, max_cached_catalogs: int = 256) -> None:
+        self.confidence_threshold = confidence_threshold
+        self._max_cached_catalogs = max_cached_catalogs
+        self._lock = threading.Lock()
+        self._vocabularies: OrderedDict[str, ToolVocabulary] = OrderedDict()
+
+    def route(
+            self,
+            user_input: str,
+            tool_summaries: ToolsSummaryByServer,
+            tool_summaries_str: str,
+            last_assistant_message: str = ""
+    ) -> Optional[RouterDecision]:
+        """Return a decision when the classifier clears the confidence threshold, else None."""
+        result = self.classify(user_input, tool_summaries, tool_summaries_str, last_assistant_message)
+
+        if result.decision is not None and result.confidence >= self.confidence_threshold:
+            return result.decision
+
+        return None
+
+    def classify(
+            self,
+            user_input: str,
+            tool_summaries: ToolsSummaryByServer,
+            tool_summaries_str: str,
+            last_assistant_message: str = ""
+    ) -> PreRouterResult:
+        text = user_input.strip()
+        if not text:
+            return PreRouterResult(decision=RouterDecision(use_tools=False), confidence=1.0, reason="empty")
+
+        vocabulary = self._get_vocabulary(tool_summaries, tool_summaries_str)
+
+        if not vocabulary.tool_names:
+            return PreRouterResult(decision=RouterDecision(use_tools=False), confidence=1.0, reason="no_tools")
+
+        words = self._tokenize(text)
+
+        lowered = text.lower()
+        if any(name in lowered for name in vocabulary.compound_tool_names):
+            return PreRouterResult(decision=RouterDecision(use_tools=True), confidence=0.95, reason="tool_name")
+
+        content_words = words - STOP_WORDS
+        # A single-word tool name ("search", "weather") is also an ordinary word, so it only settles
+        # the turn next to a separate action word; on its own it counts as overlap.
+        named = words & (vocabulary.tool_names - vocabulary.compound_tool_names)
+        overlap = (content_words & (vocabulary.terms | vocabulary.parameter_names)) | named
+        has_action = bool((content_words - named) & ACTION_WORDS)
+
+        if named and has_action:
+            return PreRouterResult(decision=RouterDecision(use_tools=True), confidence=0.95, reason="tool_name_action")
+
+        if self._matches_parameter_shape(text, vocabulary):
+            return PreRouterResult(decision=RouterDecision(use_tools=True), confidence=0.9, reason="parameter_shape")
+
+        if not overlap and len(content_words) <= 3 and "?" in last_assistant_message.rstrip()[-QUESTION_TAIL_CHARS:]:
+            # "ok", "sure", "do it" answering "Shall I send the email?" confirms a tool action the
+            # pre-router cannot see; only the router, which reads the history, can tell.
+            return PreRouterResult(reason="answers_question")
+
+        if any(pattern.search(text) for pattern in SMALL_TALK_PATTERNS) and not overlap:
+            return PreRouterResult(decision=RouterDecision(use_tools=False), confidence=0.95, reason="small_talk")
+
+        if len(overlap) >= 2 and has_action:
+            return PreRouterResult(decision=RouterDecision(use_tools=True), confidence=0.9, reason="action_overlap")
+
+        if len(overlap) >= 2:
+            return PreRouterResult(decision=RouterDecision(use_tools=True), confidence=0.75, reason="term_overlap")
+
+        if overlap:
+            return PreRouterResult(decision=RouterDecision(use_tools=True), confidence=0.55, reason="weak_overlap")
+
+        if len(content_words) <= 3 and not has_action:
+            return PreRouterResult(decision=RouterDecision(use_tools=False), confidence=0.8, reason="short_no_overlap")
+
+        return PreRouterResult(decision=RouterDecision(use_tools=False), confidence=0.5, reason="no_overlap")
+
+    @staticmethod
+    def _tokenize(text: str) -> Set[str]:
+        spaced = _CAMEL_BOUNDARY.sub(" ", text).replace("_", " ").replace("-", " ")
+        words = set(_WORD.findall(spaced.lower()))
+        # Cheap plural folding so "emails" matches "email" without a stemmer.
+        return words | {word[:-1] for word in words if len(word) > 3 and word.endswith("s")}
+
+    @staticmethod
+    def _matches_parameter_shape(text: str, vocabulary: ToolVocabulary) -> bool:
+        params = vocabulary.parameter_names | vocabulary.terms
+
+        if _EMAIL.search(text) and ({"email", "mail", "recipient"} & params):
+            return True
+
+        if _URL.search(text) and ({"url", "link", "website", "page"} & params):
+            return True
+
+        if "ticker" in params and (
+                _CASHTAG.search(text)
+                or (_TICKER_CONTEXT.search(text) and any(token not in {"I", "OK", "AI"} for token in _TICKER.findall(text)))
+        ):
+            return True
+
+        return False
+
+    def _get_vocabulary(self, tool_summaries: ToolsSummaryByServer, tool_summaries_str: str) -> ToolVocabulary:
+        key = hashlib.sha1(tool_summaries_str.encode("utf-8")).hexdigest()
+
+        with self._lock:
+            vocabulary = self._vocabularies.get(key)
+            if vocabulary is not None:
+                self._vocabularies.move_to_end(key)
+                return vocabulary
+
+        vocabulary = self._build_vocabulary(tool_summaries)
+
+        with self._lock:
+            self._vocabularies[key] = vocabulary
+            while len(self._vocabularies) > self._max_cached_catalogs:
+                self._vocabularies.popitem(last=False)
+
+        return vocabulary
+
+    def _build_vocabulary(self, tool_summaries: ToolsSummaryByServer) -> ToolVocabulary:
+        tool_names: Set[str] = set()
+        compound_tool_names: Set[str] = set()
+        terms: Set[str] = set()
+        parameter_names: Set[str] = set()
+
+        for tools in tool_summaries.servers.values():
+            for tool in tools:
+                if tool.tool_name:
+                    tool_names.add(tool.tool_name.lower())
+                    if "_" in tool.tool_name or "-" in tool.tool_name or _CAMEL_BOUNDARY.search(tool.tool_name):
+                        compound_tool_names.add(tool.tool_name.lower())
+                    terms |= self._tokenize(tool.tool_name)
+                if tool.description:
+                    terms |= self._tokenize(tool.description)
+                for parameter in tool.parameters:
+                    parameter_names |= self._tokenize(parameter.param_name)
+
+        terms = {term for term in terms - STOP_WORDS - GENERIC_TOOL_TERMS if len(term) > 2}
+
+        return ToolVocabulary(
+            tool_names=tool_names,
+            compound_tool_names=compound_tool_names,
+            terms=terms,
+            parameter_names=parameter_names - STOP_WORDS
+        )
+
+
+pre_router = PreRouter(confidence_threshold=config.PRE_ROUTER_CONFIDENCE_THRESHOLD)
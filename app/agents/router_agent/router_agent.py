@@ -2,13 +2,17 @@ import logging
 
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
 
 from app.agents.router_agent.router_prompts import AGENT_ROLE, ROUTING_RULES, EXAMPLES
 from app.caches.conversation_store import ConversationSession
+from app.caches.router_decision_cache import router_decision_cache
+from app.configs.app_config import config
 from app.schemas.router_decision import RouterDecision
 from common.utils.agent_utils import Utils
+from common.utils.model_cascade import model_cascade
+from common.utils.prompt_budget import prompt_budget, BudgetedPrompt
 from app.utils.chat_util import chat_history_to_str
+from app.utils.prompt_layout import build_prefix_stable_prompt
 
 logger = logging.getLogger(__name__)
 
@@ -19,34 +23,42 @@ class RouterAgent:
         self.router_prompt = self.build_router_prompt()
 
     def build_router_prompt(self) -> ChatPromptTemplate:
-        return ChatPromptTemplate.from_messages(
-            [
-                (
-                    "system",
-                    f"""
-                    {AGENT_ROLE}
-                    
-                    Here is the list of available tools:
-                    {{available_tools}}
-                    
-                    Context available to you:
-                    {{chat_history}}
-                    
-                    {ROUTING_RULES}
-                    
-                    {EXAMPLES}
-                    
-                    Always return a valid JSON object:
-                    {{format_instructions}}
-                    """
-                ),
+        return build_prefix_stable_prompt(
+            static_sections=[
+                AGENT_ROLE,
+                ROUTING_RULES,
+                EXAMPLES,
+                "Always return a valid JSON object:\n{format_instructions}"
+            ],
+            dynamic_sections=[
+                ("Here is the list of available tools:", "available_tools"),
+                ("Context available to you:", "chat_history")
+            ],
+            trailing_messages=[
                 ("human", "{query}"),
                 ("placeholder", "{chat_history}"),
                 ("placeholder", "{agent_scratchpad}")
-            ]
-        ).partial(format_instructions=self.parser.get_format_instructions())
+            ],
+            format_instructions=self.parser.get_format_instructions()
+        )
+
+    @staticmethod
+    def _llm_params() -> dict:
+        params = {
+            "model": "gpt-4o-mini",
+            "temperature": 0.8,
+            "model_kwargs": {"response_format": {"type": "json_object"}}
+        }
+
+        # Deterministic routing pins sampling so identical inputs route identically,
+        # which is what makes cached decisions safe to reuse.
+        if config.ROUTER_DETERMINISTIC:
+            params["temperature"] = 0.0
+            params["seed"] = 0
 
-    def handle_router_decision(
+        return params
+
+    async def handle_router_decision(
             self,
             user_input: str,
             tool_summaries_str: str,
@@ -54,31 +66,51 @@ class RouterAgent:
     ) -> RouterDecision:
         logger.debug(f"Inside router Agent UserInput: {user_input}")
         logger.debug(f"tool_summaries_str: {tool_summaries_str}")
-        chat_history = conversation_session.get_last_n_messages(n=10)
+        chat_history = conversation_session.get_last_n_messages(n=config.ROUTER_HISTORY_WINDOW)
+
+        use_cache = config.ROUTER_CACHE_ENABLED and config.ROUTER_DETERMINISTIC
+        cache_key = router_decision_cache.build_key(user_input, chat_history, tool_summaries_str)
+
+        if use_cache:
+            cached: RouterDecision | None = await router_decision_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Router decision cache hit: {cached}")
+                return cached
 
-        llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=0.8,
-            model_kwargs={"response_format": {"type": "json_object"}}
+        budgeted: BudgetedPrompt = prompt_budget.fit(
+            agent_name="router_agent",
+            chat_history=chat_history,
+            available_tools=tool_summaries_str
         )
 
-        utils = Utils[RouterDecision]
+        llm_params = self._llm_params()
+        default_model = llm_params.pop("model")
 
+        utils = Utils[RouterDecision]
 
-        result: RouterDecision = utils.run_agent_query(
-            llm=llm,
-            tools=[],
-            query=user_input,
-            parser=self.parser,
-            prompt=self.router_prompt,
-            chat_history=chat_history,
-            available_tools=tool_summaries_str,
-            allowed_tool_names=None,
-            previous_result = None
+        result: RouterDecision = await model_cascade.run(
+            agent_name="router_agent",
+            default_model=default_model,
+            llm_params=llm_params,
+            call=lambda llm: utils.arun_agent_query(
+                llm=llm,
+                tools=[],
+                query=user_input,
+                parser=self.parser,
+                prompt=self.router_prompt,
+                chat_history=budgeted.chat_history,
+                available_tools=budgeted.available_tools,
+                allowed_tool_names=None,
+                previous_result=None,
+                agent_name="router_agent"
+            )
         )
         if not result:
             raise Exception("Could not route")
 
+        if use_cache:
+            await router_decision_cache.set(cache_key, result)
+
         logger.info(f"Router decision result: {result}")
 
         return result
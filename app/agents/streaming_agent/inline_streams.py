@@ -0,0 +1,125 @@
+import asyncio
+import json
+import logging
+from typing import Any, AsyncIterator, Coroutine, Dict, Optional
+
+from common.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_CLOSED = object()
+
+
+class InlineStreamHub:
+    """
+    In-process hand-off of frames from answers streamed inside the backend to the websocket
+    forwarder of the same request, so they skip the Celery broker and the Redis stream read.
+    A channel is opened when the answer is dispatched, so frames published before the forwarder
+    attaches are buffered rather than lost. Only used from the event loop.
+
+    The channel lives as long as its answer: it is dropped grace_seconds after the task finishes
+    if no forwarder drained it, and an answer whose forwarder left early, or whose buffer fills up
+    because nothing reads it, is cancelled.
+    """
+
+    def __init__(self, max_buffered_frames: int = 4096, grace_seconds: float = 30.0):
+        self.max_buffered_frames = max_buffered_frames
+        self.grace_seconds = grace_seconds
+        self._queues: Dict[str, asyncio.Queue] = {}
+        # Strong references: the loop only keeps weak ones to running tasks.
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def start(self, channel: str, coro: Coroutine[Any, Any, Any]) -> asyncio.Task:
+        """Opens the channel and runs the answer's coroutine as a task of this process."""
+        queue = asyncio.Queue(maxsize=self.max_buffered_frames)
+        self._queues[channel] = queue
+        task = asyncio.create_task(coro)
+        self._tasks[channel] = task
+        task.add_done_callback(lambda _: self._finished(channel, queue))
+        return task
+
+    @property
+    def running(self) -> int:
+        return len(self._tasks)
+
+    def publish(self, channel: str, frame: Dict[str, Any]) -> None:
+        self._put(channel, frame)
+
+    def close(self, channel: str) -> None:
+        """Marks the end of the answer; the forwarder drains what is queued, then stops."""
+        self._put(channel, _CLOSED)
+
+    def discard(self, channel: str) -> None:
+        self._queues.pop(channel, None)
+
+    def abandon(self, channel: str) -> None:
+        """Drops the channel and cancels its answer, which nobody will read any more."""
+        self.discard(channel)
+        task = self._tasks.get(channel)
+        if task is not None and not task.done():
+            metrics.increment("inline_stream_abandoned_total")
+            task.cancel()
+
+    def _put(self, channel: str, item: Any) -> None:
+        queue = self._queues.get(channel)
+        if queue is None:
+            return
+
+        try:
+            queue.put_nowait(item)
+        except asyncio.QueueFull:
+            logger.warning(f"Inline stream {channel} has {self.max_buffered_frames} unread frames, abandoning it")
+            self.abandon(channel)
+
+    def _finished(self, channel: str, queue: asyncio.Queue) -> None:
+        self._tasks.pop(channel, None)
+        # A forwarder that attaches late still gets the buffered frames; one that never attaches
+        # must not leave them here.
+        asyncio.get_running_loop().call_later(self.grace_seconds, self._expire, channel, queue)
+
+    def _expire(self, channel: str, queue: asyncio.Queue) -> None:
+        if self._queues.get(channel) is queue:
+            del self._queues[channel]
+
+    def get_stats(self) -> Dict[str, Any]:
+        dispatched = metrics.snapshot()["counters"].get("streaming_dispatch_total", [])
+        return {
+            "running": self.running,
+            "open_channels": len(self._queues),
+            "dispatched": {series["labels"]["mode"]: series["value"] for series in dispatched},
+        }
+
+    async def follow(self, channel: str, idle_timeout: Optional[float] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yields the channel's frames, with `result` decoded, until complete, error or close."""
+        queue = self._queues.get(channel)
+        if queue is None:
+            return
+
+        finished = False
+        try:
+            while True:
+                frame = await asyncio.wait_for(queue.get(), timeout=idle_timeout)
+                if frame is _CLOSED:
+                    finished = True
+                    return
+
+                if "result" in frame:
+                    frame = {**frame, "result": json.loads(frame["result"])}
+
+                finished = frame.get("progress") in ("complete", "error")
+                yield frame
+
+                if finished:
+                    return
+        except asyncio.TimeoutError:
+            metrics.increment("inline_stream_timeouts_total")
+            logger.warning(f"Inline stream {channel} idle for {idle_timeout}s, giving up")
+        finally:
+            if finished:
+                self.discard(channel)
+            else:
+                # Timed out, or the consumer stopped reading (e.g. the socket closed).
+                self.abandon(channel)
+
+
+inline_streams = InlineStreamHub()
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, Optional
+
+from app.configs.app_config import config
+from app.infrastructure import infra
+from common.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+COMMIT = "commit"
+DISCARD = "discard"
+
+
+class SpeculationGate:
+    """
+    Holds back the side effects of a chat reply started before the router has decided that the
+    turn is a chat turn (speculative routing). The reply streams into its own channel, which no
+    client reads until the branch is confirmed. The exchange is saved and `complete` published
+    only after the backend commits the branch. A discarded reply stops at its next check.
+
+    The verdict is kept in Redis so a Celery worker can read it. Inline replies in the backend
+    process also receive it through a local future, without polling. A reply that gets no verdict
+    within timeout_seconds is treated as discarded.
+    """
+
+    KEY_PREFIX = "speculation:"
+
+    def __init__(self, timeout_seconds: float, poll_interval_seconds: float = 0.05, check_interval_seconds: float = 0.25):
+        self.timeout_seconds = timeout_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+        self.check_interval_seconds = check_interval_seconds
+        self._local: Dict[str, asyncio.Future] = {}
+
+    @property
+    def _ttl_seconds(self) -> int:
+        return int(self.timeout_seconds) + 60
+
+    async def aopen(self, channel: str, local: bool) -> None:
+        """Marks the channel's reply as pending; call before the reply can start."""
+        await infra.async_redis_client.set(f"{self.KEY_PREFIX}{channel}", PENDING, ex=self._ttl_seconds)
+        if local:
+            self._local[channel] = asyncio.get_running_loop().create_future()
+
+    async def aresolve(self, channel: str, commit: bool) -> None:
+        verdict = COMMIT if commit else DISCARD
+        metrics.increment("speculative_chat_verdicts_total", verdict=verdict)
+
+        future = self._local.get(channel)
+        if future is not None and not future.done():
+            future.set_result(verdict)
+
+        try:
+            await infra.async_redis_client.set(f"{self.KEY_PREFIX}{channel}", verdict, ex=self._ttl_seconds)
+        except Exception as e:
+            logger.warning(f"Failed to record speculative verdict {verdict} for {channel}: {e}")
+
+    def forget(self, channel: str) -> None:
+        self._local.pop(channel, None)
+
+    def verdict(self, channel: str) -> Optional[str]:
+        value = infra.redis_client.get(f"{self.KEY_PREFIX}{channel}")
+        return value.decode() if isinstance(value, bytes) else value
+
+    def wait(self, channel: str) -> bool:
+        """Blocks until the branch is committed (True) or discarded, expired or timed out (False)."""
+        deadline = time.monotonic() + self.timeout_seconds
+        while (verdict := self.verdict(channel)) == PENDING and time.monotonic() < deadline:
+            time.sleep(self.poll_interval_seconds)
+        return self._committed(channel, verdict)
+
+    async def await_verdict(self, channel: str) -> bool:
+        future = self._local.get(channel)
+        if future is None:
+            return await asyncio.to_thread(self.wait, channel)
+
+        try:
+            verdict = await asyncio.wait_for(asyncio.shield(future), timeout=self.timeout_seconds)
+        except asyncio.TimeoutError:
+            verdict = None
+        return self._committed(channel, verdict)
+
+    def discarded_check(self, channel: str) -> Callable[[], bool]:
+        """A cheap check for the streaming loop: reads the verdict at most every check_interval_seconds."""
+        future = self._local.get(channel)
+        if future is not None:
+            return lambda: future.done() and future.result() == DISCARD
+
+        last_checked = 0.0
+        discarded = False
+
+        def check() -> bool:
+            nonlocal last_checked, discarded
+            now = time.monotonic()
+            if not discarded and now - last_checked >= self.check_interval_seconds:
+                last_checked = now
+                discarded = self.verdict(channel) in (DISCARD, None)
+            return discarded
+
+        return check
+
+    def _committed(self, channel: str, verdict: Optional[str]) -> bool:
+        if verdict == COMMIT:
+            return True
+
+        if verdict == PENDING or verdict is None:
+            logger.warning(f"No verdict for speculative reply {channel} within {self.timeout_seconds}s, discarding it")
+            metrics.increment("speculative_chat_verdicts_total", verdict="timeout")
+        return False
+
+
+speculation_gate = SpeculationGate(timeout_seconds=config.SPECULATIVE_CHAT_COMMIT_TIMEOUT_SECONDS)
@@ -0,0 +1,329 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.agents.streaming_agent.inline_streams import inline_streams
+from app.configs.app_config import config
+from app.infrastructure import infra
+from common.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+STREAM_MAXLEN = 1000
+
+FLUSH_BYTES_BUCKETS: Tuple[float, ...] = (8, 16, 32, 64, 128, 256, 512, 1024, 4096)
+FLUSH_DELTAS_BUCKETS: Tuple[float, ...] = (1, 2, 4, 8, 16, 32, 64, 128)
+OPS_PER_ANSWER_BUCKETS: Tuple[float, ...] = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+def build_frame(
+        agent_name: str,
+        session_id: Optional[str],
+        progress: str,
+        chunk: str,
+        fields: Optional[dict] = None,
+        final_result: Optional[dict] = None
+) -> Dict[str, Any]:
+    message = {
+        "agent_name": str(agent_name),
+        "progress": progress,
+        "chunk": chunk,
+        "session_id": session_id
+    }
+
+    if fields:
+        message.update(fields)
+
+    if final_result:
+        message["result"] = json.dumps(final_result)
+
+    return message
+
+
+class _FrameBuffer:
+    """Coalescing state and publish counts shared by the sync and async publishers. Not thread-safe."""
+
+    def __init__(self, agent_name: str, session_id: Optional[str], max_bytes: int):
+        self.agent_name = agent_name
+        self.session_id = session_id
+        self.max_bytes = max_bytes
+        self.started_at: Optional[float] = None
+        self._parts: List[str] = []
+        self._bytes = 0
+        self._fields: Dict[str, Any] = {}
+
+        self.deltas = 0
+        self.frames = 0
+        self.round_trips = 0
+        self.flush_bytes: List[int] = []
+
+    def add(self, text: str, seq: int, t_ms: float, ttft_ms: Optional[float]) -> bool:
+        """Buffers a delta; True when the buffer has reached max_bytes."""
+        if not self._parts:
+            self.started_at = time.monotonic()
+            # The frame keeps the first delta's timing; seq and t_last_ms track the last.
+            self._fields = {"t_ms": t_ms}
+            if ttft_ms is not None:
+                self._fields["ttft_ms"] = ttft_ms
+        self._fields["seq"] = seq
+        self._fields["t_last_ms"] = t_ms
+        self._parts.append(text)
+        self._bytes += len(text.encode("utf-8"))
+        self.deltas += 1
+        return self._bytes >= self.max_bytes
+
+    def take(self) -> Optional[Dict[str, Any]]:
+        if not self._parts:
+            return None
+
+        metrics.observe("stream_flush_bytes", self._bytes, buckets=FLUSH_BYTES_BUCKETS, agent=self.agent_name)
+        metrics.observe("stream_flush_deltas", len(self._parts), buckets=FLUSH_DELTAS_BUCKETS, agent=self.agent_name)
+        self.flush_bytes.append(self._bytes)
+
+        frame = build_frame(self.agent_name, self.session_id, "streaming", "".join(self._parts), fields=self._fields)
+        self._parts = []
+        self._bytes = 0
+        self._fields = {}
+        self.started_at = None
+        return frame
+
+    def sent(self, frames: int) -> None:
+        self.frames += frames
+        self.round_trips += 1
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "deltas": self.deltas,
+            "frames": self.frames,
+            "redis_round_trips": self.round_trips,
+            "mean_flush_bytes": round(sum(self.flush_bytes) / len(self.flush_bytes), 1) if self.flush_bytes else 0.0,
+        }
+
+    def record_metrics(self) -> None:
+        metrics.observe("stream_redis_ops_per_answer", self.frames, buckets=OPS_PER_ANSWER_BUCKETS, agent=self.agent_name)
+        metrics.increment("stream_redis_round_trips_total", value=self.round_trips, agent=self.agent_name)
+        metrics.increment("stream_deltas_coalesced_total", value=max(0, self.deltas - len(self.flush_bytes)), agent=self.agent_name)
+
+
+class CoalescingPublisher:
+    """
+    Publishes one answer's frames to its Redis stream. Token deltas are buffered and written
+    as a single `streaming` frame once the buffer is max_bytes long or its oldest delta is
+    max_delay old. Control frames (started, complete, error) flush whatever is buffered and
+    go out in the same pipeline straight away. Order is preserved because one send lock covers
+    taking the buffer and writing it.
+
+    A flusher thread, started on the first delta, enforces max_delay when tokens stop arriving.
+    max_delay <= 0 turns coalescing off: every delta is written on its own.
+    """
+
+    def __init__(
+            self,
+            channel: str,
+            agent_name: str,
+            session_id: Optional[str],
+            max_delay: float = config.STREAM_FLUSH_INTERVAL_MS / 1000,
+            max_bytes: int = config.STREAM_FLUSH_MAX_BYTES
+    ):
+        self.channel = channel
+        self.agent_name = agent_name
+        self.session_id = session_id
+        self.max_delay = max_delay
+
+        self._buffer = _FrameBuffer(agent_name, session_id, max_bytes)
+        self._cond = threading.Condition()
+        self._send_lock = threading.Lock()
+        self._closed = False
+        self._flusher: Optional[threading.Thread] = None
+
+    def delta(self, text: str, seq: int, t_ms: float, ttft_ms: Optional[float] = None) -> None:
+        with self._cond:
+            due = self._buffer.add(text, seq, t_ms, ttft_ms) or self.max_delay <= 0
+            if not due:
+                self._ensure_flusher()
+                self._cond.notify()
+
+        if due:
+            self.flush()
+
+    def control(self, progress: str, chunk: str = "", final_result: Optional[dict] = None) -> bool:
+        """Writes a control frame immediately, after any buffered deltas."""
+        return self._send([build_frame(self.agent_name, self.session_id, progress, chunk, final_result=final_result)])
+
+    def flush(self) -> bool:
+        return self._send([])
+
+    def close(self) -> None:
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    def summary(self) -> Dict[str, Any]:
+        return self._buffer.summary()
+
+    def record_metrics(self) -> None:
+        self._buffer.record_metrics()
+
+    def _send(self, frames: List[Dict[str, Any]]) -> bool:
+        with self._send_lock:
+            with self._cond:
+                buffered = self._buffer.take()
+            if buffered is not None:
+                frames = [buffered, *frames]
+            if not frames:
+                return True
+
+            try:
+                redis_client = infra.redis_client
+                if len(frames) == 1:
+                    redis_client.xadd(self.channel, frames[0], maxlen=STREAM_MAXLEN, approximate=True)
+                else:
+                    pipeline = redis_client.pipeline(transaction=False)
+                    for frame in frames:
+                        pipeline.xadd(self.channel, frame, maxlen=STREAM_MAXLEN, approximate=True)
+                    pipeline.execute()
+            except Exception as e:
+                logger.exception(f"Failed to publish {len(frames)} frame(s) to {self.channel}: {e}")
+                return False
+
+            self._buffer.sent(len(frames))
+            return True
+
+    def _ensure_flusher(self) -> None:
+        # Called with self._cond held.
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._run_flusher, name="stream-flusher", daemon=True)
+            self._flusher.start()
+
+    def _run_flusher(self) -> None:
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                if self._buffer.started_at is None:
+                    self._cond.wait()
+                    continue
+                remaining = self._buffer.started_at + self.max_delay - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+
+            self.flush()
+
+
+class AsyncCoalescingPublisher:
+    """CoalescingPublisher for the event loop: same framing and windows, async Redis client, a loop timer."""
+
+    def __init__(
+            self,
+            channel: str,
+            agent_name: str,
+            session_id: Optional[str],
+            max_delay: float = config.STREAM_FLUSH_INTERVAL_MS / 1000,
+            max_bytes: int = config.STREAM_FLUSH_MAX_BYTES
+    ):
+        self.channel = channel
+        self.agent_name = agent_name
+        self.session_id = session_id
+        self.max_delay = max_delay
+
+        self._buffer = _FrameBuffer(agent_name, session_id, max_bytes)
+        self._send_lock = asyncio.Lock()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def delta(self, text: str, seq: int, t_ms: float, ttft_ms: Optional[float] = None) -> None:
+        if self._buffer.add(text, seq, t_ms, ttft_ms) or self.max_delay <= 0:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, lambda: asyncio.ensure_future(self.flush()))
+
+    async def control(
+            self,
+            progress: str,
+            chunk: str = "",
+            final_result: Optional[dict] = None,
+            fields: Optional[dict] = None
+    ) -> bool:
+        return await self._send([build_frame(self.agent_name, self.session_id, progress, chunk, fields=fields, final_result=final_result)])
+
+    async def flush(self) -> bool:
+        return await self._send([])
+
+    async def close(self) -> None:
+        await self.flush()
+
+    def summary(self) -> Dict[str, Any]:
+        return self._buffer.summary()
+
+    def record_metrics(self) -> None:
+        self._buffer.record_metrics()
+
+    async def _send(self, frames: List[Dict[str, Any]]) -> bool:
+        async with self._send_lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+            buffered = self._buffer.take()
+            if buffered is not None:
+                frames = [buffered, *frames]
+            if not frames:
+                return True
+
+            try:
+                pipeline = infra.async_redis_client.pipeline(transaction=False)
+                for frame in frames:
+                    pipeline.xadd(self.channel, frame, maxlen=STREAM_MAXLEN, approximate=True)
+                await pipeline.execute()
+            except Exception as e:
+                logger.exception(f"Failed to publish {len(frames)} frame(s) to {self.channel}: {e}")
+                return False
+
+            self._buffer.sent(len(frames))
+            return True
+
+
+class InlinePublisher:
+    """
+    Publisher for answers streamed inside the backend process. Every frame goes straight to the
+    local websocket forwarder through inline_streams, without coalescing; with durable set, the
+    same frames are also written, coalesced, to the Redis stream so the answer can be replayed.
+    """
+
+    def __init__(self, channel: str, agent_name: str, session_id: Optional[str], durable: bool):
+        self.channel = channel
+        self.agent_name = agent_name
+        self.session_id = session_id
+        self._durable = AsyncCoalescingPublisher(channel, agent_name, session_id) if durable else None
+
+    async def delta(self, text: str, seq: int, t_ms: float, ttft_ms: Optional[float] = None) -> None:
+        fields = {"seq": seq, "t_ms": t_ms}
+        if ttft_ms is not None:
+            fields["ttft_ms"] = ttft_ms
+        inline_streams.publish(self.channel, build_frame(self.agent_name, self.session_id, "streaming", text, fields=fields))
+
+        if self._durable is not None:
+            await self._durable.delta(text, seq, t_ms, ttft_ms)
+
+    async def control(self, progress: str, chunk: str = "", final_result: Optional[dict] = None) -> bool:
+        inline_streams.publish(self.channel, build_frame(self.agent_name, self.session_id, progress, chunk, final_result=final_result))
+
+        if self._durable is not None:
+            return await self._durable.control(progress, chunk, final_result)
+        return True
+
+    async def close(self) -> None:
+        if self._durable is not None:
+            await self._durable.close()
+        inline_streams.close(self.channel)
+
+    def summary(self) -> Dict[str, Any]:
+        return {"inline": True, **(self._durable.summary() if self._durable is not None else {})}
+
+    def record_metrics(self) -> None:
+        if self._durable is not None:
+            self._durable.record_metrics()
@@ -1,24 +1,42 @@
+import asyncio
 import json
 import logging
+import time
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, List, Optional
 
-from langchain.agents import AgentExecutor, create_react_agent, create_tool_calling_agent
 from langchain_core.prompt_values import PromptValue
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
 
-from app.agents.chat_agent.chat_agent import ChatAgent
-from app.agents.summary_agent.summary_agent import SummaryAgent
+from app.agents.streaming_agent.speculation import speculation_gate
+from app.agents.streaming_agent.stream_publisher import CoalescingPublisher, InlinePublisher
 from app.caches.conversation_store import ConversationSession, ConversationStore
+from app.configs.app_config import config
 from app.infrastructure import infra
+from common.services.llm_client_registry import llm_registry
+from common.configs.llm_config import llm_config
+from common.utils.agent_utils import Utils
+from common.utils.background_loop import background_loop
+from common.utils.llm_scheduler import llm_scheduler, set_request_context, PRIORITY_STREAMING, PRIORITY_BACKGROUND
+from common.utils.llm_telemetry import llm_telemetry, llm_call_scope, begin_turn, get_turn_id
+from common.utils.metrics import metrics
+from common.utils.prompt_budget import prompt_budget, token_counter, BudgetedPrompt
+from common.utils.rate_limiter import rate_limiter
+from common.utils.singleflight import singleflight
 
 logger = logging.getLogger(__name__)
 
+STREAMING_MODEL = "gpt-4o-mini"
+
 
 def get_agent_instance_prompt(agent_name: str) -> ChatPromptTemplate:
+    from app.agents.agent_registry import agent_registry
+
     if agent_name == "chat_agent":
-        return ChatAgent().prompt()
+        return agent_registry.chat_agent.prompt()
 
-    return SummaryAgent().prompt()
+    return agent_registry.summary_agent.prompt()
 
 
 def build_formatted_prompt(
@@ -43,24 +61,41 @@ def build_formatted_prompt(
     return agent_prompt.format_prompt(chat_history=chat_history, available_tools=tool_summaries_str, user_input=user_input)
 
 
-def build_streaming_agent(
-        agent_prompt: ChatPromptTemplate,
-) -> AgentExecutor:
-    llm = ChatOpenAI(
-        model="gpt-4o-mini",
-        streaming=True
-    )
-    agent = create_tool_calling_agent(
-        llm=llm,
-        tools=[],
-        prompt=agent_prompt
+def build_streaming_llm() -> ChatOpenAI:
+    return llm_registry.get_chat_model(
+        model=STREAMING_MODEL,
+        streaming=True,
+        # Usage arrives in a final stream chunk only when requested; telemetry needs it.
+        stream_usage=True
     )
 
-    return AgentExecutor(
-        agent=agent,
-        tools=[],
-        verbose=True
-    )
+
+class StreamTiming:
+    """Offsets of streamed deltas from the `started` message, in milliseconds."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.last_token_at: Optional[float] = None
+        self.deltas = 0
+
+    def mark(self) -> float:
+        now = time.perf_counter()
+        if self.first_token_at is None:
+            self.first_token_at = now
+        self.last_token_at = now
+        self.deltas += 1
+        return self.offset_ms(now)
+
+    def offset_ms(self, at: float) -> float:
+        return round((at - self.started_at) * 1000, 1)
+
+    def summary(self) -> dict:
+        return {
+            "ttft_ms": self.offset_ms(self.first_token_at) if self.first_token_at else None,
+            "duration_ms": self.offset_ms(self.last_token_at) if self.last_token_at else None,
+            "deltas": self.deltas,
+        }
 
 
 def _publish_chunk(
@@ -91,64 +126,91 @@ def _publish_chunk(
         return False
 
 
+async def astream_tokens(llm: ChatOpenAI, formatted_prompt: PromptValue, priority: str) -> AsyncIterator[str]:
+    """Token deltas straight from the model's stream, inside the caller's scheduler slot and rate budget."""
+    messages = formatted_prompt.to_messages()
+    model = rate_limiter.model_name(llm)
+    estimated = token_counter.count(formatted_prompt.to_string()) + llm_config.RATE_LIMIT_COMPLETION_TOKENS
+    used_tokens: Optional[int] = None
+    abandoned = False
+
+    async with llm_scheduler.slot(priority, cost=estimated / 1000):
+        await rate_limiter.aacquire(model, estimated)
+
+        try:
+            async for chunk in llm.astream(messages):
+                usage = getattr(chunk, "usage_metadata", None)
+                if usage:
+                    used_tokens = usage.get("total_tokens")
+                if chunk.content:
+                    yield str(chunk.content)
+        except (asyncio.CancelledError, GeneratorExit):
+            # Cancelled, or the reader stopped (a discarded speculative reply).
+            abandoned = True
+            raise
+        finally:
+            # Abandoned before usage arrived: nothing used. A failed call keeps its reservation.
+            await rate_limiter.arecord_usage(model, estimated, 0 if abandoned and used_tokens is None else used_tokens)
+
+
 def _publish_streaming_chunks(
-        agent_executor,
+        llm: ChatOpenAI,
+        publisher: CoalescingPublisher,
         result_channel: str,
         agent_name: str,
-        session_id: str,
         formatted_prompt: PromptValue,
-        user_input: str,
-        chat_history_str: str,
-        tool_summaries_str: str,
-        final_result: str = None
+        timing: StreamTiming,
+        discarded: Optional[Callable[[], bool]] = None
 ) -> str:
-    full_response = ""
-    
-    if agent_name == "summary_agent":
-        inputs = {
-            "chat_history": chat_history_str if isinstance(chat_history_str, str) else str(chat_history_str),
-            "final_result": final_result or "",
-            "agent_scratchpad": ""
-        }
+    # Deltas are collected and joined once; whitespace-only deltas are real tokens and are kept.
+    parts: List[str] = []
+
+    priority = _stream_priority(agent_name)
+    producer = lambda: background_loop.iterate(lambda: astream_tokens(llm, formatted_prompt, priority))
+
+    if discarded is None:
+        chunks = singleflight.stream(
+            key=singleflight.build_key("stream", agent_name, formatted_prompt.to_string()),
+            producer=producer,
+            result_channel=result_channel
+        )
     else:
-        inputs = {
-            "chat_history": chat_history_str if isinstance(chat_history_str, list) else [{"role": "user", "content": chat_history_str}],
-            "available_tools": tool_summaries_str,
-            "user_input": user_input,
-            "agent_scratchpad": ""
-        }
-    
-    for chunk in agent_executor.stream(inputs):
-        if hasattr(chunk, 'content') and chunk.content:
-            chunk_content = chunk.content
-        elif isinstance(chunk, dict) and 'output' in chunk:
-            chunk_content = chunk['output']
-        elif isinstance(chunk, str):
-            chunk_content = chunk
-        else:
-            chunk_content = str(chunk)
-
-        if chunk_content and chunk_content.strip():
-            full_response += chunk_content
-
-            _publish_chunk(
-                chunk=chunk_content,
-                channel=result_channel,
-                agent_name=agent_name,
-                progress="streaming",
-                session_id=session_id
-            )
+        # A speculative reply can be abandoned midway, which would cut the stream short for
+        # anyone sharing it, so it is never shared.
+        chunks = producer()
 
-    return full_response
+    for chunk_content in chunks:
+        if discarded is not None and discarded():
+            chunks.close()
+            break
 
+        if not chunk_content:
+            continue
 
-def _publish_final_response(
-        full_response: str,
-        user_input: str,
-        result_channel: str,
-        agent_name: str,
-        session_id: str,
-):
+        offset_ms, ttft_ms = _mark_delta(timing, agent_name)
+        parts.append(chunk_content)
+        publisher.delta(chunk_content, seq=timing.deltas, t_ms=offset_ms, ttft_ms=ttft_ms)
+
+    metrics.increment("stream_deltas_total", value=timing.deltas, agent=agent_name)
+
+    return "".join(parts)
+
+
+def _stream_priority(agent_name: str) -> str:
+    # First tokens of a chat reply are interactive; tool-result summaries can queue behind them.
+    return PRIORITY_STREAMING if agent_name == "chat_agent" else PRIORITY_BACKGROUND
+
+
+def _mark_delta(timing: StreamTiming, agent_name: str) -> tuple[float, Optional[float]]:
+    offset_ms = timing.mark()
+    if timing.deltas != 1:
+        return offset_ms, None
+
+    metrics.observe("stream_ttft_seconds", offset_ms / 1000, agent=agent_name)
+    return offset_ms, offset_ms
+
+
+def _save_exchange(session_id: str, user_input: str, full_response: str) -> None:
     conversation_session: ConversationSession = ConversationStore().get_session(session_id=session_id)
 
     conversation_session.add_message({
@@ -161,16 +223,72 @@ def _publish_final_response(
         "content": full_response
     })
 
-    _publish_chunk(
-        chunk="",
-        channel=result_channel,
+
+def _final_result(full_response: str, publisher: CoalescingPublisher | InlinePublisher, timing: StreamTiming) -> dict:
+    final_result = {"response": full_response}
+
+    # Publish counts exclude the complete frame itself.
+    final_result["stream"] = {**timing.summary(), "publish": publisher.summary()}
+
+    telemetry = llm_telemetry.turn_breakdown(get_turn_id())
+    if telemetry:
+        final_result["telemetry"] = telemetry
+
+    return final_result
+
+
+def _abandon_speculative(result_channel: str, agent_name: str) -> bool:
+    # Nobody reads the channel of a discarded branch; whatever was published expires with it.
+    metrics.increment("speculative_chat_abandoned_total", agent=agent_name)
+    logger.info(f"Speculative reply {result_channel} discarded, nothing saved")
+    try:
+        infra.redis_client.expire(result_channel, 60)
+    except Exception as e:
+        logger.warning(f"Failed to expire discarded stream {result_channel}: {e}")
+    return False
+
+
+def _publish_final_response(
+        full_response: str,
+        user_input: str,
+        publisher: CoalescingPublisher,
+        timing: StreamTiming
+):
+    _save_exchange(publisher.session_id, user_input, full_response)
+    publisher.control("complete", final_result=_final_result(full_response, publisher, timing))
+
+    logger.info(f"Streaming completed for {publisher.agent_name} in session: {publisher.session_id}")
+
+
+def _prepare_prompt(
+        agent_name: str,
+        user_input: str,
+        chat_history_str: str,
+        tool_summaries_str: str,
+        final_result: str | None
+) -> PromptValue:
+    agent_prompt: ChatPromptTemplate = get_agent_instance_prompt(agent_name=agent_name)
+
+    budgeted: BudgetedPrompt = prompt_budget.fit(
         agent_name=agent_name,
-        progress="complete",
-        session_id=session_id,
-        final_result={"response": full_response}
+        chat_history=chat_history_str if isinstance(chat_history_str, list) else [{"role": "user", "content": chat_history_str}],
+        available_tools=tool_summaries_str if agent_name == "chat_agent" else None,
+        previous_result=final_result
     )
+    chat_history_str = budgeted.chat_history
+    if agent_name == "chat_agent":
+        tool_summaries_str = budgeted.available_tools
+    if final_result is not None:
+        final_result = budgeted.previous_result
 
-    logger.info(f"Streaming completed for {agent_name} in session: {session_id}")
+    return build_formatted_prompt(
+        agent_name=agent_name,
+        agent_prompt=agent_prompt,
+        user_input=user_input,
+        chat_history_str=chat_history_str,
+        tool_summaries_str=tool_summaries_str,
+        final_result=final_result
+    )
 
 
 def streaming_handler(
@@ -180,49 +298,56 @@ def streaming_handler(
         result_channel: str,
         tool_summaries_str: str,
         chat_history_str: str,
-        final_result: str | None = None
+        final_result: str | None = None,
+        user_id: str | None = None,
+        turn_id: str | None = None,
+        speculative: bool = False
 ) -> bool:
+    set_request_context(user_id=user_id, session_id=session_id)
+    begin_turn(turn_id)
+    # Speculative replies save the exchange and publish `complete` only once the branch is committed.
+    discarded = speculation_gate.discarded_check(result_channel) if speculative else None
+    publisher = CoalescingPublisher(channel=result_channel, agent_name=agent_name, session_id=session_id)
+
     try:
-        agent_prompt: ChatPromptTemplate = get_agent_instance_prompt(agent_name=agent_name)
+        # Inside the try: a Redis error reading the verdict is reported through the error frame.
+        if discarded is not None and discarded():
+            return _abandon_speculative(result_channel, agent_name)
 
-        formatted_prompt: PromptValue = build_formatted_prompt(
+        formatted_prompt: PromptValue = _prepare_prompt(
             agent_name=agent_name,
-            agent_prompt=agent_prompt,
             user_input=user_input,
             chat_history_str=chat_history_str,
             tool_summaries_str=tool_summaries_str,
             final_result=final_result
         )
 
-        agent_executor = build_streaming_agent(agent_prompt=agent_prompt)
+        from app.agents.agent_registry import agent_registry
+        llm = agent_registry.get_streaming_llm()
 
-        _publish_chunk(
-            chunk="",
-            channel=result_channel,
-            agent_name=agent_name,
-            progress="started",
-            session_id=session_id
-        )
+        timing = StreamTiming()
+        publisher.control("started")
 
-        full_response: str = _publish_streaming_chunks(
-            agent_executor=agent_executor,
-            result_channel=result_channel,
-            agent_name=agent_name,
-            session_id=session_id,
-            formatted_prompt=formatted_prompt,
-            user_input=user_input,
-            chat_history_str=chat_history_str,
-            tool_summaries_str=tool_summaries_str,
-            final_result=final_result
-        )
+        with llm_call_scope(agent_name):
+            full_response: str = _publish_streaming_chunks(
+                llm=llm,
+                publisher=publisher,
+                result_channel=result_channel,
+                agent_name=agent_name,
+                formatted_prompt=formatted_prompt,
+                timing=timing,
+                discarded=discarded
+            )
+
+        if discarded is not None and (discarded() or not speculation_gate.wait(result_channel)):
+            return _abandon_speculative(result_channel, agent_name)
 
         if full_response:
             _publish_final_response(
                 full_response,
                 user_input,
-                result_channel,
-                agent_name,
-                session_id
+                publisher,
+                timing
             )
             return True
 
@@ -231,13 +356,96 @@ def streaming_handler(
     except Exception as e:
         logger.exception(f"Streaming failed for {agent_name}: {e}")
 
-        _publish_chunk(
-            chunk="",
-            channel=result_channel,
+        publisher.control("error", final_result={"error": str(e)})
+
+        return False
+    finally:
+        publisher.close()
+        publisher.record_metrics()
+
+
+async def astreaming_handler(
+        agent_name: str,
+        session_id: str,
+        user_input: str,
+        result_channel: str,
+        tool_summaries_str: str,
+        chat_history_str: str,
+        final_result: str | None = None,
+        speculative: bool = False
+) -> bool:
+    """
+    streaming_handler for the backend's own event loop (inline streaming mode): tokens come from
+    the model's astream and go straight to the request's websocket forwarder. Runs as a task of
+    the request, so request context and the turn id are already set. Stream singleflight is
+    sync-only and does not apply here.
+    """
+    discarded = speculation_gate.discarded_check(result_channel) if speculative else None
+    if discarded is not None and discarded():
+        speculation_gate.forget(result_channel)
+        return await Utils.run_sync(_abandon_speculative, result_channel, agent_name)
+
+    publisher = InlinePublisher(
+        channel=result_channel,
+        agent_name=agent_name,
+        session_id=session_id,
+        durable=config.STREAMING_INLINE_DURABLE
+    )
+
+    try:
+        formatted_prompt: PromptValue = _prepare_prompt(
             agent_name=agent_name,
-            progress="error",
-            session_id=session_id,
-            final_result={"error": str(e)}
+            user_input=user_input,
+            chat_history_str=chat_history_str,
+            tool_summaries_str=tool_summaries_str,
+            final_result=final_result
         )
 
+        from app.agents.agent_registry import agent_registry
+        llm = agent_registry.get_streaming_llm()
+
+        timing = StreamTiming()
+        await publisher.control("started")
+
+        parts: List[str] = []
+        with llm_call_scope(agent_name):
+            # aclosing: leaving the loop early settles the stream's token reservation right away.
+            async with aclosing(astream_tokens(llm, formatted_prompt, _stream_priority(agent_name))) as chunks:
+                async for chunk_content in chunks:
+                    if discarded is not None and discarded():
+                        break
+
+                    if not chunk_content:
+                        continue
+
+                    offset_ms, ttft_ms = _mark_delta(timing, agent_name)
+                    parts.append(chunk_content)
+                    await publisher.delta(chunk_content, seq=timing.deltas, t_ms=offset_ms, ttft_ms=ttft_ms)
+
+        metrics.increment("stream_deltas_total", value=timing.deltas, agent=agent_name)
+        full_response = "".join(parts)
+
+        if discarded is not None and (discarded() or not await speculation_gate.await_verdict(result_channel)):
+            return await Utils.run_sync(_abandon_speculative, result_channel, agent_name)
+
+        if full_response:
+            await Utils.run_sync(_save_exchange, session_id, user_input, full_response)
+            await publisher.control(
+                "complete",
+                final_result=await Utils.run_sync(_final_result, full_response, publisher, timing)
+            )
+            logger.info(f"Inline streaming completed for {agent_name} in session: {session_id}")
+
+        return True
+
+    except Exception as e:
+        logger.exception(f"Inline streaming failed for {agent_name}: {e}")
+
+        await publisher.control("error", final_result={"error": str(e)})
+
         return False
+    finally:
+        await publisher.close()
+        publisher.record_metrics()
+        if speculative:
+            speculation_gate.forget(result_channel)
@@ -1,62 +1,84 @@
+import json
 import logging
+import re
+from typing import Any, AsyncIterator, Dict, List
 
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
 
 from app.agents.tool_orchestration_agent.tool_orchestration_prompts import AGENT_ROLE, STRICT_TOOL_RULES, \
     CONTEXT_FIRST_RULES, \
-    TOOL_SELECTION_RULES, STRICT_RULES, EXAMPLES, OUTPUT_REQUIREMENTS
+    TOOL_SELECTION_RULES, STRICT_RULES, EXAMPLES, OUTPUT_REQUIREMENTS, FUNCTION_CALLING_ROLE, FUNCTION_CALLING_RULES
 from app.caches.conversation_store import ConversationSession
-from app.schemas.tool_invocation import ToolInvocations
+from app.configs.app_config import config
+from app.schemas.tool_invocation import ToolInvocation, ToolInvocations
+from app.schemas.tool_summaries import ToolsSummaryByServer
+from app.services.mcp_service import MCPService
 from app.utils.chat_util import chat_history_to_str
+from app.utils.prompt_layout import build_prefix_stable_prompt
+from common.services.llm_client_registry import llm_registry
 from common.utils.agent_utils import Utils
+from common.utils.metrics import metrics
+from common.utils.model_cascade import model_cascade
+from common.utils.prompt_budget import prompt_budget, BudgetedPrompt
+from common.utils.structured_output import IncrementalArrayParser, parse_structured_output
+from common.utils.tool_util import find_invocation_errors
 
 logger = logging.getLogger(__name__)
 
+# Native tool calls carry no rank or depends_on; a dependent argument names its source step instead.
+STEP_REFERENCE = re.compile(r"\bfrom step (\d+)\b", re.IGNORECASE)
+
 
 class ToolOrchestrationAgent:
     def __init__(self) -> None:
         self.parser = PydanticOutputParser(pydantic_object=ToolInvocations)
         self.prompt = self.build_prompt()
+        self.function_calling_prompt = self.build_function_calling_prompt()
 
     def build_prompt(self) -> ChatPromptTemplate:
-        return ChatPromptTemplate.from_messages(
-            [
+        return build_prefix_stable_prompt(
+            static_sections=[
+                AGENT_ROLE,
+                STRICT_TOOL_RULES,
+                CONTEXT_FIRST_RULES,
+                TOOL_SELECTION_RULES,
+                STRICT_RULES,
+                EXAMPLES,
+                OUTPUT_REQUIREMENTS,
+                "Always return a valid JSON object:\n{format_instructions}"
+            ],
+            dynamic_sections=[
                 (
-                    "system",
-                    f"""
-                    {AGENT_ROLE}
-
-                    **Conversation Context:**
-                    - Chat history: 
-                    {{chat_history}}
-                                     
-                    **Tool reference:** Here is the list of available tools, including the parameter names and types. 
-                    You MUST use the parameter names and types exactly as shown for each tool:
-                    {{available_tools}}
-
-                    {STRICT_TOOL_RULES}
-                    
-                    {CONTEXT_FIRST_RULES}
-                    
-                    {TOOL_SELECTION_RULES}
-                    
-                    {STRICT_RULES}
-                    
-                    {EXAMPLES}
-                    
-                    {OUTPUT_REQUIREMENTS}
-                    
-                    Always return a valid JSON object:
-                    {{format_instructions}}
-                    """
+                    "**Tool reference:** Here is the list of available tools, including the parameter names and types.\n"
+                    "You MUST use the parameter names and types exactly as shown for each tool:",
+                    "available_tools"
                 ),
+                ("**Conversation Context:**\n- Chat history:", "chat_history")
+            ],
+            trailing_messages=[
                 ("placeholder", "{chat_history}"),
                 ("human", "{query}"),
                 ("placeholder", "{agent_scratchpad}")
+            ],
+            format_instructions=self.parser.get_format_instructions()
+        )
+
+    def build_function_calling_prompt(self) -> ChatPromptTemplate:
+        # The tool catalog and output format travel as native tool definitions, not prompt text.
+        return build_prefix_stable_prompt(
+            static_sections=[
+                FUNCTION_CALLING_ROLE,
+                CONTEXT_FIRST_RULES,
+                FUNCTION_CALLING_RULES
+            ],
+            dynamic_sections=[
+                ("**Conversation Context:**\n- Chat history:", "chat_history")
+            ],
+            trailing_messages=[
+                ("human", "{query}")
             ]
-        ).partial(format_instructions=self.parser.get_format_instructions())
+        )
 
     def _build_query_prompt(
             self,
@@ -70,15 +92,31 @@ class ToolOrchestrationAgent:
             "and provide separate entries for each in the JSON array. "
         )
 
-    def invoke_multi_step_agent(
+    @staticmethod
+    def _find_plan_errors(invocations: ToolInvocations, tool_summaries: ToolsSummaryByServer | None) -> str | None:
+        if not invocations.tools:
+            return "empty_plan"
+        return find_invocation_errors(invocations.tools, tool_summaries) if tool_summaries else None
+
+    async def invoke_multi_step_agent(
             self,
             tool_summaries_str: str,
             user_input: str,
             conversation_session: ConversationSession,
+            tool_summaries: ToolsSummaryByServer | None = None,
+            mcp_service: MCPService | None = None,
     ) -> ToolInvocations:
         """
         Invokes the agent to determine which tools to call (with input_data and rank), based on user input.
         """
+        if config.TOOL_ORCHESTRATION_MODE == "function_calling" and mcp_service is not None:
+            return await self.invoke_function_calling_agent(
+                user_input=user_input,
+                conversation_session=conversation_session,
+                mcp_service=mcp_service,
+                tool_summaries=tool_summaries
+            )
+
         try:
             logger.info("Invoking multi-step agent with user input: %s", user_input)
 
@@ -86,34 +124,183 @@ class ToolOrchestrationAgent:
 
             chat_history = conversation_session.get_last_n_messages(n=10)
 
+            budgeted: BudgetedPrompt = prompt_budget.fit(
+                agent_name="tool_orchestration_agent",
+                chat_history=chat_history,
+                available_tools=tool_summaries_str
+            )
+
             utils = Utils[ToolInvocations]
 
-            llm = ChatOpenAI(
-                model="gpt-4o-mini",
-                temperature=0.0,
-                max_tokens=2000,
-                model_kwargs={"response_format": {"type": "json_object"}}
+            response: ToolInvocations | None = await model_cascade.run(
+                agent_name="tool_orchestration_agent",
+                default_model="gpt-4o-mini",
+                llm_params={
+                    "temperature": 0.0,
+                    "max_tokens": 2000,
+                    "model_kwargs": {"response_format": {"type": "json_object"}}
+                },
+                call=lambda llm: utils.arun_agent_query(
+                    llm=llm,
+                    tools=[],
+                    parser=self.parser,
+                    prompt=self.prompt,
+                    query=prompt_str,
+                    chat_history=budgeted.chat_history,
+                    available_tools=budgeted.available_tools,
+                    allowed_tool_names=None,
+                    previous_result="",
+                    agent_name="tool_orchestration_agent"
+                ),
+                validate=lambda invocations: self._find_plan_errors(invocations, tool_summaries)
             )
+        except Exception as exc:
+            logger.exception("Error invoking agent: %s", exc)
+            raise RuntimeError("Failed to invoke Tool Orchestration agent") from exc
+
+        if not response:
+            logger.warning("No tools matched the user input.")
+            raise ValueError("Could not match any tools to user input.")
+
+        logger.info(f"Orchestrator Agent Response: {response}.")
+
+        return response
+
+    async def stream_multi_step_agent(
+            self,
+            tool_summaries_str: str,
+            user_input: str,
+            conversation_session: ConversationSession,
+    ) -> AsyncIterator[ToolInvocation]:
+        """
+        Streams the plan and yields each ToolInvocation as soon as its JSON object closes, so the
+        caller can start the first tool while later ones are still being generated. Anything the
+        incremental parser could not take is recovered from the full output at the end.
+        """
+        logger.info("Streaming multi-step agent plan for user input: %s", user_input)
+
+        budgeted: BudgetedPrompt = prompt_budget.fit(
+            agent_name="tool_orchestration_agent",
+            chat_history=conversation_session.get_last_n_messages(n=10),
+            available_tools=tool_summaries_str
+        )
+
+        # Tools start running before the plan is complete, so a stream cannot be escalated:
+        # use the cascade's last tier (the agent's own model when the cascade is off).
+        llm = llm_registry.get_chat_model(
+            model=model_cascade.tiers("tool_orchestration_agent", "gpt-4o-mini")[-1],
+            temperature=0.0,
+            max_tokens=2000,
+            stream_usage=True,
+            model_kwargs={"response_format": {"type": "json_object"}}
+        )
+
+        parser = IncrementalArrayParser(ToolInvocation)
+        yielded_ranks = set()
 
-            response: ToolInvocations | None = utils.run_agent_query(
+        async for chunk in Utils.astream_agent_query(
                 llm=llm,
-                tools=[],
+                query=self._build_query_prompt(user_input=user_input),
                 parser=self.parser,
                 prompt=self.prompt,
-                query=prompt_str,
-                chat_history=chat_history,
-                available_tools=tool_summaries_str,
-                allowed_tool_names=None,
-                previous_result=""
+                chat_history=budgeted.chat_history,
+                available_tools=budgeted.available_tools,
+                previous_result="",
+                agent_name="tool_orchestration_agent"
+        ):
+            for tool_invocation in parser.feed(chunk):
+                yielded_ranks.add(tool_invocation.rank)
+                yield tool_invocation
+
+        response: ToolInvocations | None = parse_structured_output(parser.text, ToolInvocations)
+
+        for tool_invocation in response.tools if response else []:
+            if tool_invocation.rank not in yielded_ranks:
+                yielded_ranks.add(tool_invocation.rank)
+                yield tool_invocation
+
+        if not yielded_ranks:
+            logger.warning("No tools matched the user input.")
+            raise ValueError("Could not match any tools to user input.")
+
+    @staticmethod
+    def _tool_calls_to_invocations(tool_calls: List[Dict[str, Any]]) -> ToolInvocations:
+        """Ranks follow call order; "from step N" in an argument becomes a dependency on rank N."""
+        invocations: List[ToolInvocation] = []
+
+        for rank, tool_call in enumerate(tool_calls, 1):
+            references = STEP_REFERENCE.findall(json.dumps(tool_call["args"]))
+            invocations.append(ToolInvocation(
+                tool_name=tool_call["name"],
+                input_data=tool_call["args"],
+                rank=rank,
+                depends_on=sorted({int(step) for step in references if 0 < int(step) < rank})
+            ))
+
+        return ToolInvocations(tools=invocations)
+
+    async def invoke_function_calling_agent(
+            self,
+            user_input: str,
+            conversation_session: ConversationSession,
+            mcp_service: MCPService,
+            tool_summaries: ToolsSummaryByServer | None = None,
+    ) -> ToolInvocations:
+        """
+        Plans tool invocations from native (parallel) tool calls against the MCP tools' own JSON
+        schemas, instead of a hand-written ToolInvocations blob.
+        """
+        try:
+            logger.info("Invoking function-calling orchestration with user input: %s", user_input)
+
+            tool_definitions = await mcp_service.get_tool_definitions()
+
+            budgeted: BudgetedPrompt = prompt_budget.fit(
+                agent_name="tool_orchestration_agent",
+                chat_history=conversation_session.get_last_n_messages(n=10)
+            )
+
+            async def call(llm) -> ToolInvocations:
+                tool_calls = await Utils.arun_tool_calls(
+                    llm=llm,
+                    tool_definitions=tool_definitions,
+                    prompt=self.function_calling_prompt,
+                    prompt_inputs={
+                        "query": self._build_query_prompt(user_input=user_input),
+                        "chat_history": chat_history_to_str(budgeted.chat_history)
+                    },
+                    agent_name="tool_orchestration_agent"
+                )
+                return self._tool_calls_to_invocations(tool_calls)
+
+            response: ToolInvocations | None = await model_cascade.run(
+                agent_name="tool_orchestration_agent",
+                default_model="gpt-4o-mini",
+                llm_params={
+                    "temperature": 0.0,
+                    "max_tokens": 2000
+                },
+                call=call,
+                validate=lambda invocations: self._find_native_plan_errors(invocations, tool_summaries)
             )
         except Exception as exc:
-            logger.exception("Error invoking agent: %s", exc)
+            logger.exception("Error invoking function-calling agent: %s", exc)
             raise RuntimeError("Failed to invoke Tool Orchestration agent") from exc
 
-        if not response:
+        if not response or not response.tools:
             logger.warning("No tools matched the user input.")
             raise ValueError("Could not match any tools to user input.")
 
-        logger.info(f"Orchestrator Agent Response: {response}.")
+        metrics.increment("tool_orchestration_native_plans_total", parallel=str(len(response.tools) > 1).lower())
+        metrics.increment("tool_orchestration_native_tool_calls_total", value=len(response.tools))
+        logger.info(f"Orchestrator Agent Response (function calling): {response}.")
 
         return response
+
+    @staticmethod
+    def _find_native_plan_errors(invocations: ToolInvocations, tool_summaries: ToolsSummaryByServer | None) -> str | None:
+        if not invocations.tools:
+            return "empty_plan"
+        if not tool_summaries:
+            return None
+        return find_invocation_errors(invocations.tools, tool_summaries, allow_optional_parameters=True)
@@ -1,4 +1,3 @@
-import json
 import logging
 from typing import List, Dict, Any
 
@@ -12,12 +11,18 @@ from app.agents.tool_refinement_agent.tool_refinement_prompts import (
 )
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
 
 from app.caches.conversation_store import ConversationSession
-from app.schemas.tool_invocation import ToolInvocation
+from app.configs.app_config import config
+from app.schemas.tool_invocation import ToolInvocation, ToolInvocations
+from app.schemas.tool_summaries import ToolsSummaryByServer
 from app.utils.chat_util import chat_history_to_str
+from app.utils.prompt_layout import build_prefix_stable_prompt
 from common.utils.agent_utils import Utils
+from common.utils.llm_scheduler import PRIORITY_WORKFLOW
+from common.utils.model_cascade import model_cascade
+from common.utils.prompt_budget import prompt_budget, BudgetedPrompt
+from common.utils.tool_util import find_invocation_errors
 
 logger = logging.getLogger(__name__)
 
@@ -25,44 +30,35 @@ logger = logging.getLogger(__name__)
 class ToolRefinementAgent:
     def __init__(self) -> None:
         self.parser = PydanticOutputParser(pydantic_object=ToolInvocation)
-        self.prompt = self.build_prompt()
-
-    def build_prompt(self) -> ChatPromptTemplate:
-        return ChatPromptTemplate.from_messages(
-            [
-                (
-                    "system",
-                    f"""
-                    {AGENT_ROLE}
-
-                    Previous tool results:
-                    {{previous_result}}
-                    
-                    Chat history:
-                    {{chat_history}}
-                    
-                    Available tools:
-                    {{available_tools}}
-                    
-                    {ACCURACY_REQUIREMENT}
-                    
-                    {VALIDATION_TASKS}
-                    
-                    {EXAMPLES}
-                    
-                    {CRITICAL_RULES}
-                    
-                    {OUTPUT_REQUIREMENTS}
-                    
-                    Always return a valid JSON object:
-                    {{format_instructions}}
-                    """
-                ),
+        self.batch_parser = PydanticOutputParser(pydantic_object=ToolInvocations)
+        self.prompt = self.build_prompt(self.parser)
+        self.batch_prompt = self.build_prompt(self.batch_parser)
+        # Plans from native tool calls may carry optional parameters the tool summaries do not list.
+        self._native_plans = config.TOOL_ORCHESTRATION_MODE == "function_calling"
+
+    def build_prompt(self, parser: PydanticOutputParser) -> ChatPromptTemplate:
+        return build_prefix_stable_prompt(
+            static_sections=[
+                AGENT_ROLE,
+                ACCURACY_REQUIREMENT,
+                VALIDATION_TASKS,
+                EXAMPLES,
+                CRITICAL_RULES,
+                OUTPUT_REQUIREMENTS,
+                "Always return a valid JSON object:\n{format_instructions}"
+            ],
+            dynamic_sections=[
+                ("Available tools:", "available_tools"),
+                ("Chat history:", "chat_history"),
+                ("Previous tool results:", "previous_result")
+            ],
+            trailing_messages=[
                 ("placeholder", "{chat_history}"),
                 ("human", "{query}"),
                 ("placeholder", "{agent_scratchpad}")
-            ]
-        ).partial(format_instructions=self.parser.get_format_instructions())
+            ],
+            format_instructions=parser.get_format_instructions()
+        )
 
     def _build_query_prompt(
             self,
@@ -90,17 +86,118 @@ class ToolRefinementAgent:
             "Return the refined tool invocation with EXACT parameter compliance."
         )
 
-    def refine_tool_invocation(
+    def _build_batch_query_prompt(
+            self,
+            user_input: str,
+            tool_invocations: List[ToolInvocation]
+    ) -> str:
+        invocations_str = "\\n".join(str(tool_invocation) for tool_invocation in tool_invocations)
+        return (
+            f"Original user input: {user_input}\\n\\n"
+            f"Independent tool invocations to validate and refine (none of them needs another tool's output):\\n{invocations_str}\\n\\n"
+            "CRITICAL: You must achieve 95%+ accuracy. Missing details will cause workflow failures.\\n\\n"
+            "Refine EVERY invocation listed above, applying these tasks to each one with HIGH PRECISION:\\n"
+            "1. Validate the tool_name against the available tools list\\n"
+            "2. CHECK THE TOOL'S PARAMETER LIST - ONLY use parameters that are explicitly listed\\n"
+            "3. Extract ALL specific details from user input (IDs, emails, names, numbers, etc.)\\n"
+            "4. Enhance parameters with missing details while preserving exact structure\\n"
+            "5. NEVER add parameters that aren't in the tool's schema\\n"
+            "6. For 'ticker' parameters, use exact ticker symbols only\\n"
+            "7. For 'instruction' parameters, include comprehensive details\\n\\n"
+            "Return one refined invocation per input invocation in the 'tools' list, keeping each original rank "
+            "and depends_on value unchanged. Do NOT add, drop or merge invocations."
+        )
+
+    async def refine_tool_invocations(
+            self,
+            user_input: str,
+            tool_summaries_str: str,
+            conversation_session: ConversationSession,
+            tool_invocations: List[ToolInvocation],
+            tool_summaries: ToolsSummaryByServer | None = None,
+    ) -> List[ToolInvocation]:
+        """
+        Refines several independent invocations in a single LLM call. Returns only the invocations
+        the model actually refined; ones it dropped or renumbered are left out, so the caller
+        refines them step by step.
+        """
+        logger.info(f"Invoking Tool Refinement agent for a batch of {len(tool_invocations)} invocations")
+
+        budgeted: BudgetedPrompt = prompt_budget.fit(
+            agent_name="tool_refinement_agent",
+            chat_history=conversation_session.get_last_n_messages(10),
+            available_tools=tool_summaries_str
+        )
+
+        query_prompt: str = self._build_batch_query_prompt(
+            user_input=user_input,
+            tool_invocations=tool_invocations,
+        )
+
+        utils = Utils[ToolInvocations]
+
+        expected_ranks = {tool_invocation.rank for tool_invocation in tool_invocations}
+
+        def find_batch_errors(refined: ToolInvocations) -> str | None:
+            if {tool.rank for tool in refined.tools} != expected_ranks:
+                return "changed_ranks"
+            return find_invocation_errors(refined.tools, tool_summaries, check_dependencies=False, allow_optional_parameters=self._native_plans) if tool_summaries else None
+
+        response: ToolInvocations | None = await model_cascade.run(
+            agent_name="tool_refinement_agent",
+            default_model="gpt-4o-mini",
+            llm_params={},
+            call=lambda llm: utils.arun_agent_query(
+                llm=llm,
+                tools=[],
+                query=query_prompt,
+                parser=self.batch_parser,
+                prompt=self.batch_prompt,
+                chat_history=budgeted.chat_history,
+                available_tools=budgeted.available_tools,
+                allowed_tool_names=None,
+                previous_result="",
+                priority=PRIORITY_WORKFLOW,
+                agent_name="tool_refinement_agent"
+            ),
+            validate=find_batch_errors
+        )
+
+        if not response:
+            logger.warning("ToolRefinementAgent: No response for batch tool invocation update.")
+            return []
+
+        refined_by_rank: Dict[int, ToolInvocation] = {tool.rank: tool for tool in response.tools}
+        refined: List[ToolInvocation] = []
+
+        for tool_invocation in tool_invocations:
+            refined_tool = refined_by_rank.get(tool_invocation.rank)
+            if refined_tool is None:
+                logger.warning(f"ToolRefinementAgent: batch response missing rank {tool_invocation.rank}, leaving it to step refinement")
+            else:
+                refined.append(refined_tool.model_copy(update={"depends_on": tool_invocation.depends_on}))
+
+        logger.info(f"ToolRefinementAgent: Updated tool invocations: {refined}")
+
+        return refined
+
+    async def refine_tool_invocation(
             self,
             user_input: str,
             tool_summaries_str: str,
             conversation_session: ConversationSession,
             previous_result: List[Dict[str, Any]],
             tool_invocation: ToolInvocation,
+            tool_summaries: ToolsSummaryByServer | None = None,
     ) -> ToolInvocation:
         logger.info("Invoking Tool Refinement agent")
 
-        chat_history = conversation_session.get_last_n_messages(10)
+        budgeted: BudgetedPrompt = prompt_budget.fit(
+            agent_name="tool_refinement_agent",
+            chat_history=conversation_session.get_last_n_messages(10),
+            available_tools=tool_summaries_str,
+            previous_result=previous_result
+        )
 
         query_prompt: str = self._build_query_prompt(
             user_input=user_input,
@@ -109,16 +206,26 @@ class ToolRefinementAgent:
 
         utils = Utils[ToolInvocation]
 
-        response: ToolInvocation | None = utils.run_agent_query(
-            llm=ChatOpenAI(model="gpt-4o-mini"),
-            tools=[],
-            query=query_prompt,
-            parser=self.parser,
-            prompt=self.prompt,
-            chat_history=chat_history,
-            available_tools=tool_summaries_str,
-            allowed_tool_names=None,
-            previous_result=json.dumps(previous_result, indent=2)
+        response: ToolInvocation | None = await model_cascade.run(
+            agent_name="tool_refinement_agent",
+            default_model="gpt-4o-mini",
+            llm_params={},
+            call=lambda llm: utils.arun_agent_query(
+                llm=llm,
+                tools=[],
+                query=query_prompt,
+                parser=self.parser,
+                prompt=self.prompt,
+                chat_history=budgeted.chat_history,
+                available_tools=budgeted.available_tools,
+                allowed_tool_names=None,
+                previous_result=budgeted.previous_result,
+                priority=PRIORITY_WORKFLOW,
+                agent_name="tool_refinement_agent"
+            ),
+            validate=lambda refined: (
+                find_invocation_errors([refined], tool_summaries, check_dependencies=False, allow_optional_parameters=self._native_plans) if tool_summaries else None
+            )
         )
 
         if not response:
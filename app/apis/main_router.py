@@ -17,3 +17,7 @@ main_router.include_router(configs_router)
 # Add chat routes
 from app.apis.chat.router import router as chat_router
 main_router.include_router(chat_router)
+
+# Add metrics routes
+from app.apis.metrics.router import router as metrics_router
+main_router.include_router(metrics_router)
@@ -0,0 +1,160 @@
+import logging
+from typing import Any, Dict
+
+from fastapi import APIRouter, HTTPException
+
+from app.agents.agent_registry import agent_registry
+from app.agents.streaming_agent.inline_streams import inline_streams
+from app.caches.router_decision_cache import router_decision_cache
+from app.configs.app_config import config
+from common.services.llm_client_registry import llm_registry
+from common.utils import structured_output
+from common.utils.context_store import context_store
+from common.utils.hedging import request_hedger
+from common.utils.llm_scheduler import llm_scheduler
+from common.utils.llm_telemetry import llm_telemetry
+from common.utils.metrics import metrics
+from common.utils.model_cascade import model_cascade
+from common.utils.rate_limiter import rate_limiter
+from common.utils.singleflight import singleflight
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["metrics"],
+)
+
+logger = logging.getLogger("metrics")
+
+
+@router.get("", response_model=Dict[str, Any])
+async def get_metrics():
+    """Get all process-local counters and histograms."""
+    try:
+        return metrics.snapshot()
+    except Exception as e:
+        logger.exception("Failed to collect metrics")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/llm-clients", response_model=Dict[str, Any])
+async def get_llm_client_stats():
+    """Get LLM client registry, connection pool and connection-reuse stats."""
+    try:
+        return llm_registry.get_stats()
+    except Exception as e:
+        logger.exception("Failed to collect LLM client stats")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/router-cache", response_model=Dict[str, Any])
+async def get_router_cache_stats():
+    """Get router decision cache size, hit/miss counters and LLM calls saved."""
+    try:
+        return router_decision_cache.get_stats()
+    except Exception as e:
+        logger.exception("Failed to collect router cache stats")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/agents", response_model=Dict[str, Any])
+async def get_agent_registry_stats():
+    """Get agent registry warm-up state and one-time build cost."""
+    try:
+        return agent_registry.get_stats()
+    except Exception as e:
+        logger.exception("Failed to collect agent registry stats")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/structured-output", response_model=Dict[str, Any])
+async def get_structured_output_stats():
+    """Get per-schema structured-output parse outcomes, repair and failure rates."""
+    try:
+        return structured_output.get_stats()
+    except Exception as e:
+        logger.exception("Failed to collect structured output stats")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/singleflight", response_model=Dict[str, Any])
+async def get_singleflight_stats():
+    """Get in-flight LLM call and stream coalescing state."""
+    try:
+        return singleflight.get_stats()
+    except Exception as e:
+        logger.exception("Failed to collect singleflight stats")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/rate-limit", response_model=Dict[str, Any])
+async def get_rate_limit_stats():
+    """Get the cluster-wide LLM rate limiter configuration."""
+    try:
+        return rate_limiter.get_stats()
+    except Exception as e:
+        logger.exception("Failed to collect rate limiter stats")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/scheduler", response_model=Dict[str, Any])
+async def get_scheduler_stats():
+    """Get LLM scheduler concurrency, per-class active and queued calls."""
+    try:
+        return llm_scheduler.get_stats()
+    except Exception as e:
+        logger.exception("Failed to collect scheduler stats")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/llm-calls", response_model=Dict[str, Any])
+async def get_llm_call_stats():
+    """Get per-agent LLM call counts, retries, errors, latency, tokens and cost."""
+    try:
+        return llm_telemetry.get_stats()
+    except Exception as e:
+        logger.exception("Failed to collect LLM call stats")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/hedging", response_model=Dict[str, Any])
+async def get_hedging_stats():
+    """Get hedge delays, hedge rate and win rate per agent and model."""
+    try:
+        return request_hedger.get_stats()
+    except Exception as e:
+        logger.exception("Failed to collect hedging stats")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/cascade", response_model=Dict[str, Any])
+async def get_cascade_stats():
+    """Get accepted, escalated and exhausted calls and the escalation rate per agent and tier."""
+    try:
+        return model_cascade.get_stats()
+    except Exception as e:
+        logger.exception("Failed to collect cascade stats")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/streaming", response_model=Dict[str, Any])
+async def get_streaming_stats():
+    """Get the streaming execution mode, running inline replies and dispatches per mode."""
+    try:
+        return {
+            "mode": config.STREAMING_EXECUTION_MODE,
+            "inline_max_concurrency": config.STREAMING_INLINE_MAX_CONCURRENCY,
+            **inline_streams.get_stats()
+        }
+    except Exception as e:
+        logger.exception("Failed to collect streaming stats")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/context-store", response_model=Dict[str, Any])
+async def get_context_store_stats():
+    """Get task payload bytes sent and saved per task, context store reads/writes and the local cache size."""
+    try:
+        return context_store.get_stats()
+    except Exception as e:
+        logger.exception("Failed to collect context store stats")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -55,6 +55,13 @@ class ConversationSession:
                 return message.get("content", "")
         return ""
 
+    def get_last_assistant_message(self) -> str:
+        """Get the last assistant message content"""
+        for message in reversed(self.messages):
+            if message.get("role") == "assistant":
+                return message.get("content", "")
+        return ""
+
     def get_count(self) -> int:
         """Get the number of messages in this session"""
         return len(self.messages)
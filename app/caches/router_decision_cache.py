@@ -0,0 +1,154 @@
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.configs.app_config import config
+from app.schemas.router_decision import RouterDecision
+from common.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s.!?,;:]+$")
+
+
+class RouterDecisionCache:
+    """
+    Two-level router decision cache: an in-process LRU in front of Redis.
+
+    Entries are keyed by a hash of the normalized user input, the chat history window the
+    router sees and the tool-summary string, so a decision is only reused when the router
+    would have been given exactly the same inputs.
+    """
+
+    KEY_PREFIX = "router_decision:"
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, Tuple[float, RouterDecision]] = OrderedDict()
+
+    @staticmethod
+    def normalize_input(user_input: str) -> str:
+        normalized = _WHITESPACE.sub(" ", user_input.strip().lower())
+        return _TRAILING_PUNCTUATION.sub("", normalized)
+
+    @classmethod
+    def build_key(
+            cls,
+            user_input: str,
+            chat_history: List[Dict[str, Any]],
+            tool_summaries_str: str
+    ) -> str:
+        history = [{"role": msg.get("role"), "content": msg.get("content")} for msg in chat_history]
+        digest = hashlib.sha256()
+
+        for part in (
+                cls.normalize_input(user_input),
+                json.dumps(history, sort_keys=True, default=str),
+                tool_summaries_str or "",
+        ):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\x00")
+
+        return digest.hexdigest()
+
+    async def get(self, key: str) -> Optional[RouterDecision]:
+        decision = self._get_local(key)
+        if decision is not None:
+            metrics.increment("router_cache_requests_total", result="hit_local")
+            return decision
+
+        decision = await self._get_remote(key)
+        if decision is not None:
+            self._set_local(key, decision)
+            metrics.increment("router_cache_requests_total", result="hit_redis")
+            return decision
+
+        metrics.increment("router_cache_requests_total", result="miss")
+        return None
+
+    async def set(self, key: str, decision: RouterDecision) -> None:
+        self._set_local(key, decision)
+
+        try:
+            from app.infrastructure import infra
+            await infra.async_redis_client.set(
+                f"{self.KEY_PREFIX}{key}",
+                decision.model_dump_json(),
+                ex=self.ttl_seconds
+            )
+        except Exception as e:
+            logger.warning(f"Failed to store router decision in Redis: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        hits_local = metrics.get_counter("router_cache_requests_total", result="hit_local")
+        hits_redis = metrics.get_counter("router_cache_requests_total", result="hit_redis")
+        misses = metrics.get_counter("router_cache_requests_total", result="miss")
+        lookups = hits_local + hits_redis + misses
+
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits_local": int(hits_local),
+            "hits_redis": int(hits_redis),
+            "misses": int(misses),
+            "hit_ratio": round((hits_local + hits_redis) / lookups, 4) if lookups else 0.0,
+            "llm_calls_saved": int(hits_local + hits_redis),
+        }
+
+    def clear_cache(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _get_local(self, key: str) -> Optional[RouterDecision]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, decision = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return decision
+
+    def _set_local(self, key: str, decision: RouterDecision) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, decision)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def _get_remote(self, key: str) -> Optional[RouterDecision]:
+        try:
+            from app.infrastructure import infra
+            cached = await infra.async_redis_client.get(f"{self.KEY_PREFIX}{key}")
+        except Exception as e:
+            logger.warning(f"Failed to read router decision from Redis: {e}")
+            return None
+
+        if not cached:
+            return None
+
+        try:
+            return RouterDecision.model_validate_json(cached)
+        except Exception as e:
+            logger.warning(f"Discarding invalid cached router decision: {e}")
+            return None
+
+
+router_decision_cache = RouterDecisionCache(
+    max_entries=config.ROUTER_CACHE_MAX_ENTRIES,
+    ttl_seconds=config.ROUTER_CACHE_TTL_SECONDS
+)
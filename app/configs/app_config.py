@@ -13,6 +13,45 @@ class AppConfig(BaseSettings):
     DEBUGGER: Optional[str] = cast(Optional[str], os.getenv("DEBUGGER", None))
     DEBUGGER_PORT: int = int(os.getenv("DEBUGGER_PORT", "5678"))
 
+    # "two_step": RouterAgent then ToolOrchestrationAgent. "fused": one FusedRoutingAgent call routes and plans.
+    AGENT_ROUTING_MODE: str = os.getenv("AGENT_ROUTING_MODE", "two_step").lower()
+    ROUTER_HISTORY_WINDOW: int = int(os.getenv("ROUTER_HISTORY_WINDOW", "10"))
+    ROUTER_DETERMINISTIC: bool = os.getenv("ROUTER_DETERMINISTIC", "true").lower() == "true"
+    ROUTER_CACHE_ENABLED: bool = os.getenv("ROUTER_CACHE_ENABLED", "true").lower() == "true"
+    ROUTER_CACHE_MAX_ENTRIES: int = int(os.getenv("ROUTER_CACHE_MAX_ENTRIES", "2048"))
+    ROUTER_CACHE_TTL_SECONDS: int = int(os.getenv("ROUTER_CACHE_TTL_SECONDS", "900"))
+
+    # Start the likely next stage while the router runs: "off", "tools", "chat" or "adaptive" (pre-router lean).
+    SPECULATIVE_ROUTING_POLICY: str = os.getenv("SPECULATIVE_ROUTING_POLICY", "off").lower()
+    SPECULATIVE_ROUTING_MIN_CONFIDENCE: float = float(os.getenv("SPECULATIVE_ROUTING_MIN_CONFIDENCE", "0.5"))
+    # A speculative chat reply holds its history write and `complete` frame until the router confirms
+    # the branch; with no verdict after this long it is dropped.
+    SPECULATIVE_CHAT_COMMIT_TIMEOUT_SECONDS: float = float(os.getenv("SPECULATIVE_CHAT_COMMIT_TIMEOUT_SECONDS", "30"))
+
+    # "json": the planner writes a ToolInvocations JSON blob from the tool catalog in its prompt.
+    # "function_calling": MCP tool schemas are sent as native tools and the plan is read from parallel tool calls.
+    TOOL_ORCHESTRATION_MODE: str = os.getenv("TOOL_ORCHESTRATION_MODE", "json").lower()
+
+    # Stream the "json" plan and run each tool as soon as its invocation is complete.
+    TOOL_PLAN_STREAMING: bool = os.getenv("TOOL_PLAN_STREAMING", "false").lower() == "true"
+
+    # Token deltas are coalesced into one stream frame per window; 0 ms publishes every delta.
+    STREAM_FLUSH_INTERVAL_MS: float = float(os.getenv("STREAM_FLUSH_INTERVAL_MS", "20"))
+    STREAM_FLUSH_MAX_BYTES: int = int(os.getenv("STREAM_FLUSH_MAX_BYTES", "256"))
+
+    # "inline" streams chat replies from the backend's event loop straight to the websocket;
+    # replies beyond STREAMING_INLINE_MAX_CONCURRENCY overflow to the Celery worker.
+    STREAMING_EXECUTION_MODE: str = os.getenv("STREAMING_EXECUTION_MODE", "celery").lower()
+    STREAMING_INLINE_MAX_CONCURRENCY: int = int(os.getenv("STREAMING_INLINE_MAX_CONCURRENCY", "16"))
+    # Also write inline replies to their Redis stream, coalesced, so they can be replayed.
+    STREAMING_INLINE_DURABLE: bool = os.getenv("STREAMING_INLINE_DURABLE", "false").lower() == "true"
+
+    TOOL_REFINEMENT_BATCHING: bool = os.getenv("TOOL_REFINEMENT_BATCHING", "true").lower() == "true"
+
+    PRE_ROUTER_ENABLED: bool = os.getenv("PRE_ROUTER_ENABLED", "true").lower() == "true"
+    PRE_ROUTER_CONFIDENCE_THRESHOLD: float = float(os.getenv("PRE_ROUTER_CONFIDENCE_THRESHOLD", "0.9"))
+    ROUTER_DECISION_LOG_PATH: Optional[str] = cast(Optional[str], os.getenv("ROUTER_DECISION_LOG_PATH", None))
+
     def allowed_origins(self):
         env_origins = os.getenv("ALLOWED_ORIGINS")
         if env_origins:
@@ -1,17 +1,49 @@
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional
+import re
+import time
+from typing import List, Dict, Any, Optional, Tuple
+from langchain_core.callbacks import adispatch_custom_event
 from langgraph.graph import StateGraph
 
+from app.agents.agent_registry import agent_registry
+from app.agents.streaming_agent.stream_publisher import AsyncCoalescingPublisher
 from app.agents.tool_orchestration_agent.tool_orchestration_agent import ToolOrchestrationAgent
 from app.agents.tool_refinement_agent.tool_refinement_agent import ToolRefinementAgent
 from app.schemas.tool_invocation import ToolInvocation, ToolInvocations
 from app.schemas.tool_result import ToolResult
+from app.schemas.tool_summaries import ToolsSummaryByServer
 from app.services.mcp_service import MCPService
 from app.caches.conversation_store import ConversationSession
-from common.utils.tool_util import format_final_summary_result
+from app.configs.app_config import config
+from common.utils.agent_utils import Utils
+from common.utils.context_store import context_store
+from common.utils.llm_scheduler import get_request_context
+from common.utils.llm_telemetry import get_turn_id
+from common.utils.metrics import metrics
+from common.utils.tool_util import format_final_summary_result, find_invocation_errors
 
 logger = logging.getLogger(__name__)
 
+PREVIOUS_RESULT_REFERENCE = re.compile(
+    r"\b(previous|prior|above|earlier|those|these|the results?|that (data|info|information)|from step)\b",
+    re.IGNORECASE
+)
+
+NODE_LABELS = {
+    "tool_orchestrator": "Planning tool invocations",
+    "tool_planner": "Running tools",
+    "tool_streaming_planner": "Planning and running tools",
+}
+
+NODE_SECONDS_BUCKETS: Tuple[float, ...] = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Custom events raised inside nodes and turned into result-stream writes by run().
+PROGRESS_EVENT = "workflow_progress"
+TOOL_FINISHED_EVENT = "workflow_tool_finished"
+STREAMED_RESPONSE_EVENT = "workflow_streamed_response"
+
+
 class ToolOrchestrationGraph:
     def __init__(self):
         self.graph = self._build_graph()
@@ -20,21 +52,41 @@ class ToolOrchestrationGraph:
         builder = StateGraph(dict)
         builder.add_node("tool_orchestrator", self.tool_orchestrator_node)
         builder.add_node("tool_planner", self.planner_node)
-
-        builder.set_entry_point("tool_orchestrator")
+        builder.add_node("tool_streaming_planner", self.streaming_planner_node)
+
+        builder.set_conditional_entry_point(
+            self._select_entry_node,
+            {
+                "tool_orchestrator": "tool_orchestrator",
+                "tool_planner": "tool_planner",
+                "tool_streaming_planner": "tool_streaming_planner"
+            }
+        )
         builder.add_edge("tool_orchestrator", "tool_planner")
         builder.set_finish_point("tool_planner")
+        builder.set_finish_point("tool_streaming_planner")
 
         return builder.compile()
 
+    @staticmethod
+    def _select_entry_node(state: dict) -> str:
+        # A plan supplied up front (fused routing) skips the orchestrator call entirely.
+        if state["tool_invocations"].tools:
+            return "tool_planner"
+        if config.TOOL_PLAN_STREAMING and config.TOOL_ORCHESTRATION_MODE == "json":
+            return "tool_streaming_planner"
+        return "tool_orchestrator"
+
     async def tool_orchestrator_node(self, state: dict) -> dict:
         try:
-            tool_orchestrator_agent: ToolOrchestrationAgent = ToolOrchestrationAgent()
+            tool_orchestrator_agent: ToolOrchestrationAgent = agent_registry.tool_orchestration_agent
 
-            response: ToolInvocations = tool_orchestrator_agent.invoke_multi_step_agent(
+            response: ToolInvocations = await tool_orchestrator_agent.invoke_multi_step_agent(
                 tool_summaries_str=state["tool_summaries_str"],
                 user_input=state["query"],
-                conversation_session=state["conversation_session"]
+                conversation_session=state["conversation_session"],
+                tool_summaries=state.get("tool_summaries"),
+                mcp_service=state["mcp_service"]
             )
 
             if response is None or not response.tools:
@@ -50,10 +102,18 @@ class ToolOrchestrationGraph:
     async def planner_node(self, state: dict) -> dict:
         tools = state["tool_invocations"].tools
 
+        if state.get("routing_started_at") is not None:
+            metrics.observe(
+                "routing_latency_seconds",
+                time.perf_counter() - state["routing_started_at"],
+                routing_mode=state.get("routing_mode"),
+                route="tools"
+            )
+
         if not tools:
             fallback_prompt = self.create_fallback_response(state, error_message="No tool invocations found.")
             
-            self._invoke_streamed_response(
+            await self._invoke_streamed_response(
                 agent_name="chat_agent",
                 session_id=state["session_id"],
                 user_input=state["query"],
@@ -63,8 +123,9 @@ class ToolOrchestrationGraph:
             )
             return state
 
-        tool_refinement_agent: ToolRefinementAgent = ToolRefinementAgent()
+        tool_refinement_agent: ToolRefinementAgent = agent_registry.tool_refinement_agent
         tool_summaries_str: str = state["tool_summaries_str"]
+        tool_summaries: ToolsSummaryByServer | None = state.get("tool_summaries")
         mcp_service: MCPService = state["mcp_service"]
         conversation_session: ConversationSession = state["conversation_session"]
         user_input: str = state["query"]
@@ -75,10 +136,17 @@ class ToolOrchestrationGraph:
 
         tool_results: List[ToolResult] = []
 
+        batch_refined: Dict[int, ToolInvocation] = await self._batch_refine_independent_tools(
+            tool_refinement_agent=tool_refinement_agent,
+            sorted_tools=sorted_tools,
+            user_input=user_input,
+            conversation_session=conversation_session,
+            tool_summaries_str=tool_summaries_str,
+            tool_summaries=tool_summaries
+        )
+
         logger.info(f"🚀 Starting workflow with {tools_length} tools for session {state['session_id']}")
-        self._send_progress_update(
-            session_id=state["session_id"],
-            result_channel=result_channel,
+        await self._send_progress_update(
             tool_name="workflow_start",
             progress_step=0,
             tool_len=tools_length,
@@ -87,9 +155,7 @@ class ToolOrchestrationGraph:
 
         for idx, tool in enumerate(sorted_tools, 1):
             logger.info(f"🔧 Executing tool {idx}/{tools_length}: {tool.tool_name}")
-            self._send_progress_update(
-                session_id=state["session_id"],
-                result_channel=result_channel,
+            await self._send_progress_update(
                 tool_name=tool.tool_name,
                 progress_step=idx,
                 tool_len=tools_length,
@@ -97,13 +163,17 @@ class ToolOrchestrationGraph:
             )
 
             try:
-                updated_tool: ToolInvocation = tool_refinement_agent.refine_tool_invocation(
-                    user_input=user_input,
-                    tool_invocation=tool,
-                    previous_result=previous_result,
-                    conversation_session=conversation_session,
-                    tool_summaries_str=tool_summaries_str
-                )
+                updated_tool: ToolInvocation | None = batch_refined.get(tool.rank)
+
+                if updated_tool is None:
+                    updated_tool = await tool_refinement_agent.refine_tool_invocation(
+                        user_input=user_input,
+                        tool_invocation=tool,
+                        previous_result=previous_result,
+                        conversation_session=conversation_session,
+                        tool_summaries_str=tool_summaries_str,
+                        tool_summaries=tool_summaries
+                    )
 
                 logger.info(f"ToolRefinementAgent updated tool invocation: {updated_tool}")
 
@@ -111,7 +181,8 @@ class ToolOrchestrationGraph:
                     user_input=user_input,
                     mcp_service=mcp_service,
                     conversation_session=conversation_session,
-                    updated_tool=updated_tool
+                    updated_tool=updated_tool,
+                    progress_step=idx
                 )
 
                 tool_results.append(ToolResult(
@@ -127,7 +198,7 @@ class ToolOrchestrationGraph:
                 logger.error(f"Failed to invoke tool '{tool.tool_name}' at step {idx}: {e}")
                 fallback_prompt = self.create_fallback_response(state, error_message=str(e))
                 
-                self._invoke_streamed_response(
+                await self._invoke_streamed_response(
                     agent_name="chat_agent",
                     session_id=state["session_id"],
                     user_input=user_input,
@@ -139,7 +210,7 @@ class ToolOrchestrationGraph:
 
         logger.info(f"📝 Invoking summary agent for session {state['session_id']}")
 
-        self._invoke_streamed_response(
+        await self._invoke_streamed_response(
             agent_name="summary_agent",
             session_id=state["session_id"],
             user_input=user_input,
@@ -151,17 +222,252 @@ class ToolOrchestrationGraph:
 
         return state
 
+    async def streaming_planner_node(self, state: dict) -> dict:
+        """
+        Plans and executes in one node: the orchestrator's output is parsed while it streams and
+        each tool runs as soon as its invocation closes, in arrival order. Every tool after the first
+        is refined against the earlier output, as in planner_node; the first runs as planned unless
+        it fails the local catalog check.
+        """
+        tool_refinement_agent: ToolRefinementAgent = agent_registry.tool_refinement_agent
+        tool_summaries_str: str = state["tool_summaries_str"]
+        tool_summaries: ToolsSummaryByServer | None = state.get("tool_summaries")
+        mcp_service: MCPService = state["mcp_service"]
+        conversation_session: ConversationSession = state["conversation_session"]
+        user_input: str = state["query"]
+        result_channel: str = state["result_channel"]
+        previous_result: List[Dict[str, Any]] = []
+        tool_results: List[ToolResult] = []
+        tool_spans: List[Tuple[float, float]] = []
+
+        started_at = time.perf_counter()
+        plan: asyncio.Queue = asyncio.Queue()
+        planned: List[ToolInvocation] = []
+        producer = asyncio.create_task(self._stream_plan(state, plan))
+
+        try:
+            while (tool := await plan.get()) is not None:
+                planned.append(tool)
+                idx = len(planned)
+
+                if idx == 1:
+                    metrics.observe("tool_plan_first_dispatch_seconds", time.perf_counter() - started_at)
+                    if state.get("routing_started_at") is not None:
+                        metrics.observe(
+                            "routing_latency_seconds",
+                            time.perf_counter() - state["routing_started_at"],
+                            routing_mode=state.get("routing_mode"),
+                            route="tools"
+                        )
+
+                # Invocations known so far; a finished producer has also queued the end marker.
+                known = idx + plan.qsize() - (1 if producer.done() else 0)
+                logger.info(f"🔧 Executing streamed tool {idx}: {tool.tool_name}")
+                await self._send_progress_update(
+                    tool_name=tool.tool_name,
+                    progress_step=idx,
+                    tool_len=known,
+                    message=f"Executing {tool.tool_name} currently on step {idx}/{known}"
+                    + ("" if producer.done() else " (plan still streaming)")
+                )
+
+                tool_started_at = time.perf_counter()
+                try:
+                    # Whether a later step uses earlier output cannot be told reliably from the plan,
+                    # so only a step with no earlier output to see skips refinement.
+                    needs_refinement = bool(previous_result) or (
+                        tool_summaries is not None
+                        and find_invocation_errors([tool], tool_summaries, check_dependencies=False, allow_optional_parameters=True) is not None
+                    )
+
+                    updated_tool: ToolInvocation = tool
+                    if needs_refinement:
+                        updated_tool = await tool_refinement_agent.refine_tool_invocation(
+                            user_input=user_input,
+                            tool_invocation=tool,
+                            previous_result=previous_result,
+                            conversation_session=conversation_session,
+                            tool_summaries_str=tool_summaries_str,
+                            tool_summaries=tool_summaries
+                        )
+
+                    result = await self._invoke_and_store_tool(
+                        user_input=user_input,
+                        mcp_service=mcp_service,
+                        conversation_session=conversation_session,
+                        updated_tool=updated_tool,
+                        progress_step=idx
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to invoke streamed tool '{tool.tool_name}' at step {idx}: {e}")
+                    await self._invoke_streamed_response(
+                        agent_name="chat_agent",
+                        session_id=state["session_id"],
+                        user_input=user_input,
+                        result_channel=result_channel,
+                        tool_summaries_str=tool_summaries_str,
+                        chat_history_str=conversation_session.get_last_n_messages(10)
+                    )
+                    return state
+
+                tool_spans.append((tool_started_at, time.perf_counter()))
+                tool_results.append(ToolResult(
+                    tool_name=updated_tool.tool_name,
+                    input_data=updated_tool.input_data,
+                    output=result
+                ))
+                previous_result.append(result)
+        finally:
+            producer.cancel()
+
+        state["tool_invocations"] = ToolInvocations(tools=planned)
+
+        if not planned:
+            await self._invoke_streamed_response(
+                agent_name="chat_agent",
+                session_id=state["session_id"],
+                user_input=user_input,
+                result_channel=result_channel,
+                tool_summaries_str=tool_summaries_str,
+                chat_history_str=conversation_session.get_last_n_messages(10)
+            )
+            return state
+
+        self._record_plan_overlap(state["plan_completed_at"] - started_at, state["plan_completed_at"], tool_spans)
+
+        logger.info(f"📝 Invoking summary agent for session {state['session_id']}")
+
+        await self._invoke_streamed_response(
+            agent_name="summary_agent",
+            session_id=state["session_id"],
+            user_input=user_input,
+            result_channel=result_channel,
+            tool_summaries_str=tool_summaries_str,
+            chat_history_str=conversation_session.get_last_n_messages(10),
+            final_result=format_final_summary_result(tool_results)
+        )
+
+        return state
+
+    async def _stream_plan(self, state: dict, plan: asyncio.Queue) -> None:
+        """Feeds streamed invocations into plan and ends it with None, also when the stream fails."""
+        try:
+            async for tool in agent_registry.tool_orchestration_agent.stream_multi_step_agent(
+                    tool_summaries_str=state["tool_summaries_str"],
+                    user_input=state["query"],
+                    conversation_session=state["conversation_session"]
+            ):
+                await plan.put(tool)
+        except Exception as e:
+            logger.error(f"Error streaming multi-step agent plan: {e}")
+        finally:
+            state["plan_completed_at"] = time.perf_counter()
+            plan.put_nowait(None)
+
+    @staticmethod
+    def _record_plan_overlap(plan_seconds: float, plan_completed_at: float, tool_spans: List[Tuple[float, float]]) -> None:
+        """
+        Tool time spent before the plan finished is time a wait-for-the-whole-plan run would have
+        added to the turn, so it is recorded as the wall-clock saving.
+        """
+        saved = sum(max(0.0, min(finished, plan_completed_at) - started) for started, finished in tool_spans)
+        metrics.observe("tool_plan_generation_seconds", plan_seconds)
+        metrics.observe("tool_plan_streaming_saved_seconds", saved)
+        logger.info(f"Streamed plan took {plan_seconds:.2f}s; {saved:.2f}s of tool execution overlapped it")
+
+    @staticmethod
+    def _is_declared_independent(tool: ToolInvocation, is_first: bool, plan_declares_dependencies: bool) -> bool:
+        """
+        True when the invocation can be refined without earlier output: the first step, or one the
+        planner explicitly gave `depends_on: []` in a plan that filled depends_on for every step.
+        """
+        if is_first:
+            return True
+
+        if not plan_declares_dependencies or tool.depends_on:
+            return False
+
+        # An explicit [] is still overruled by inputs that point back at earlier output
+        # ("email those results", "the previous data").
+        return not any(
+            isinstance(value, str) and PREVIOUS_RESULT_REFERENCE.search(value)
+            for value in tool.input_data.values()
+        )
+
+    async def _batch_refine_independent_tools(
+            self,
+            tool_refinement_agent: ToolRefinementAgent,
+            sorted_tools: List[ToolInvocation],
+            user_input: str,
+            conversation_session: ConversationSession,
+            tool_summaries_str: str,
+            tool_summaries: Optional[ToolsSummaryByServer] = None
+    ) -> Dict[int, ToolInvocation]:
+        """
+        Refine every invocation that needs no earlier output in one LLM call, keyed by rank. This
+        runs before any tool, so a step qualifies only if the plan says so explicitly; anything
+        else is refined step by step against the earlier results.
+        """
+        if not config.TOOL_REFINEMENT_BATCHING:
+            return {}
+
+        plan_declares_dependencies = all("depends_on" in tool.model_fields_set for tool in sorted_tools)
+        independent_tools: List[ToolInvocation] = [
+            tool for idx, tool in enumerate(sorted_tools)
+            if self._is_declared_independent(tool, is_first=idx == 0, plan_declares_dependencies=plan_declares_dependencies)
+        ]
+
+        if len(independent_tools) < 2:
+            return {}
+
+        try:
+            refined_tools: List[ToolInvocation] = await tool_refinement_agent.refine_tool_invocations(
+                user_input=user_input,
+                tool_summaries_str=tool_summaries_str,
+                conversation_session=conversation_session,
+                tool_invocations=independent_tools,
+                tool_summaries=tool_summaries
+            )
+        except Exception as e:
+            logger.warning(f"Batch tool refinement failed, refining step by step: {e}")
+            return {}
+
+        # One call stood in for one per refined invocation; missing ranks are refined per step later.
+        if len(refined_tools) > 1:
+            metrics.increment("tool_refinement_calls_saved_total", value=len(refined_tools) - 1)
+        logger.info(f"Batch refined {len(refined_tools)} independent tools of {len(sorted_tools)}")
+
+        return {tool.rank: tool for tool in refined_tools}
+
     async def _invoke_and_store_tool(
             self,
             user_input: str,
             mcp_service: MCPService,
             updated_tool: ToolInvocation,
             conversation_session: ConversationSession,
+            progress_step: int
     ):
-        result = await mcp_service.invoke_tool(
-            tool_name=updated_tool.tool_name,
-            input_data=updated_tool.input_data
-        )
+        started_at = time.perf_counter()
+        try:
+            result = await mcp_service.invoke_tool(
+                tool_name=updated_tool.tool_name,
+                input_data=updated_tool.input_data
+            )
+        except Exception:
+            await adispatch_custom_event(TOOL_FINISHED_EVENT, {
+                "tool_name": updated_tool.tool_name,
+                "progress_step": progress_step,
+                "seconds": time.perf_counter() - started_at,
+                "status": "error"
+            })
+            raise
+
+        await adispatch_custom_event(TOOL_FINISHED_EVENT, {
+            "tool_name": updated_tool.tool_name,
+            "progress_step": progress_step,
+            "seconds": time.perf_counter() - started_at,
+            "status": "ok"
+        })
 
         conversation_session.add_message({
             "role": "assistant",
@@ -186,30 +492,47 @@ class ToolOrchestrationGraph:
 
         return fallback_prompt
 
-    def _send_progress_update(self, session_id: str, result_channel: str, tool_name: str, progress_step: int, tool_len: int, message: str) -> None:
+    async def _send_progress_update(self, tool_name: str, progress_step: int, tool_len: int, message: str) -> None:
         logger.info(f"📤 Sending progress update: {message}")
-        from worker.tasks import send_progress_update
-        send_progress_update.delay(
-            session_id=session_id,
-            result_channel=result_channel,
-            tool_name=tool_name,
-            progress_step=progress_step,
-            tool_len=tool_len,
-            message=message
-        )
+        await adispatch_custom_event(PROGRESS_EVENT, {
+            "tool_name": tool_name,
+            "progress_step": progress_step,
+            "tool_len": tool_len,
+            "message": message
+        })
 
-    def _invoke_streamed_response(self, agent_name: str, session_id: str, user_input: str, result_channel: str, tool_summaries_str: str, chat_history_str: str, final_result: str | None = None) -> None:
+    async def _invoke_streamed_response(self, agent_name: str, session_id: str, user_input: str, result_channel: str, tool_summaries_str: str, chat_history_str: str, final_result: str | None = None) -> None:
+        # Handed to run() rather than enqueued here, so the answer starts after every progress
+        # frame emitted before it has been written.
+        await adispatch_custom_event(STREAMED_RESPONSE_EVENT, {
+            "agent_name": agent_name,
+            "session_id": session_id,
+            "user_input": user_input,
+            "result_channel": result_channel,
+            "tool_summaries_str": tool_summaries_str,
+            "chat_history_str": chat_history_str,
+            "final_result": final_result
+        })
+
+    async def _dispatch_streamed_response(self, agent_name: str, session_id: str, user_input: str, result_channel: str, tool_summaries_str: str, chat_history_str: str, final_result: str | None = None) -> None:
         logger.info(f"📤 Invoking streamed response for {agent_name}")
-        from worker.tasks import invoke_streamed_response
-        invoke_streamed_response.delay(
-            agent_name=agent_name,
-            session_id=session_id,
-            user_input=user_input,
-            result_channel=result_channel,
-            tool_summaries_str=tool_summaries_str,
-            chat_history_str=chat_history_str,
-            final_result=final_result
+        from worker.tasks import invoke_streamed_response, STREAMED_RESPONSE_CONTEXT_FIELDS
+        task_kwargs = await context_store.aexternalize(
+            invoke_streamed_response.name,
+            {
+                "agent_name": agent_name,
+                "session_id": session_id,
+                "user_input": user_input,
+                "result_channel": result_channel,
+                "tool_summaries_str": tool_summaries_str,
+                "chat_history_str": chat_history_str,
+                "final_result": final_result,
+                "user_id": get_request_context()[0],
+                "turn_id": get_turn_id()
+            },
+            STREAMED_RESPONSE_CONTEXT_FIELDS
         )
+        await Utils.run_sync(invoke_streamed_response.delay, **task_kwargs)
 
     async def run(
             self,
@@ -219,15 +542,81 @@ class ToolOrchestrationGraph:
             tool_summaries_str: str,
             mcp_service: MCPService,
             conversation_session: ConversationSession,
-    ) -> None:
+            tool_invocations: Optional[ToolInvocations] = None,
+            tool_summaries: Optional[ToolsSummaryByServer] = None,
+            routing_mode: Optional[str] = None,
+            routing_started_at: Optional[float] = None,
+    ) -> Optional[dict]:
         initial_state = {
             "session_id": session_id,
             "query": query,
             "mcp_service": mcp_service,
             "tool_summaries_str": tool_summaries_str,
-            "tool_invocations": ToolInvocations(tools=[]),
+            "tool_summaries": tool_summaries,
+            "tool_invocations": tool_invocations or ToolInvocations(tools=[]),
             "result_channel": result_channel,
-            "conversation_session": conversation_session
+            "conversation_session": conversation_session,
+            "routing_mode": routing_mode,
+            "routing_started_at": routing_started_at
         }
 
-        return await self.graph.ainvoke(initial_state)
+        progress = AsyncCoalescingPublisher(channel=result_channel, agent_name="workflow_progress", session_id=session_id)
+        node_started_at: Dict[str, float] = {}
+        final_state: Optional[dict] = None
+
+        # Progress comes off the graph's event stream and is written from this one loop, so
+        # frames reach the result stream in the order the graph produced them.
+        try:
+            async for event in self.graph.astream_events(initial_state, version="v2"):
+                kind = event["event"]
+
+                if kind == "on_custom_event":
+                    await self._handle_custom_event(event["name"], event["data"], progress)
+                elif event["name"] in NODE_LABELS and event.get("metadata", {}).get("langgraph_node") == event["name"]:
+                    if kind == "on_chain_start":
+                        node_started_at[event["run_id"]] = time.perf_counter()
+                        await progress.control(
+                            "progress_update",
+                            chunk=NODE_LABELS[event["name"]],
+                            fields={"event": "node_started", "node": event["name"]}
+                        )
+                    elif kind == "on_chain_end":
+                        seconds = time.perf_counter() - node_started_at.pop(event["run_id"], time.perf_counter())
+                        metrics.observe("workflow_node_seconds", seconds, buckets=NODE_SECONDS_BUCKETS, node=event["name"])
+                        await progress.control(
+                            "progress_update",
+                            chunk=f"{NODE_LABELS[event['name']]}: done in {seconds:.2f}s",
+                            fields={"event": "node_finished", "node": event["name"], "duration_ms": round(seconds * 1000, 1)}
+                        )
+                elif kind == "on_chain_end" and not event.get("parent_ids"):
+                    final_state = event["data"].get("output")
+        finally:
+            await progress.close()
+            progress.record_metrics()
+
+        return final_state
+
+    async def _handle_custom_event(self, name: str, data: Dict[str, Any], progress: AsyncCoalescingPublisher) -> None:
+        if name == PROGRESS_EVENT:
+            await progress.control(
+                "progress_update",
+                chunk=f"Step {data['progress_step']} of {data['tool_len']}: {data['tool_name']}\n{data['message']}",
+                fields={"event": "workflow_started" if data["tool_name"] == "workflow_start" else "tool_started", **data}
+            )
+        elif name == TOOL_FINISHED_EVENT:
+            metrics.observe("workflow_tool_seconds", data["seconds"], buckets=NODE_SECONDS_BUCKETS, status=data["status"])
+            outcome = "finished" if data["status"] == "ok" else "failed"
+            await progress.control(
+                "progress_update",
+                chunk=f"Step {data['progress_step']}: {data['tool_name']} {outcome} in {data['seconds']:.2f}s",
+                fields={
+                    "event": "tool_finished",
+                    "tool_name": data["tool_name"],
+                    "progress_step": data["progress_step"],
+                    "status": data["status"],
+                    "duration_ms": round(data["seconds"] * 1000, 1)
+                }
+            )
+        elif name == STREAMED_RESPONSE_EVENT:
+            await progress.flush()
+            await self._dispatch_streamed_response(**data)
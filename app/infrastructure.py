@@ -48,6 +48,10 @@ class AppInfrastructure:
     def redis_client(self):
         return redis_infra.redis_client
 
+    @property
+    def async_redis_client(self):
+        return redis_infra.async_redis_client
+
     @property
     def mongo_client(self) -> MongoClient:
         return mongo_infra.mongo_config
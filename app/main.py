@@ -5,6 +5,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 
+from app.agents.agent_registry import agent_registry
 from app.apis.main_router import main_router
 from app.configs.app_config import config
 from common.redis_infrastructure import infra
@@ -28,6 +29,7 @@ def setup_infrastructure():
     """Setup all infrastructure components."""
     try:
         infra.setup()
+        agent_registry.warm_up()
         logger.info("Infrastructure setup completed successfully")
     except Exception as e:
         logger.error(f"Infrastructure setup failed: {e}")
@@ -0,0 +1,10 @@
+from typing import List, Literal
+
+from pydantic import BaseModel
+
+from app.schemas.tool_invocation import ToolInvocation
+
+
+class FusedRoutingDecision(BaseModel):
+    mode: Literal["chat", "tools"] = "chat"
+    tools: List[ToolInvocation] = []
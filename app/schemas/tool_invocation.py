@@ -5,6 +5,7 @@ class ToolInvocation(BaseModel):
     tool_name: str
     input_data: Dict[str, Any]
     rank: int
+    depends_on: List[int] = []
 
 class ToolInvocations(BaseModel):
     tools: List[ToolInvocation]
\ No newline at end of file
@@ -1,15 +1,29 @@
+import asyncio
 import json
 import logging
+import time
 import uuid
+from typing import Any
 
-from app.agents.chat_agent.chat_agent import ChatAgent
+from app.agents.agent_registry import agent_registry
+from app.agents.router_agent.pre_router import pre_router
 from app.agents.router_agent.router_agent import RouterAgent
+from app.agents.streaming_agent.inline_streams import inline_streams
+from app.agents.streaming_agent.speculation import speculation_gate
 from app.caches.conversation_store import ConversationSession
+from app.configs.app_config import config
 from app.infrastructure import infra
 from app.models.mcp_config import MultiMCPConfig
+from app.schemas.fused_routing_decision import FusedRoutingDecision
 from app.schemas.router_decision import RouterDecision
+from app.schemas.tool_invocation import ToolInvocations
 from app.schemas.tool_summaries import ToolsSummaryByServer
 from app.services.tool_summaries_service import ToolSummariesService
+from common.utils.agent_utils import Utils
+from common.utils.context_store import context_store
+from common.utils.llm_scheduler import get_request_context, set_request_context
+from common.utils.llm_telemetry import begin_turn, get_turn_id
+from common.utils.metrics import metrics
 from common.utils.tool_util import format_tool_by_server_name
 
 logger = logging.getLogger(__name__)
@@ -17,84 +31,420 @@ class AgentInvocationService:
     def __init__(self):
         self.conversation_store = infra.conversation_store
         self.tool_summaries_service = ToolSummariesService()
+        # Strong references to background shadow-routing calls; see _start_shadow_router_decision.
+        self._shadow_tasks: set[asyncio.Task] = set()
 
-    def handle_router_decision(
+    async def handle_router_decision(
             self,
             user_input: str,
+            tool_summaries: ToolsSummaryByServer,
             tool_summaries_str: str,
             conversation_session: ConversationSession
     ) -> RouterDecision:
 
-        router_agent = RouterAgent()
+        if config.PRE_ROUTER_ENABLED:
+            local_decision = pre_router.route(
+                user_input=user_input,
+                tool_summaries=tool_summaries,
+                tool_summaries_str=tool_summaries_str,
+                last_assistant_message=conversation_session.get_last_assistant_message()
+            )
+
+            if local_decision is not None:
+                metrics.increment("pre_router_decisions_total", outcome="tools" if local_decision.use_tools else "chat")
+                logger.info(f"Pre-router settled decision locally: {local_decision}")
+                if config.ROUTER_DECISION_LOG_PATH:
+                    self._start_shadow_router_decision(user_input, tool_summaries, tool_summaries_str, conversation_session)
+                return local_decision
 
-        return router_agent.handle_router_decision(
+            metrics.increment("pre_router_decisions_total", outcome="fallback")
+
+        router_agent: RouterAgent = agent_registry.router_agent
+
+        router_decision = await router_agent.handle_router_decision(
             user_input=user_input,
             conversation_session=conversation_session,
             tool_summaries_str=tool_summaries_str
         )
 
-    async def handle_agent_invocation(
+        if config.ROUTER_DECISION_LOG_PATH:
+            await Utils.run_sync(
+                self._record_router_decision,
+                user_input=user_input,
+                tool_summaries=tool_summaries,
+                tool_summaries_str=tool_summaries_str,
+                last_assistant_message=conversation_session.get_last_assistant_message(),
+                router_decision=router_decision,
+                source="router"
+            )
+
+        return router_decision
+
+    def _start_shadow_router_decision(
             self,
             user_input: str,
-            session_id: str,
-            mcp_config: MultiMCPConfig
-    ) -> dict:
-        conversation_session = self.conversation_store.get_session(session_id)
-        logger.info(f"Inside handle_agent_invocation session:{session_id}")
-        tool_summaries: ToolsSummaryByServer = await self.tool_summaries_service.fetch_missing_tool_summaries(
-            session_id=session_id,
-            mcp_config=mcp_config
-        )
+            tool_summaries: ToolsSummaryByServer,
+            tool_summaries_str: str,
+            conversation_session: ConversationSession
+    ) -> None:
+        """
+        Runs the LLM router in the background for a turn the pre-router settled, and logs its
+        answer. Without this the log would only hold the turns the pre-router passed on, a biased
+        sample for evaluate_pre_router.py. Only active while ROUTER_DECISION_LOG_PATH is set.
+        """
+        last_assistant_message = conversation_session.get_last_assistant_message()
+
+        async def shadow() -> None:
+            try:
+                router_decision = await agent_registry.router_agent.handle_router_decision(
+                    user_input=user_input,
+                    conversation_session=conversation_session,
+                    tool_summaries_str=tool_summaries_str
+                )
+                await Utils.run_sync(
+                    self._record_router_decision,
+                    user_input=user_input,
+                    tool_summaries=tool_summaries,
+                    tool_summaries_str=tool_summaries_str,
+                    last_assistant_message=last_assistant_message,
+                    router_decision=router_decision,
+                    source="shadow"
+                )
+            except Exception as e:
+                logger.warning(f"Shadow router decision failed: {e}")
 
-        logger.info(f"Fetched tool summaries:{tool_summaries}")
+        task = asyncio.create_task(shadow())
+        self._shadow_tasks.add(task)
+        task.add_done_callback(self._shadow_tasks.discard)
 
-        tool_summaries_str = format_tool_by_server_name(tool_summaries)
+    def _record_router_decision(
+            self,
+            user_input: str,
+            tool_summaries: ToolsSummaryByServer,
+            tool_summaries_str: str,
+            last_assistant_message: str,
+            router_decision: RouterDecision,
+            source: str
+    ) -> None:
+        """
+        Append an LLM routing decision to the JSONL log used by evaluate_pre_router.py, next to
+        the pre-router's own verdict. source is "router" for turns the pre-router passed on and
+        "shadow" for turns it settled.
+        """
+        try:
+            local = pre_router.classify(user_input, tool_summaries, tool_summaries_str, last_assistant_message)
+            record = {
+                "user_input": user_input,
+                "last_assistant_message": last_assistant_message,
+                "tool_summaries": tool_summaries.model_dump(),
+                "use_tools": router_decision.use_tools,
+                "source": source,
+                "pre_router": {
+                    "use_tools": local.decision.use_tools if local.decision is not None else None,
+                    "confidence": local.confidence,
+                    "reason": local.reason
+                }
+            }
+            with open(config.ROUTER_DECISION_LOG_PATH, "a", encoding="utf-8") as log_file:
+                log_file.write(json.dumps(record) + "\n")
+        except Exception as e:
+            logger.warning(f"Failed to record router decision: {e}")
 
-        router_decision = self.handle_router_decision(
+    async def handle_fused_routing(
+            self,
+            user_input: str,
+            tool_summaries: ToolsSummaryByServer,
+            tool_summaries_str: str,
+            conversation_session: ConversationSession
+    ) -> ToolInvocations | None:
+        """Route and plan in one LLM call. Returns the tool plan, or None for a chat turn."""
+        if config.PRE_ROUTER_ENABLED:
+            local_decision = pre_router.route(
+                user_input=user_input,
+                tool_summaries=tool_summaries,
+                tool_summaries_str=tool_summaries_str,
+                last_assistant_message=conversation_session.get_last_assistant_message()
+            )
+
+            # A local "tools" verdict still needs a plan, so only chat short-circuits the fused call.
+            if local_decision is not None and not local_decision.use_tools:
+                metrics.increment("pre_router_decisions_total", outcome="chat")
+                return None
+
+            metrics.increment("pre_router_decisions_total", outcome="fallback")
+
+        fused_decision: FusedRoutingDecision = await agent_registry.fused_routing_agent.route_and_plan(
             user_input=user_input,
             tool_summaries_str=tool_summaries_str,
-            conversation_session=conversation_session
+            conversation_session=conversation_session,
+            tool_summaries=tool_summaries
         )
 
-        if router_decision.use_tools:
-            mcp_service = await self.tool_summaries_service.get_mcp_service(session_id)
+        if fused_decision.mode == "chat":
+            return None
 
-            result = await self._handle_tool_orchestration(
-                session_id=session_id,
+        return ToolInvocations(tools=fused_decision.tools)
+
+    def _select_speculative_branch(
+            self,
+            user_input: str,
+            tool_summaries: ToolsSummaryByServer,
+            tool_summaries_str: str,
+            conversation_session: ConversationSession
+    ) -> str | None:
+        """Pick the branch to start alongside the router call, or None to route without speculation."""
+        policy = config.SPECULATIVE_ROUTING_POLICY
+
+        if policy not in ("tools", "chat", "adaptive"):
+            return None
+
+        last_assistant_message = conversation_session.get_last_assistant_message()
+
+        if config.PRE_ROUTER_ENABLED and pre_router.route(user_input, tool_summaries, tool_summaries_str, last_assistant_message) is not None:
+            # The pre-router settles this turn locally, so there is no router latency to hide.
+            return None
+
+        if policy != "adaptive":
+            return policy
+
+        lean = pre_router.classify(user_input, tool_summaries, tool_summaries_str, last_assistant_message)
+        if lean.decision is None or lean.confidence < config.SPECULATIVE_ROUTING_MIN_CONFIDENCE:
+            return None
+
+        return "tools" if lean.decision.use_tools else "chat"
+
+    async def handle_speculative_routing(
+            self,
+            speculative_branch: str,
+            session_id: str,
+            user_input: str,
+            tool_summaries: ToolsSummaryByServer,
+            tool_summaries_str: str,
+            conversation_session: ConversationSession
+    ) -> tuple[bool, ToolInvocations | None, dict | None]:
+        """
+        Runs the router concurrently with the branch it is expected to choose. Returns
+        (use_tools, tool plan if the tools branch won, chat dispatch result if the chat branch won).
+        The losing branch is cancelled as soon as the RouterDecision arrives. A speculative chat reply
+        streams ahead but saves the exchange and publishes `complete` only once the branch is committed.
+        """
+        started_at = time.perf_counter()
+
+        if speculative_branch == "tools":
+            async def _speculative_plan() -> ToolInvocations:
+                # Looked up inside the task: an MCP connection error only fails the speculative branch.
+                return await agent_registry.tool_orchestration_agent.invoke_multi_step_agent(
+                    tool_summaries_str=tool_summaries_str,
+                    user_input=user_input,
+                    conversation_session=conversation_session,
+                    tool_summaries=tool_summaries,
+                    mcp_service=await self.tool_summaries_service.get_mcp_service(session_id)
+                )
+
+            speculative_task = asyncio.create_task(_speculative_plan())
+        else:
+            speculative_task = asyncio.create_task(
+                self._dispatch_chat_response(
+                    session_id=session_id,
+                    user_input=user_input,
+                    tool_summaries_str=tool_summaries_str,
+                    conversation_session=conversation_session,
+                    speculative=True
+                )
+            )
+
+        try:
+            router_decision: RouterDecision = await self.handle_router_decision(
                 user_input=user_input,
-                mcp_service=mcp_service,
+                tool_summaries=tool_summaries,
                 tool_summaries_str=tool_summaries_str,
                 conversation_session=conversation_session
             )
-        else:
-            result = await self._handle_chat_response_task(
+        except BaseException:
+            await self._discard_speculative_branch(speculative_branch, speculative_task)
+            raise
+
+        router_latency = time.perf_counter() - started_at
+
+        if router_decision.use_tools != (speculative_branch == "tools"):
+            await self._discard_speculative_branch(speculative_branch, speculative_task)
+            metrics.increment("speculative_routing_total", branch=speculative_branch, outcome="miss")
+            metrics.increment(
+                "speculative_routing_wasted_tokens_estimate_total",
+                value=self._estimate_prompt_tokens(user_input, tool_summaries_str, conversation_session),
+                branch=speculative_branch
+            )
+            logger.info(f"Speculative {speculative_branch} branch discarded for session {session_id}")
+            return router_decision.use_tools, None, None
+
+        try:
+            speculative_result = await speculative_task
+        except Exception as e:
+            logger.warning(f"Speculative {speculative_branch} branch failed, continuing without it: {e}")
+            metrics.increment("speculative_routing_total", branch=speculative_branch, outcome="error")
+            return router_decision.use_tools, None, None
+
+        speculative_latency = time.perf_counter() - started_at
+        metrics.increment("speculative_routing_total", branch=speculative_branch, outcome="hit")
+
+        if speculative_branch == "tools":
+            # The plan was produced while the router was running; that overlap is the saving.
+            metrics.observe("speculative_routing_latency_saved_seconds", min(router_latency, speculative_latency), branch="tools")
+            return True, speculative_result if speculative_result.tools else None, None
+
+        # The chat stream has been producing tokens since dispatch, a full router call ahead.
+        await speculation_gate.aresolve(speculative_result[0], commit=True)
+        metrics.observe("speculative_routing_latency_saved_seconds", router_latency, branch="chat")
+        return False, None, self._chat_response_result(*speculative_result)
+
+    async def _discard_speculative_branch(self, speculative_branch: str, speculative_task: asyncio.Task) -> None:
+        if speculative_branch == "tools":
+            speculative_task.cancel()
+            try:
+                await speculative_task
+            except BaseException:
+                pass
+            return
+
+        # Enqueueing the chat task takes milliseconds and cannot be interrupted halfway, so wait for
+        # it, then discard the branch. The reply stops at its next check of the verdict without saving
+        # the exchange or publishing `complete`, and lets its unread stream expire. Revoking with
+        # terminate=True is avoided: the signal goes to whichever task the worker child runs by then.
+        try:
+            result_channel, handle = await speculative_task
+        except BaseException:
+            return
+
+        await speculation_gate.aresolve(result_channel, commit=False)
+
+        if isinstance(handle, asyncio.Task):
+            inline_streams.discard(result_channel)
+
+    @staticmethod
+    def _estimate_prompt_tokens(
+            user_input: str,
+            tool_summaries_str: str,
+            conversation_session: ConversationSession
+    ) -> int:
+        history = conversation_session.get_n_messages_as_string(10)
+        return (len(user_input) + len(tool_summaries_str) + len(history)) // 4
+
+    async def handle_agent_invocation(
+            self,
+            user_input: str,
+            session_id: str,
+            mcp_config: MultiMCPConfig
+    ) -> dict:
+        conversation_session = self.conversation_store.get_session(session_id)
+        logger.info(f"Inside handle_agent_invocation session:{session_id}")
+        set_request_context(user_id=mcp_config.user_id, session_id=session_id)
+        begin_turn()
+        context_store.begin_turn()
+        # Ended on every exit, so the per-turn payload metric covers failed turns too.
+        try:
+            tool_summaries: ToolsSummaryByServer = await self.tool_summaries_service.fetch_missing_tool_summaries(
                 session_id=session_id,
-                user_input=user_input,
-                tool_summaries_str=tool_summaries_str,
-                conversation_session=conversation_session
+                mcp_config=mcp_config
             )
-            
-        return result
+
+            logger.info(f"Fetched tool summaries:{tool_summaries}")
+
+            tool_summaries_str = format_tool_by_server_name(tool_summaries)
+
+            routing_started_at = time.perf_counter()
+            tool_invocations: ToolInvocations | None = None
+            chat_result: dict | None = None
+
+            if config.AGENT_ROUTING_MODE == "fused":
+                tool_invocations = await self.handle_fused_routing(
+                    user_input=user_input,
+                    tool_summaries=tool_summaries,
+                    tool_summaries_str=tool_summaries_str,
+                    conversation_session=conversation_session
+                )
+                use_tools = tool_invocations is not None
+            else:
+                speculative_branch = self._select_speculative_branch(
+                    user_input=user_input,
+                    tool_summaries=tool_summaries,
+                    tool_summaries_str=tool_summaries_str,
+                    conversation_session=conversation_session
+                )
+
+                if speculative_branch is None:
+                    router_decision = await self.handle_router_decision(
+                        user_input=user_input,
+                        tool_summaries=tool_summaries,
+                        tool_summaries_str=tool_summaries_str,
+                        conversation_session=conversation_session
+                    )
+                    use_tools = router_decision.use_tools
+                else:
+                    use_tools, tool_invocations, chat_result = await self.handle_speculative_routing(
+                        speculative_branch=speculative_branch,
+                        session_id=session_id,
+                        user_input=user_input,
+                        tool_summaries=tool_summaries,
+                        tool_summaries_str=tool_summaries_str,
+                        conversation_session=conversation_session
+                    )
+
+            if use_tools:
+                mcp_service = await self.tool_summaries_service.get_mcp_service(session_id)
+
+                result = await self._handle_tool_orchestration(
+                    session_id=session_id,
+                    user_input=user_input,
+                    mcp_service=mcp_service,
+                    tool_summaries=tool_summaries,
+                    tool_summaries_str=tool_summaries_str,
+                    conversation_session=conversation_session,
+                    tool_invocations=tool_invocations,
+                    routing_started_at=routing_started_at
+                )
+            else:
+                metrics.observe(
+                    "routing_latency_seconds",
+                    time.perf_counter() - routing_started_at,
+                    routing_mode=config.AGENT_ROUTING_MODE,
+                    route="chat"
+                )
+
+                result = chat_result or await self._handle_chat_response_task(
+                    session_id=session_id,
+                    user_input=user_input,
+                    tool_summaries_str=tool_summaries_str,
+                    conversation_session=conversation_session
+                )
+
+            return result
+        finally:
+            context_store.end_turn()
 
     async def _handle_tool_orchestration(
             self,
             session_id: str,
             user_input: str,
             mcp_service,
+            tool_summaries: ToolsSummaryByServer,
             tool_summaries_str: str,
-            conversation_session: ConversationSession
+            conversation_session: ConversationSession,
+            tool_invocations: ToolInvocations | None = None,
+            routing_started_at: float | None = None
     ):
-        from app.graph.tool_orchestration_graph import ToolOrchestrationGraph
-
         result_channel = f"tool_orchestration_{session_id}_{uuid.uuid4().hex}"
 
-        await ToolOrchestrationGraph().run(
+        await agent_registry.tool_orchestration_graph.run(
             session_id=session_id,
             result_channel=result_channel,
             query=user_input,
+            tool_summaries=tool_summaries,
             tool_summaries_str=tool_summaries_str,
             mcp_service=mcp_service,
-            conversation_session=conversation_session
+            conversation_session=conversation_session,
+            tool_invocations=tool_invocations,
+            routing_mode=config.AGENT_ROUTING_MODE,
+            routing_started_at=routing_started_at
         )
         return {"status": "processing", "result_channel": result_channel}
 
@@ -105,18 +455,82 @@ class AgentInvocationService:
             tool_summaries_str: str,
             conversation_session: ConversationSession
     ):
-        from worker.tasks import invoke_streamed_response
-        import uuid
-
-        result_channel = f"chat_response_{session_id}_{uuid.uuid4().hex}"
-
-        invoke_streamed_response.delay(
-            agent_name="chat_agent",
+        result_channel, handle = await self._dispatch_chat_response(
             session_id=session_id,
             user_input=user_input,
             tool_summaries_str=tool_summaries_str,
-            result_channel=result_channel,
-            chat_history_str=conversation_session.get_last_n_messages(10)
+            conversation_session=conversation_session
         )
 
-        return {"status": "processing", "result_channel": result_channel}
+        return self._chat_response_result(result_channel, handle)
+
+    @staticmethod
+    def _chat_response_result(result_channel: str, handle: Any) -> dict:
+        result = {"status": "processing", "result_channel": result_channel}
+        if isinstance(handle, asyncio.Task):
+            # Frames are handed to the websocket in-process; see inline_streams.follow.
+            result["inline"] = True
+        return result
+
+    async def _dispatch_chat_response(
+            self,
+            session_id: str,
+            user_input: str,
+            tool_summaries_str: str,
+            conversation_session: ConversationSession,
+            speculative: bool = False
+    ) -> tuple[str, Any]:
+        """
+        Start streaming the chat reply; returns its result channel and a handle to the producer:
+        an asyncio.Task when it streams inline, otherwise the Celery AsyncResult. A speculative
+        reply waits for speculation_gate.aresolve before it saves anything or completes.
+        """
+        from worker.tasks import invoke_streamed_response, STREAMED_RESPONSE_CONTEXT_FIELDS
+
+        result_channel = f"chat_response_{session_id}_{uuid.uuid4().hex}"
+
+        if config.STREAMING_EXECUTION_MODE == "inline":
+            if inline_streams.running < config.STREAMING_INLINE_MAX_CONCURRENCY:
+                from app.agents.streaming_agent.streaming_agent import astreaming_handler
+
+                if speculative:
+                    await speculation_gate.aopen(result_channel, local=True)
+
+                task = inline_streams.start(result_channel, astreaming_handler(
+                    agent_name="chat_agent",
+                    session_id=session_id,
+                    user_input=user_input,
+                    result_channel=result_channel,
+                    tool_summaries_str=tool_summaries_str,
+                    chat_history_str=conversation_session.get_last_n_messages(10),
+                    speculative=speculative
+                ))
+                metrics.increment("streaming_dispatch_total", mode="inline")
+                return result_channel, task
+
+            metrics.increment("streaming_dispatch_total", mode="overflow")
+            logger.info(f"Inline streaming at capacity ({inline_streams.running}), dispatching {result_channel} to Celery")
+        else:
+            metrics.increment("streaming_dispatch_total", mode="celery")
+
+        task_kwargs = await context_store.aexternalize(
+            invoke_streamed_response.name,
+            {
+                "agent_name": "chat_agent",
+                "session_id": session_id,
+                "user_input": user_input,
+                "tool_summaries_str": tool_summaries_str,
+                "result_channel": result_channel,
+                "chat_history_str": conversation_session.get_last_n_messages(10),
+                "user_id": get_request_context()[0],
+                "turn_id": get_turn_id(),
+                "speculative": speculative
+            },
+            STREAMED_RESPONSE_CONTEXT_FIELDS
+        )
+        if speculative:
+            await speculation_gate.aopen(result_channel, local=False)
+
+        async_result = await Utils.run_sync(invoke_streamed_response.delay, **task_kwargs)
+
+        return result_channel, async_result
@@ -18,6 +18,7 @@ class MCPService:
         self._connections: Optional[List[SSEConfig | StdioConfig | StreamableHttpConfig]] = None
         self._parsed_connections: Optional[Dict[str, SSEConnection | StdioConnection | StreamableHttpConnection]] = None
         self.session_id: Optional[str] = None
+        self._tool_definitions: Optional[List[Dict[str, Any]]] = None
 
     async def connect(
             self,
@@ -32,6 +33,7 @@ class MCPService:
             self._connections = connections
             self._parsed_connections = self._parse_connections(connections)
             self._client = MultiServerMCPClient(self._parsed_connections)
+            self._tool_definitions = None
             self.session_id = session_id
             logger.info("MultiServerMCPClient connected successfully")
 
@@ -85,6 +87,27 @@ class MCPService:
             logger.error(f"Failed to gather tool summaries: {e}")
             return {}
 
+    async def get_tool_definitions(self) -> List[Dict[str, Any]]:
+        """OpenAI function definitions built from each MCP tool's input schema, for native tool calling"""
+        if not self._client:
+            raise RuntimeError("Not connected: Call connect() first")
+
+        if self._tool_definitions is None:
+            tools: List[BaseTool] = await self._client.get_tools()
+            self._tool_definitions = [
+                {
+                    "type": "function",
+                    "function": {
+                        "name": tool.name,
+                        "description": tool.description or "",
+                        "parameters": tool.args_schema or {"type": "object", "properties": {}},
+                    },
+                }
+                for tool in tools
+            ]
+
+        return self._tool_definitions
+
     async def invoke_tool(self, tool_name: str, input_data: dict) -> Dict[str, Any]:
         """Invoke a specific tool by name"""
         if not self._client:
@@ -139,6 +162,7 @@ class MCPService:
         if self._client:
             # Add any cleanup logic here if needed
             self._client = None
+            self._tool_definitions = None
             self._parsed_connections = None
             self._connections = None
             self.session_id = None
@@ -1,14 +1,31 @@
 import logging
 import asyncio
+from contextlib import aclosing
 from typing import Dict, Any
 from starlette.websockets import WebSocket
 
+from app.agents.streaming_agent.inline_streams import inline_streams
 from app.models.mcp_config import MultiMCPConfig
 from app.services.agent_invocation_service import AgentInvocationService
 from common.services.redis_service import get_redis_client, listen_and_forward_redis_stream
 
 logger = logging.getLogger(__name__)
 
+INLINE_STREAM_IDLE_TIMEOUT_SECONDS = 120
+
+
+async def forward_inline_stream(result_channel: str, websocket: WebSocket) -> None:
+    try:
+        # aclosing: a failed send must stop (and cancel) the answer now, not when the generator is collected.
+        async with aclosing(inline_streams.follow(result_channel, idle_timeout=INLINE_STREAM_IDLE_TIMEOUT_SECONDS)) as frames:
+            async for frame in frames:
+                await websocket.send_json(frame)
+    except Exception as e:
+        logger.error(f"Error in inline stream forwarder: {e}")
+    finally:
+        logger.info(f"Inline stream forwarder finished for {result_channel}")
+
+
 async def handle_websocket_message(
     websocket: WebSocket,
     session_id: str,
@@ -34,6 +51,8 @@ async def handle_websocket_message(
             await websocket.send_json({"error": f"Invalid MCP config format: {str(e)}"})
             return
 
+        # Set while an inline answer runs with nobody forwarding it yet.
+        unforwarded_channel = None
         try:
             redis_client = await anext(get_redis_client())
             logger.info(f"Got Redis client for session {session_id}")
@@ -53,25 +72,35 @@ async def handle_websocket_message(
                 
             result_channel = invocation_result["result_channel"]
             logger.info(f"Got result channel {result_channel} for session {session_id}")
+            if invocation_result.get("inline"):
+                unforwarded_channel = result_channel
             
             await websocket.send_json({
                 "status": "processing", 
                 "result_channel": result_channel
             })
             
-            # Start Redis stream task - it will forward messages as they come
-            logger.info(f"Starting Redis stream task for session {session_id}")
-            asyncio.create_task(
-                listen_and_forward_redis_stream(
-                    redis=redis_client,
-                    result_channel=result_channel,
-                    websocket=websocket
+            if invocation_result.get("inline"):
+                # The reply is streamed by this process; its frames never touch Redis on the way here.
+                logger.info(f"Starting inline stream task for session {session_id}")
+                asyncio.create_task(forward_inline_stream(result_channel=result_channel, websocket=websocket))
+                unforwarded_channel = None
+            else:
+                # Start Redis stream task - it will forward messages as they come
+                logger.info(f"Starting Redis stream task for session {session_id}")
+                asyncio.create_task(
+                    listen_and_forward_redis_stream(
+                        redis=redis_client,
+                        result_channel=result_channel,
+                        websocket=websocket
+                    )
                 )
-            )
             
             logger.info(f"Redis stream task started for session {session_id}")
             
         except Exception as e:
+            if unforwarded_channel is not None:
+                inline_streams.abandon(unforwarded_channel)
             await websocket.send_json({"error": f"Agent invocation failed: {str(e)}"})
             logger.exception(f"Agent invocation error for session {session_id}")
             raise
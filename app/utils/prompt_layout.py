@@ -0,0 +1,61 @@
+import hashlib
+import textwrap
+from typing import Dict, Sequence, Tuple
+
+from langchain_core.prompts import ChatPromptTemplate, SystemMessagePromptTemplate
+
+from common.utils.prompt_budget import token_counter
+
+# Providers cache prompt prefixes from this many tokens up (OpenAI: 1024).
+MIN_CACHEABLE_PREFIX_TOKENS = 1024
+
+
+def build_prefix_stable_prompt(
+        static_sections: Sequence[str],
+        dynamic_sections: Sequence[Tuple[str, str]],
+        trailing_messages: Sequence[Tuple[str, str]],
+        **partials: str
+) -> ChatPromptTemplate:
+    """
+    Lays a prompt out as one system message of static content (role, rules, examples and
+    output format) followed by one with the per-request content. Provider-side prefix caching
+    only reuses an identical leading byte range, so nothing that varies per request may appear
+    in the first message. Partials used there, like format_instructions, must be constants.
+
+    dynamic_sections are (heading, variable) pairs, ordered from least to most volatile so the
+    tool catalog (stable within a session) sits ahead of history and previous results.
+    """
+    prefix = "\n\n".join(textwrap.dedent(section).strip() for section in static_sections)
+    suffix = "\n\n".join(f"{heading}\n{{{variable}}}" for heading, variable in dynamic_sections)
+
+    return ChatPromptTemplate.from_messages(
+        [
+            ("system", prefix),
+            ("system", suffix),
+            *trailing_messages
+        ]
+    ).partial(**partials)
+
+
+def static_prefix(prompt: ChatPromptTemplate) -> str:
+    """Renders the leading static system message, as sent on every request."""
+    first = prompt.messages[0]
+    if not isinstance(first, SystemMessagePromptTemplate):
+        return ""
+
+    partials = {name: value for name, value in prompt.partial_variables.items() if name in first.input_variables}
+    if set(first.input_variables) - set(partials):
+        # A per-request variable leaked into the prefix: nothing is reliably cacheable.
+        return ""
+
+    return first.format(**partials).content
+
+
+def describe_prefix(prompt: ChatPromptTemplate) -> Dict[str, object]:
+    prefix = static_prefix(prompt)
+    tokens = token_counter.count(prefix) if prefix else 0
+    return {
+        "prefix_tokens": tokens,
+        "prefix_sha256": hashlib.sha256(prefix.encode("utf-8")).hexdigest()[:16],
+        "cacheable": tokens >= MIN_CACHEABLE_PREFIX_TOKENS,
+    }
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Agent Concurrency Benchmark
+Measures how many concurrent sessions one backend process can serve when agent
+calls go through the blocking Utils.run_agent_query versus Utils.arun_agent_query.
+
+The LLM is simulated with a fixed upstream latency so the numbers only reflect
+how the event loop is used, not OpenAI. Run from the repository root:
+
+    PYTHONPATH=. python benchmark_agent_concurrency.py --latency 0.5
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from app.agents.router_agent.router_agent import RouterAgent
+from app.schemas.router_decision import RouterDecision
+from common.utils.agent_utils import Utils
+from common.utils.llm_scheduler import llm_scheduler, set_request_context
+from common.utils.rate_limiter import rate_limiter
+
+
+class SimulatedLatencyChatModel(BaseChatModel):
+    """Chat model that answers every prompt with a router decision after a fixed delay."""
+
+    latency: float = 0.5
+
+    @property
+    def _llm_type(self) -> str:
+        return "simulated-latency"
+
+    def _result(self) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content='{"use_tools": false}'))])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return self._result()
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._result()
+
+
+async def run_session(mode: str, llm: SimulatedLatencyChatModel, router_agent: RouterAgent, session_index: int, round_started: float) -> float:
+    """Turn latency from the start of the round, so time spent waiting behind other sessions counts."""
+    # Each gathered session runs in its own task context: one user per session, as in production.
+    set_request_context(user_id=f"bench-user-{session_index}", session_id=f"bench-session-{session_index}")
+    utils = Utils[RouterDecision]
+    query_kwargs = dict(
+        llm=llm,
+        tools=[],
+        # Distinct prompts per session so singleflight does not coalesce the simulated calls.
+        query=f"tell me a joke #{session_index}",
+        parser=router_agent.parser,
+        prompt=router_agent.router_prompt,
+        chat_history=[],
+        available_tools="",
+    )
+
+    if mode == "sync":
+        utils.run_agent_query(**query_kwargs)
+    else:
+        await utils.arun_agent_query(**query_kwargs)
+
+    return time.perf_counter() - round_started
+
+
+async def measure_loop_lag(stop: asyncio.Event, samples: List[float], interval: float = 0.01) -> None:
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, time.perf_counter() - expected))
+
+
+async def run_round(mode: str, sessions: int, latency: float) -> dict:
+    llm = SimulatedLatencyChatModel(latency=latency)
+    router_agent = RouterAgent()
+    lag_samples: List[float] = []
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop, lag_samples))
+
+    started = time.perf_counter()
+    durations = await asyncio.gather(*(run_session(mode, llm, router_agent, index, started) for index in range(sessions)))
+    wall = time.perf_counter() - started
+
+    stop.set()
+    await lag_task
+
+    ordered = sorted(durations)
+    return {
+        "mode": mode,
+        "sessions": sessions,
+        "wall": wall,
+        "p50": statistics.median(ordered),
+        "p95": ordered[max(0, int(len(ordered) * 0.95) - 1)],
+        "max_loop_lag": max(lag_samples, default=0.0),
+    }
+
+
+def print_row(row: dict) -> None:
+    print(
+        f"{row['mode']:>5} | {row['sessions']:>8} | {row['wall']:>8.2f}s | {row['p50']:>7.2f}s | "
+        f"{row['p95']:>7.2f}s | {row['max_loop_lag'] * 1000:>10.1f}ms"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated upstream LLM latency in seconds")
+    parser.add_argument("--slo", type=float, default=2.0, help="p95 turn latency budget, as a multiple of --latency")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 5, 10, 25, 50, 100, 200, 400])
+    parser.add_argument(
+        "--with-scheduler",
+        action="store_true",
+        help="Keep the LLM scheduler's LLM_SCHEDULER_MAX_CONCURRENCY admission cap in the measurement"
+    )
+    args = parser.parse_args()
+
+    # The simulated model has no upstream quota; keep the Redis rate limiter out of the measurement.
+    rate_limiter.enabled = False
+    # The scheduler caps in-flight calls per process on purpose; by default measure the event loop alone.
+    llm_scheduler.enabled = args.with_scheduler
+
+    slo_seconds = args.latency * args.slo
+    capacity = {"sync": 0, "async": 0}
+
+    print(f"Simulated LLM latency {args.latency}s, p95 SLO {slo_seconds:.2f}s")
+    print(" mode | sessions |     wall |     p50 |     p95 | max loop lag")
+
+    for mode in ("sync", "async"):
+        for sessions in args.sessions:
+            row = await run_round(mode, sessions, args.latency)
+            print_row(row)
+
+            if row["p95"] > slo_seconds:
+                break
+
+            capacity[mode] = sessions
+
+    print()
+    print(f"Concurrent sessions within SLO (blocking run_agent_query): {capacity['sync']}")
+    print(f"Concurrent sessions within SLO (arun_agent_query):         {capacity['async']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+import os
+
+
+class LLMConfig:
+    """Settings shared by every process that talks to the LLM provider (backend, worker, MCP server)."""
+
+    # OpenAI-compatible endpoint override, e.g. http://localhost:8900/v1 for llm_standin_server.py.
+    BASE_URL: str | None = os.getenv("LLM_BASE_URL") or None
+
+    HTTP_MAX_CONNECTIONS: int = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100"))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "30"))
+    HTTP_TIMEOUT: float = float(os.getenv("LLM_HTTP_TIMEOUT", "60"))
+    HTTP_CONNECT_TIMEOUT: float = float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT", "5"))
+
+    # Cluster-wide token buckets (per model) shared through Redis by the backend and all workers.
+    # Not available to the MCP server, which has no Redis client; docker-compose disables it there.
+    RATE_LIMIT_ENABLED: bool = os.getenv("LLM_RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_REQUESTS_PER_MINUTE: int = int(os.getenv("LLM_RATE_LIMIT_REQUESTS_PER_MINUTE", "500"))
+    RATE_LIMIT_TOKENS_PER_MINUTE: int = int(os.getenv("LLM_RATE_LIMIT_TOKENS_PER_MINUTE", "200000"))
+    # "wait": queue until the budget refills (up to RATE_LIMIT_MAX_WAIT_SECONDS). "reject": fail fast.
+    RATE_LIMIT_POLICY: str = os.getenv("LLM_RATE_LIMIT_POLICY", "wait").lower()
+    RATE_LIMIT_MAX_WAIT_SECONDS: float = float(os.getenv("LLM_RATE_LIMIT_MAX_WAIT_SECONDS", "30"))
+    # Completion tokens reserved for calls whose client sets no max_tokens.
+    RATE_LIMIT_COMPLETION_TOKENS: int = int(os.getenv("LLM_RATE_LIMIT_COMPLETION_TOKENS", "500"))
+
+    # Weighted fair queuing of LLM calls per process across users/sessions and priority classes.
+    SCHEDULER_ENABLED: bool = os.getenv("LLM_SCHEDULER_ENABLED", "true").lower() == "true"
+    SCHEDULER_MAX_CONCURRENCY: int = int(os.getenv("LLM_SCHEDULER_MAX_CONCURRENCY", "32"))
+    SCHEDULER_MAX_PER_USER: int = int(os.getenv("LLM_SCHEDULER_MAX_PER_USER", "8"))
+    SCHEDULER_CLASS_WEIGHTS: str = os.getenv("LLM_SCHEDULER_CLASS_WEIGHTS", "interactive=8,streaming=4,workflow=2,background=1")
+    # Optional concurrency caps per class, e.g. "background=4".
+    SCHEDULER_CLASS_CAPS: str = os.getenv("LLM_SCHEDULER_CLASS_CAPS", "")
+
+    # Share one upstream call between identical concurrent requests; Redis extends it across nodes.
+    SINGLEFLIGHT_ENABLED: bool = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() == "true"
+    SINGLEFLIGHT_REDIS_ENABLED: bool = os.getenv("SINGLEFLIGHT_REDIS_ENABLED", "false").lower() == "true"
+    SINGLEFLIGHT_LOCK_TTL_SECONDS: int = int(os.getenv("SINGLEFLIGHT_LOCK_TTL_SECONDS", "120"))
+    SINGLEFLIGHT_RESULT_TTL_SECONDS: int = int(os.getenv("SINGLEFLIGHT_RESULT_TTL_SECONDS", "10"))
+    SINGLEFLIGHT_WAIT_TIMEOUT_SECONDS: float = float(os.getenv("SINGLEFLIGHT_WAIT_TIMEOUT_SECONDS", "120"))
+
+    # Hedged structured-output calls: duplicate a call still running after the given percentile of
+    # recent latency; duplicates are capped at HEDGE_BUDGET_RATIO of calls.
+    HEDGE_ENABLED: bool = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+    HEDGE_PERCENTILE: float = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+    HEDGE_MIN_DELAY_SECONDS: float = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "0.5"))
+    HEDGE_BUDGET_RATIO: float = float(os.getenv("LLM_HEDGE_BUDGET_RATIO", "0.05"))
+    HEDGE_BUDGET_BURST: float = float(os.getenv("LLM_HEDGE_BUDGET_BURST", "5"))
+    HEDGE_WINDOW: int = int(os.getenv("LLM_HEDGE_WINDOW", "200"))
+    HEDGE_MIN_SAMPLES: int = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+    # Model cascade: the first tier answers, and output failing local validation escalates to the next tier.
+    CASCADE_ENABLED: bool = os.getenv("LLM_CASCADE_ENABLED", "false").lower() == "true"
+    CASCADE_TIERS: str = os.getenv("LLM_CASCADE_TIERS", "gpt-4o-mini,gpt-4o")
+
+    # Per-call TTFT/latency/token/cost telemetry; per-turn call logs live in Redis for this long.
+    TELEMETRY_ENABLED: bool = os.getenv("LLM_TELEMETRY_ENABLED", "true").lower() == "true"
+    TELEMETRY_TURN_TTL_SECONDS: int = int(os.getenv("LLM_TELEMETRY_TURN_TTL_SECONDS", "900"))
+    # Price overrides in USD per million tokens, e.g. "gpt-4o-mini=0.15/0.075/0.6" (input/cached/output).
+    TELEMETRY_PRICES: str = os.getenv("LLM_TELEMETRY_PRICES", "")
+
+    # Bulky Celery task arguments go to Redis under their content hash; tasks carry the reference.
+    CONTEXT_STORE_ENABLED: bool = os.getenv("CONTEXT_STORE_ENABLED", "true").lower() == "true"
+    CONTEXT_STORE_TTL_SECONDS: int = int(os.getenv("CONTEXT_STORE_TTL_SECONDS", "3600"))
+    CONTEXT_STORE_MIN_BYTES: int = int(os.getenv("CONTEXT_STORE_MIN_BYTES", "1024"))
+    # Per-process LRU of resolved values on the worker.
+    CONTEXT_STORE_LOCAL_MAX_BYTES: int = int(os.getenv("CONTEXT_STORE_LOCAL_MAX_BYTES", str(64 * 1024 * 1024)))
+
+    PROMPT_BUDGET_ENABLED: bool = os.getenv("PROMPT_BUDGET_ENABLED", "true").lower() == "true"
+    # o200k_base is the gpt-4o family encoding.
+    PROMPT_TOKENIZER_ENCODING: str = os.getenv("PROMPT_TOKENIZER_ENCODING", "o200k_base")
+
+    @staticmethod
+    def prompt_budget_tokens(agent_name: str, default: int) -> int:
+        """Dynamic-slot token budget for an agent, overridable with PROMPT_BUDGET_<AGENT_NAME>_TOKENS."""
+        return int(os.getenv(f"PROMPT_BUDGET_{agent_name.upper()}_TOKENS", str(default)))
+
+    def cascade_tiers(self, agent_name: str) -> list[str]:
+        """Models tried in order for an agent, overridable with LLM_CASCADE_<AGENT_NAME>_TIERS."""
+        tiers = os.getenv(f"LLM_CASCADE_{agent_name.upper()}_TIERS", self.CASCADE_TIERS)
+        return [tier.strip() for tier in tiers.split(",") if tier.strip()]
+
+
+llm_config = LLMConfig()
@@ -2,6 +2,7 @@ import logging
 from typing import Optional
 
 from redis import Redis as RedisSync
+from redis.asyncio import Redis
 
 logger = logging.getLogger(__name__)
 
@@ -9,6 +10,7 @@ logger = logging.getLogger(__name__)
 class RedisInfrastructure:
     def __init__(self):
         self._redis_client: Optional[RedisSync] = None
+        self._async_redis_client: Optional[Redis] = None
         self._initialized: bool = False
 
     def setup(self):
@@ -34,12 +36,29 @@ class RedisInfrastructure:
                 raise
         return self._redis_client
 
+    def setup_async_redis(self) -> Redis:
+        if self._async_redis_client is None:
+            try:
+                from common.services.redis_service import get_shared_async_redis_client
+                self._async_redis_client = get_shared_async_redis_client()
+                logger.info("Async Redis client initialized")
+            except Exception as e:
+                logger.error(f"Failed to initialize async Redis: {e}")
+                raise
+        return self._async_redis_client
+
     @property
     def redis_client(self) -> RedisSync:
         if self._redis_client is None:
             self.setup_redis()
         return self._redis_client
 
+    @property
+    def async_redis_client(self) -> Redis:
+        if self._async_redis_client is None:
+            self.setup_async_redis()
+        return self._async_redis_client
+
     def is_initialized(self) -> bool:
         return self._initialized
 
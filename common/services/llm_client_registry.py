@@ -0,0 +1,172 @@
+import json
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+from common.configs.llm_config import llm_config
+from common.utils.llm_telemetry import llm_telemetry
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionStats:
+    """Counts requests and newly opened connections so keep-alive reuse can be verified."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: int = 0
+        self.new_connections: int = 0
+
+    def record_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def record_new_connection(self) -> None:
+        with self._lock:
+            self.new_connections += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            reused = max(0, self.requests - self.new_connections)
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "reused_connections": reused,
+                "reuse_ratio": round(reused / self.requests, 4) if self.requests else 0.0,
+            }
+
+
+class LLMClientRegistry:
+    """
+    Process-wide cache of chat model clients. Clients are keyed by model and parameters and
+    share one sync and one async HTTP connection pool, so repeated agent calls reuse TLS
+    connections instead of opening a new client per request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: Dict[str, ChatOpenAI] = {}
+        self._http_client: Optional[httpx.Client] = None
+        self._http_async_client: Optional[httpx.AsyncClient] = None
+        self._sync_stats = ConnectionStats()
+        self._async_stats = ConnectionStats()
+
+    def get_chat_model(self, model: str = "gpt-4o-mini", **params: Any) -> ChatOpenAI:
+        """Return the shared client for this model/parameter combination, creating it on first use."""
+        if llm_config.BASE_URL and "base_url" not in params:
+            params["base_url"] = llm_config.BASE_URL
+
+        key = self._make_key(model, params)
+
+        llm = self._models.get(key)
+        if llm is not None:
+            return llm
+
+        with self._lock:
+            llm = self._models.get(key)
+            if llm is None:
+                llm = ChatOpenAI(
+                    model=model,
+                    http_client=self._get_http_client(),
+                    http_async_client=self._get_http_async_client(),
+                    callbacks=[llm_telemetry.handler],
+                    **params
+                )
+                self._models[key] = llm
+                logger.info(f"Registered LLM client {model} ({len(self._models)} cached)")
+
+        return llm
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "cached_clients": len(self._models),
+            "limits": {
+                "max_connections": llm_config.HTTP_MAX_CONNECTIONS,
+                "max_keepalive_connections": llm_config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                "keepalive_expiry": llm_config.HTTP_KEEPALIVE_EXPIRY,
+            },
+            "sync": {**self._sync_stats.snapshot(), "pool": self._pool_usage(self._http_client)},
+            "async": {**self._async_stats.snapshot(), "pool": self._pool_usage(self._http_async_client)},
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._http_client is not None:
+                self._http_client.close()
+            self._http_client = None
+            self._http_async_client = None
+            self._models.clear()
+
+    @staticmethod
+    def _make_key(model: str, params: Dict[str, Any]) -> str:
+        return json.dumps({"model": model, **params}, sort_keys=True, default=str)
+
+    @staticmethod
+    def _limits() -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=llm_config.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=llm_config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=llm_config.HTTP_KEEPALIVE_EXPIRY,
+        )
+
+    @staticmethod
+    def _timeout() -> httpx.Timeout:
+        return httpx.Timeout(llm_config.HTTP_TIMEOUT, connect=llm_config.HTTP_CONNECT_TIMEOUT)
+
+    def _get_http_client(self) -> httpx.Client:
+        if self._http_client is None:
+            stats = self._sync_stats
+
+            def trace(event_name: str, info: dict) -> None:
+                if event_name == "connection.connect_tcp.complete":
+                    stats.record_new_connection()
+
+            def on_request(request: httpx.Request) -> None:
+                stats.record_request()
+                request.extensions["trace"] = trace
+
+            self._http_client = httpx.Client(
+                limits=self._limits(),
+                timeout=self._timeout(),
+                event_hooks={"request": [on_request]},
+            )
+
+        return self._http_client
+
+    def _get_http_async_client(self) -> httpx.AsyncClient:
+        if self._http_async_client is None:
+            stats = self._async_stats
+
+            async def trace(event_name: str, info: dict) -> None:
+                if event_name == "connection.connect_tcp.complete":
+                    stats.record_new_connection()
+
+            async def on_request(request: httpx.Request) -> None:
+                stats.record_request()
+                request.extensions["trace"] = trace
+
+            self._http_async_client = httpx.AsyncClient(
+                limits=self._limits(),
+                timeout=self._timeout(),
+                event_hooks={"request": [on_request]},
+            )
+
+        return self._http_async_client
+
+    @staticmethod
+    def _pool_usage(client: Optional[httpx.Client | httpx.AsyncClient]) -> Dict[str, int]:
+        if client is None:
+            return {"connections": 0, "idle": 0, "active": 0}
+
+        # httpx does not expose pool state publicly; read it from the httpcore pool when available.
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        idle = sum(1 for conn in connections if getattr(conn, "is_idle", lambda: False)())
+
+        return {"connections": len(connections), "idle": idle, "active": len(connections) - idle}
+
+
+llm_registry = LLMClientRegistry()
@@ -24,6 +24,19 @@ def get_sync_redis_client() -> RedisSync:
     )
 
 
+def get_shared_async_redis_client() -> Redis:
+    """Pooled async client for long-lived, process-wide use (caches, locks, limiters)."""
+    return Redis.from_url(
+        REDIS_URL,
+        decode_responses=True,
+        max_connections=50,
+        retry_on_timeout=True,
+        socket_connect_timeout=5,
+        socket_timeout=5,
+        health_check_interval=30,
+    )
+
+
 async def get_redis_client() -> AsyncGenerator[Redis, None]:
     """Get async Redis client - creates new connection for each request."""
     client = Redis.from_url(REDIS_URL, decode_responses=True)
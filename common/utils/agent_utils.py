@@ -1,17 +1,83 @@
+import asyncio
+import contextvars
+import functools
+import json
+import logging
 import os
-from typing import Any, TypeVar, Optional, Generic, List
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, TypeVar, Optional, Generic, List, Callable, Tuple, Type, Dict
 
 from langchain.agents import create_tool_calling_agent, AgentExecutor
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import get_buffer_string
 from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.outputs import LLMResult
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.utils.function_calling import convert_to_openai_tool
 from langchain_openai import ChatOpenAI
 from pydantic import BaseModel
 
+from common.configs.llm_config import llm_config
+from common.utils.hedging import request_hedger
+from common.utils.llm_scheduler import llm_scheduler, PRIORITY_INTERACTIVE
+from common.utils.llm_telemetry import llm_call_scope, get_call_agent
+from common.utils.metrics import metrics
+from common.utils.prompt_budget import token_counter
+from common.utils.rate_limiter import rate_limiter
+from common.utils.singleflight import singleflight, llm_fingerprint
+from common.utils.structured_output import parse_structured_output, is_valid_structured_output
+
 T = TypeVar("T", bound=BaseModel)
+R = TypeVar("R")
+
+logger = logging.getLogger(__name__)
+
+SYNC_EXECUTOR_WORKERS = int(os.getenv("AGENT_SYNC_EXECUTOR_WORKERS", "8"))
+
+_sync_executor = ThreadPoolExecutor(
+    max_workers=SYNC_EXECUTOR_WORKERS,
+    thread_name_prefix="agent-sync"
+)
+
+EXECUTOR_CACHE_MAX_ENTRIES = int(os.getenv("AGENT_EXECUTOR_CACHE_MAX_ENTRIES", "64"))
+
+_executor_cache: OrderedDict[Tuple[int, int, Tuple[int, ...]], Tuple[ChatOpenAI, ChatPromptTemplate, List[Any], AgentExecutor, int]] = OrderedDict()
+_executor_cache_lock = threading.Lock()
+
+
+class _RunUsage(BaseCallbackHandler):
+    """Sums the token usage of every model call in one agent run, across all of its round trips."""
+
+    def __init__(self):
+        self.tokens: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        tokens = next(
+            (
+                usage for generations in response.generations for generation in generations
+                if (usage := Utils._usage_tokens(getattr(generation, "message", None)))
+            ),
+            ((response.llm_output or {}).get("token_usage") or {}).get("total_tokens")
+        )
+        if tokens:
+            with self._lock:
+                self.tokens = (self.tokens or 0) + tokens
+
+
+@functools.lru_cache(maxsize=128)
+def _format_instructions_for(pydantic_object: Type[BaseModel]) -> str:
+    return PydanticOutputParser(pydantic_object=pydantic_object).get_format_instructions()
 
 
 class Utils(Generic[T]):
     VERBOSE = os.getenv("AGENT_VERBOSE", "false").lower() == "true"
+    # Re-ask the model only when the local JSON repairs could not recover its output.
+    STRUCTURED_OUTPUT_MAX_RETRIES = int(os.getenv("STRUCTURED_OUTPUT_MAX_RETRIES", "1"))
 
     @staticmethod
     def is_null_or_empty(parsed_object: Optional[T]) -> T:
@@ -21,23 +87,316 @@ class Utils(Generic[T]):
         return parsed_object
 
     @staticmethod
-    def parse_response(raw_response: dict[str, Any], parser: PydanticOutputParser) -> Optional[T]:
+    def _response_text(raw_response: dict[str, Any]) -> str:
+        for key in ("output", "result", "response"):
+            if key in raw_response:
+                return str(raw_response[key])
+
+        return str(raw_response)
+
+    @classmethod
+    def parse_response(cls, raw_response: dict[str, Any], parser: PydanticOutputParser) -> Optional[T]:
         try:
-            if "output" in raw_response:
-                return parser.parse(raw_response["output"])
-            elif "result" in raw_response:
-                return parser.parse(raw_response["result"])
-            elif "response" in raw_response:
-                return parser.parse(raw_response["response"])
-            else:
-                return parser.parse(str(raw_response))
+            return parse_structured_output(cls._response_text(raw_response), parser.pydantic_object)
         except Exception as e:
-            import logging
-            logger = logging.getLogger(__name__)
             logger.error(f"Error parsing response: {e}")
             logger.debug(f"Raw response: {raw_response}")
             return None
 
+    @staticmethod
+    def _retry_instruction(parser: PydanticOutputParser, bad_output: str) -> str:
+        metrics.increment("structured_output_retries_total", schema=parser.pydantic_object.__name__)
+        return (
+            "\n\nYour previous reply could not be parsed as the required JSON object:\n"
+            f"{bad_output[:2000]}\n"
+            "Reply again with ONLY the corrected JSON object, with no surrounding text."
+        )
+
+    @staticmethod
+    async def run_sync(func: Callable[..., R], *args: Any, **kwargs: Any) -> R:
+        """Run a blocking callable on the bounded agent executor instead of the event loop."""
+        loop = asyncio.get_running_loop()
+        # Carry context variables (e.g. the LLM scheduler's user/session tags) into the worker thread.
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(_sync_executor, functools.partial(context.run, func, *args, **kwargs))
+
+    @staticmethod
+    def has_native_async(runnable: Runnable) -> bool:
+        """True when the runnable implements real async I/O rather than LangChain's thread fallback."""
+        if isinstance(runnable, BaseChatModel):
+            return type(runnable)._agenerate is not BaseChatModel._agenerate
+
+        return type(runnable).ainvoke is not Runnable.ainvoke
+
+    @classmethod
+    async def ainvoke(cls, runnable: Runnable, inputs: Any, config: Optional[RunnableConfig] = None) -> Any:
+        if cls.has_native_async(runnable):
+            return await runnable.ainvoke(inputs, config=config)
+
+        return await cls.run_sync(runnable.invoke, inputs, config=config)
+
+    @staticmethod
+    def estimate_call_tokens(llm: Any, prompt_text: str) -> int:
+        """Prompt tokens plus the completion the client may produce, as reserved against the rate limit."""
+        return token_counter.count(prompt_text) + (getattr(llm, "max_tokens", None) or llm_config.RATE_LIMIT_COMPLETION_TOKENS)
+
+    @staticmethod
+    def _usage_tokens(message: Any) -> Optional[int]:
+        usage = getattr(message, "usage_metadata", None)
+        return usage.get("total_tokens") if usage else None
+
+    @classmethod
+    def _invoke_llm(cls, llm: ChatOpenAI, formatted_prompt: str, priority: str) -> str:
+        key = singleflight.build_key("llm", llm_fingerprint(llm), formatted_prompt)
+
+        def call() -> str:
+            model = rate_limiter.model_name(llm)
+            estimated = cls.estimate_call_tokens(llm, formatted_prompt)
+            with llm_scheduler.slot_sync(priority, cost=estimated / 1000):
+                rate_limiter.acquire(model, estimated)
+                response = llm.invoke(formatted_prompt)
+            rate_limiter.record_usage(model, estimated, cls._usage_tokens(response))
+            return str(response.content)
+
+        return singleflight.do_sync(key, call)
+
+    @classmethod
+    async def _ainvoke_llm(
+            cls,
+            llm: ChatOpenAI,
+            formatted_prompt: str,
+            priority: str,
+            validate: Callable[[str], bool] | None = None
+    ) -> str:
+        key = singleflight.build_key("llm", llm_fingerprint(llm), formatted_prompt)
+
+        async def call() -> str:
+            model = rate_limiter.model_name(llm)
+            estimated = cls.estimate_call_tokens(llm, formatted_prompt)
+
+            async def settled() -> Any:
+                # Each attempt settles its own reservation, so the losing side of a hedge race does
+                # not keep its estimate against the budget. Cancelled before usage arrived: nothing used.
+                try:
+                    response = await cls.ainvoke(llm, formatted_prompt)
+                except asyncio.CancelledError:
+                    await rate_limiter.arecord_usage(model, estimated, 0)
+                    raise
+                await rate_limiter.arecord_usage(model, estimated, cls._usage_tokens(response))
+                return response
+
+            async def hedge() -> Any:
+                # A hedge is optional load: never queue for it, decline if the budget is short.
+                await rate_limiter.aacquire(model, estimated, policy="reject")
+                return await settled()
+
+            async with llm_scheduler.slot(priority, cost=estimated / 1000):
+                await rate_limiter.aacquire(model, estimated)
+                response = await request_hedger.run(
+                    key=f"{get_call_agent()}:{model}",
+                    primary=settled,
+                    hedge=hedge,
+                    validate=(lambda message: validate(str(message.content))) if validate else None
+                )
+            return str(response.content)
+
+        return await singleflight.do(key, call)
+
+    @staticmethod
+    def _tool_calls_json(message: Any) -> str:
+        return json.dumps([{"name": call["name"], "args": call["args"]} for call in getattr(message, "tool_calls", None) or []])
+
+    @classmethod
+    async def arun_tool_calls(
+            cls,
+            llm: ChatOpenAI,
+            tool_definitions: List[Dict[str, Any]],
+            prompt: ChatPromptTemplate,
+            prompt_inputs: dict[str, Any],
+            priority: str = PRIORITY_INTERACTIVE,
+            agent_name: str | None = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Sends tool_definitions as native function tools and returns the model's tool calls as
+        {"name", "args"} dicts, several when it calls tools in parallel. The provider builds the
+        arguments against each tool's JSON schema, so there is no output parser or format text.
+        """
+        messages = prompt.format_messages(**prompt_inputs)
+        bound = llm.bind_tools(tool_definitions, tool_choice="required", parallel_tool_calls=True)
+        prompt_text = get_buffer_string(messages) + json.dumps(tool_definitions, sort_keys=True)
+        key = singleflight.build_key("tools", llm_fingerprint(llm), prompt_text)
+
+        async def call() -> str:
+            model = rate_limiter.model_name(llm)
+            estimated = cls.estimate_call_tokens(llm, prompt_text)
+            async with llm_scheduler.slot(priority, cost=estimated / 1000):
+                await rate_limiter.aacquire(model, estimated)
+                response = await cls.ainvoke(bound, messages)
+            await rate_limiter.arecord_usage(model, estimated, cls._usage_tokens(response))
+            return cls._tool_calls_json(response)
+
+        with llm_call_scope(agent_name):
+            return json.loads(await singleflight.do(key, call))
+
+    @staticmethod
+    def _agent_flight_key(llm: ChatOpenAI, prompt: ChatPromptTemplate, tools: List[Any], agent_query: dict[str, Any]) -> str:
+        return singleflight.build_key(
+            "agent",
+            llm_fingerprint(llm),
+            repr(prompt),
+            ",".join(sorted(getattr(tool, "name", str(tool)) for tool in tools)),
+            json.dumps(agent_query, sort_keys=True, default=str)
+        )
+
+    @classmethod
+    def _invoke_agent(
+            cls,
+            llm: ChatOpenAI,
+            agent_executor: AgentExecutor,
+            static_tokens: int,
+            key: str,
+            agent_query: dict[str, Any],
+            priority: str
+    ) -> str:
+        def call() -> str:
+            model = rate_limiter.model_name(llm)
+            # Reserved for the first round trip; the run's summed usage settles any further ones.
+            estimated = cls.estimate_call_tokens(llm, json.dumps(agent_query, default=str)) + static_tokens
+            usage = _RunUsage()
+            with llm_scheduler.slot_sync(priority, cost=estimated / 1000):
+                rate_limiter.acquire(model, estimated)
+                try:
+                    return cls._response_text(agent_executor.invoke(agent_query, config={"callbacks": [usage]}))
+                finally:
+                    rate_limiter.record_usage(model, estimated, usage.tokens)
+
+        return singleflight.do_sync(key, call, kind="agent")
+
+    @classmethod
+    async def _ainvoke_agent(
+            cls,
+            llm: ChatOpenAI,
+            agent_executor: AgentExecutor,
+            static_tokens: int,
+            key: str,
+            agent_query: dict[str, Any],
+            priority: str
+    ) -> str:
+        async def call() -> str:
+            model = rate_limiter.model_name(llm)
+            estimated = cls.estimate_call_tokens(llm, json.dumps(agent_query, default=str)) + static_tokens
+            usage = _RunUsage()
+            cancelled = False
+            async with llm_scheduler.slot(priority, cost=estimated / 1000):
+                await rate_limiter.aacquire(model, estimated)
+                try:
+                    return cls._response_text(await cls.ainvoke(agent_executor, agent_query, config={"callbacks": [usage]}))
+                except asyncio.CancelledError:
+                    cancelled = True
+                    raise
+                finally:
+                    # Cancelled before any usage arrived: nothing used.
+                    await rate_limiter.arecord_usage(model, estimated, 0 if cancelled and usage.tokens is None else usage.tokens)
+
+        return await singleflight.do(key, call, kind="agent")
+
+    @staticmethod
+    def _format_prompt(
+            prompt: ChatPromptTemplate,
+            parser: PydanticOutputParser,
+            query: str,
+            chat_history: str | List[dict],
+            available_tools: str | None,
+            previous_result: str | None,
+    ) -> str:
+        return prompt.format(
+            query=query,
+            chat_history=chat_history,
+            available_tools=available_tools or "",
+            previous_result=previous_result or "",
+            format_instructions=_format_instructions_for(parser.pydantic_object)
+        )
+
+    @classmethod
+    def _build_agent_executor(
+            cls,
+            llm: ChatOpenAI,
+            tools: List[Any],
+            prompt: ChatPromptTemplate,
+    ) -> Tuple[AgentExecutor, int]:
+        """
+        Returns the executor and the tokens every one of its calls sends besides the query: the
+        prompt's own text and the tool schemas.
+        """
+        # LLM clients and prompts are process-wide singletons, so their ids are stable; the cached
+        # entry holds references to every keyed object so an id can never be reused while it is alive.
+        key = (id(llm), id(prompt), tuple(id(tool) for tool in tools))
+
+        with _executor_cache_lock:
+            cached = _executor_cache.get(key)
+            if cached is not None:
+                _executor_cache.move_to_end(key)
+                return cached[3], cached[4]
+
+        agent = create_tool_calling_agent(
+            llm=llm,
+            tools=tools,
+            prompt=prompt
+        )
+
+        agent_executor = AgentExecutor(
+            agent=agent,
+            tools=tools,
+            verbose=cls.VERBOSE
+        )
+
+        static_tokens = token_counter.count(
+            "\n".join(getattr(getattr(message, "prompt", None), "template", "") for message in prompt.messages)
+            + json.dumps([convert_to_openai_tool(tool) for tool in tools], default=str)
+        )
+
+        with _executor_cache_lock:
+            _executor_cache[key] = (llm, prompt, list(tools), agent_executor, static_tokens)
+            while len(_executor_cache) > EXECUTOR_CACHE_MAX_ENTRIES:
+                _executor_cache.popitem(last=False)
+
+        return agent_executor, static_tokens
+
+    @classmethod
+    def _build_agent_query(
+            cls,
+            prompt: ChatPromptTemplate,
+            query: str,
+            chat_history: str | List[dict],
+            available_tools: str | None,
+            allowed_tool_names: str | None,
+            previous_result: str | None,
+    ) -> dict[str, Any]:
+        agent_query = {"query": query}
+
+        if chat_history:
+            # Handle both string and list chat history formats
+            if isinstance(chat_history, list):
+                agent_query["chat_history"] = chat_history
+            else:
+                # Convert string format to list format for consistency
+                agent_query["chat_history"] = [{"role": "user", "content": chat_history}]
+
+        if available_tools:
+            agent_query["available_tools"] = available_tools
+
+        if allowed_tool_names:
+            agent_query["allowed_tool_names"] = allowed_tool_names
+
+        if previous_result:
+            agent_query["previous_result"] = previous_result
+
+        if cls.VERBOSE:
+            logger.info(f"Agent query input variables: {list(agent_query.keys())}")
+            logger.info(f"Prompt template variables: {prompt.input_variables}")
+
+        return agent_query
+
     @classmethod
     def run_agent_query(
             cls,
@@ -50,60 +409,170 @@ class Utils(Generic[T]):
             available_tools: str | None = None,
             allowed_tool_names: str | None = None,
             previous_result: str | None = None,
+            priority: str = PRIORITY_INTERACTIVE,
+            agent_name: str | None = None,
     ) -> Optional[T]:
 
         if not tools:
-            formatted_prompt = prompt.format(
+            formatted_prompt = cls._format_prompt(
+                prompt=prompt,
+                parser=parser,
                 query=query,
                 chat_history=chat_history,
-                available_tools=available_tools or "",
-                previous_result=previous_result or "",
-                format_instructions=parser.get_format_instructions()
-            )
-            
-            response = llm.invoke(formatted_prompt)
-            return cls.parse_response({"output": response.content}, parser)
-        else:
-            agent = create_tool_calling_agent(
-                llm=llm,
-                tools=tools,
-                prompt=prompt
+                available_tools=available_tools,
+                previous_result=previous_result
             )
 
-            agent_executor = AgentExecutor(
-                agent=agent,
-                tools=tools,
-                verbose=cls.VERBOSE
+            with llm_call_scope(agent_name):
+                output = cls._invoke_llm(llm, formatted_prompt, priority)
+            parsed = cls.parse_response({"output": output}, parser)
+
+            for attempt in range(1, cls.STRUCTURED_OUTPUT_MAX_RETRIES + 1):
+                if parsed is not None:
+                    break
+                with llm_call_scope(agent_name, attempt):
+                    output = cls._invoke_llm(llm, formatted_prompt + cls._retry_instruction(parser, output), priority)
+                parsed = cls.parse_response({"output": output}, parser)
+
+            return parsed
+
+        agent_executor, static_tokens = cls._build_agent_executor(llm=llm, tools=tools, prompt=prompt)
+
+        agent_query = cls._build_agent_query(
+            prompt=prompt,
+            query=query,
+            chat_history=chat_history,
+            available_tools=available_tools,
+            allowed_tool_names=allowed_tool_names,
+            previous_result=previous_result
+        )
+
+        with llm_call_scope(agent_name):
+            output = cls._invoke_agent(llm, agent_executor, static_tokens, cls._agent_flight_key(llm, prompt, tools, agent_query), agent_query, priority)
+        parsed = cls.parse_response({"output": output}, parser)
+
+        for attempt in range(1, cls.STRUCTURED_OUTPUT_MAX_RETRIES + 1):
+            if parsed is not None:
+                break
+            retry_query = {**agent_query, "query": query + cls._retry_instruction(parser, output)}
+            with llm_call_scope(agent_name, attempt):
+                output = cls._invoke_agent(llm, agent_executor, static_tokens, cls._agent_flight_key(llm, prompt, tools, retry_query), retry_query, priority)
+            parsed = cls.parse_response({"output": output}, parser)
+
+        return parsed
+
+    @classmethod
+    async def arun_agent_query(
+            cls,
+            llm: ChatOpenAI,
+            tools: List[Any],
+            query: str,
+            parser: PydanticOutputParser,
+            prompt: ChatPromptTemplate,
+            chat_history: str | List[dict],
+            available_tools: str | None = None,
+            allowed_tool_names: str | None = None,
+            previous_result: str | None = None,
+            priority: str = PRIORITY_INTERACTIVE,
+            agent_name: str | None = None,
+    ) -> Optional[T]:
+        """
+        Async counterpart of run_agent_query. Uses the model's native ainvoke so the event loop
+        keeps serving other sessions while the request is in flight; anything without native
+        async support is pushed onto the bounded agent executor.
+        """
+        if not tools:
+            formatted_prompt = cls._format_prompt(
+                prompt=prompt,
+                parser=parser,
+                query=query,
+                chat_history=chat_history,
+                available_tools=available_tools,
+                previous_result=previous_result
             )
+            # A hedged call only wins with output that parses, so a fast malformed reply cannot beat a good one.
+            validate = functools.partial(is_valid_structured_output, model=parser.pydantic_object)
 
-            agent_query = {"query": query}
+            with llm_call_scope(agent_name):
+                output = await cls._ainvoke_llm(llm, formatted_prompt, priority, validate)
+            parsed = cls.parse_response({"output": output}, parser)
 
-            if chat_history:
-                # Handle both string and list chat history formats
-                if isinstance(chat_history, list):
-                    agent_query["chat_history"] = chat_history
-                else:
-                    # Convert string format to list format for consistency
-                    agent_query["chat_history"] = [{"role": "user", "content": chat_history}]
+            for attempt in range(1, cls.STRUCTURED_OUTPUT_MAX_RETRIES + 1):
+                if parsed is not None:
+                    break
+                with llm_call_scope(agent_name, attempt):
+                    output = await cls._ainvoke_llm(llm, formatted_prompt + cls._retry_instruction(parser, output), priority, validate)
+                parsed = cls.parse_response({"output": output}, parser)
 
-            if available_tools:
-                agent_query["available_tools"] = available_tools
+            return parsed
 
-            if allowed_tool_names:
-                agent_query["allowed_tool_names"] = allowed_tool_names
+        agent_executor, static_tokens = cls._build_agent_executor(llm=llm, tools=tools, prompt=prompt)
 
-            if previous_result:
-                agent_query["previous_result"] = previous_result
+        agent_query = cls._build_agent_query(
+            prompt=prompt,
+            query=query,
+            chat_history=chat_history,
+            available_tools=available_tools,
+            allowed_tool_names=allowed_tool_names,
+            previous_result=previous_result
+        )
+
+        with llm_call_scope(agent_name):
+            output = await cls._ainvoke_agent(llm, agent_executor, static_tokens, cls._agent_flight_key(llm, prompt, tools, agent_query), agent_query, priority)
+        parsed = cls.parse_response({"output": output}, parser)
 
-            if cls.VERBOSE:
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.info(f"Agent query input variables: {list(agent_query.keys())}")
-                logger.info(f"Prompt template variables: {prompt.input_variables}")
+        for attempt in range(1, cls.STRUCTURED_OUTPUT_MAX_RETRIES + 1):
+            if parsed is not None:
+                break
+            retry_query = {**agent_query, "query": query + cls._retry_instruction(parser, output)}
+            with llm_call_scope(agent_name, attempt):
+                output = await cls._ainvoke_agent(llm, agent_executor, static_tokens, cls._agent_flight_key(llm, prompt, tools, retry_query), retry_query, priority)
+            parsed = cls.parse_response({"output": output}, parser)
 
-            raw_response: dict[str, Any] = agent_executor.invoke(agent_query)
+        return parsed
 
-        return cls.parse_response(
-            raw_response=raw_response,
-            parser=parser
+    @classmethod
+    async def astream_agent_query(
+            cls,
+            llm: ChatOpenAI,
+            query: str,
+            parser: PydanticOutputParser,
+            prompt: ChatPromptTemplate,
+            chat_history: str | List[dict],
+            available_tools: str | None = None,
+            previous_result: str | None = None,
+            priority: str = PRIORITY_INTERACTIVE,
+            agent_name: str | None = None,
+    ) -> AsyncIterator[str]:
+        """
+        Streams the raw text of a tool-less structured-output call, for callers that act on the
+        output while it is generated. Holds the scheduler slot for the whole stream. Singleflight,
+        hedging and retries do not apply; the caller parses the accumulated text at the end.
+        """
+        formatted_prompt = cls._format_prompt(
+            prompt=prompt,
+            parser=parser,
+            query=query,
+            chat_history=chat_history,
+            available_tools=available_tools,
+            previous_result=previous_result
         )
+        model = rate_limiter.model_name(llm)
+        estimated = cls.estimate_call_tokens(llm, formatted_prompt)
+        used_tokens: Optional[int] = None
+        abandoned = False
+
+        with llm_call_scope(agent_name):
+            async with llm_scheduler.slot(priority, cost=estimated / 1000):
+                await rate_limiter.aacquire(model, estimated)
+                try:
+                    async for chunk in llm.astream(formatted_prompt):
+                        used_tokens = cls._usage_tokens(chunk) or used_tokens
+                        if chunk.content:
+                            yield str(chunk.content)
+                except (asyncio.CancelledError, GeneratorExit):
+                    abandoned = True
+                    raise
+                finally:
+                    # Settled however the stream ends; abandoned before usage arrived: nothing used.
+                    await rate_limiter.arecord_usage(model, estimated, 0 if abandoned and used_tokens is None else used_tokens)
@@ -0,0 +1,86 @@
+import asyncio
+import contextvars
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from typing import AsyncIterator, Awaitable, Callable, Iterator, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+class BackgroundLoop:
+    """
+    One long-lived event loop per process on a daemon thread, so sync code (Celery tasks) can
+    drive async LLM clients. The shared httpx.AsyncClient pool is bound to the loop it first ran
+    on, so a fresh asyncio.run() per task would throw away pooled connections. Work submitted
+    here runs in a copy of the caller's context, so request and telemetry tags carry over.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is not None:
+            return self._loop
+
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=loop.run_forever, name="background-loop", daemon=True)
+                self._thread.start()
+                self._loop = loop
+                logger.info("Started background event loop")
+
+        return self._loop
+
+    def submit(self, coro_factory: Callable[[], Awaitable[T]]) -> Future:
+        context = contextvars.copy_context()
+
+        async def runner() -> T:
+            return await asyncio.create_task(coro_factory(), context=context)
+
+        return asyncio.run_coroutine_threadsafe(runner(), self.loop())
+
+    def run(self, coro_factory: Callable[[], Awaitable[T]], timeout: Optional[float] = None) -> T:
+        """Runs a coroutine on the loop and blocks the calling thread for its result."""
+        return self.submit(coro_factory).result(timeout)
+
+    def iterate(self, agen_factory: Callable[[], AsyncIterator[T]]) -> Iterator[T]:
+        """Drives an async iterator on the loop and yields its items to the calling thread as they arrive."""
+        items: queue.Queue = queue.Queue()
+
+        async def pump() -> None:
+            try:
+                async for item in agen_factory():
+                    items.put(item)
+            except BaseException as e:
+                items.put(_Failure(e))
+                raise
+            finally:
+                items.put(_DONE)
+
+        future = self.submit(pump)
+
+        try:
+            while (item := items.get()) is not _DONE:
+                if isinstance(item, _Failure):
+                    raise item.error
+                yield item
+        finally:
+            if not future.done():
+                future.cancel()
+
+
+background_loop = BackgroundLoop()
@@ -0,0 +1,198 @@
+import contextvars
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from common.configs.llm_config import llm_config
+from common.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+REF_FIELD = "context_ref"
+
+PAYLOAD_BYTES_BUCKETS: Tuple[float, ...] = (
+    256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072, 262144
+)
+CODEC_SECONDS_BUCKETS: Tuple[float, ...] = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05)
+
+
+class ContextMissingError(LookupError):
+    """A task references context that has expired from (or never reached) the store."""
+
+
+class _TurnPayload:
+    def __init__(self):
+        self.bytes = 0
+        self.tasks = 0
+
+
+_turn_payload: contextvars.ContextVar[Optional[_TurnPayload]] = contextvars.ContextVar("turn_payload", default=None)
+
+
+class ContextStore:
+    """
+    Content-addressed store in Redis for the bulky, mostly repeated arguments of Celery tasks
+    (tool catalogs, history windows, tool results). The backend uploads each distinct value once,
+    then only refreshes its TTL, and the task message carries {"context_ref": <sha256>} in its
+    place; a key found missing on refresh (evicted, flushed) is uploaded again. Workers resolve
+    references through a per-process LRU, so a catalog shared by many turns is fetched once.
+    Values are immutable under their hash, so neither side ever has to invalidate.
+
+    Values shorter than min_bytes stay inline: a reference would cost a Redis round trip for no
+    broker saving.
+    """
+
+    KEY_PREFIX = "context:"
+
+    def __init__(self, enabled: bool, ttl_seconds: int, min_bytes: int, local_max_bytes: int):
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.min_bytes = min_bytes
+        self.local_max_bytes = local_max_bytes
+        self._lock = threading.Lock()
+        # digest -> (value, size); reads on the worker side.
+        self._local: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self._local_bytes = 0
+        # Digests this process has uploaded; for these a TTL refresh usually suffices.
+        self._written: "OrderedDict[str, None]" = OrderedDict()
+
+    @staticmethod
+    def is_ref(value: Any) -> bool:
+        return isinstance(value, dict) and len(value) == 1 and REF_FIELD in value
+
+    def begin_turn(self) -> None:
+        """Starts counting the task payload bytes dispatched by the current request."""
+        _turn_payload.set(_TurnPayload())
+
+    def end_turn(self) -> None:
+        turn = _turn_payload.get()
+        if turn is None or not turn.tasks:
+            return
+        metrics.observe("task_payload_bytes_per_turn", turn.bytes, buckets=PAYLOAD_BYTES_BUCKETS)
+
+    async def aexternalize(self, task: str, kwargs: Dict[str, Any], fields: Iterable[str]) -> Dict[str, Any]:
+        """Returns kwargs with the given fields swapped for references, and records the message size."""
+        started = time.perf_counter()
+        inline_bytes = len(json.dumps(kwargs, default=str))
+        slim = dict(kwargs)
+
+        if self.enabled:
+            for field in fields:
+                value = slim.get(field)
+                if value is None:
+                    continue
+                payload = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                if len(payload) < self.min_bytes:
+                    continue
+                slim[field] = {REF_FIELD: await self._aput(payload)}
+
+        sent_bytes = len(json.dumps(slim, default=str)) if self.enabled else inline_bytes
+        metrics.observe("context_store_serialize_seconds", time.perf_counter() - started, buckets=CODEC_SECONDS_BUCKETS, task=task)
+        metrics.observe("task_payload_bytes", sent_bytes, buckets=PAYLOAD_BYTES_BUCKETS, task=task)
+        metrics.increment("task_payload_bytes_total", value=sent_bytes, task=task)
+        metrics.increment("task_payload_bytes_saved_total", value=inline_bytes - sent_bytes, task=task)
+
+        turn = _turn_payload.get()
+        if turn is not None:
+            turn.bytes += sent_bytes
+            turn.tasks += 1
+
+        return slim
+
+    def resolve(self, value: Any) -> Any:
+        """Returns the value a reference points at; anything else is returned unchanged."""
+        if not self.is_ref(value):
+            return value
+
+        started = time.perf_counter()
+        digest = value[REF_FIELD]
+
+        with self._lock:
+            cached = self._local.get(digest)
+            if cached is not None:
+                self._local.move_to_end(digest)
+        if cached is not None:
+            metrics.increment("context_store_reads_total", source="local")
+            return cached[0]
+
+        from common.redis_infrastructure import infra
+        payload = infra.redis_client.get(f"{self.KEY_PREFIX}{digest}")
+        if payload is None:
+            metrics.increment("context_store_reads_total", source="missing")
+            raise ContextMissingError(f"Context {digest} is not in the store (expired after {self.ttl_seconds}s?)")
+
+        resolved = json.loads(payload)
+        self._remember(digest, resolved, len(payload))
+        metrics.increment("context_store_reads_total", source="redis")
+        metrics.observe("context_store_deserialize_seconds", time.perf_counter() - started, buckets=CODEC_SECONDS_BUCKETS)
+        return resolved
+
+    def get_stats(self) -> Dict[str, Any]:
+        counters = metrics.snapshot()["counters"]
+        by_task: Dict[str, Dict[str, float]] = {}
+        for name in ("task_payload_bytes_total", "task_payload_bytes_saved_total"):
+            for series in counters.get(name, []):
+                by_task.setdefault(series["labels"]["task"], {})[name.removeprefix("task_")] = series["value"]
+
+        with self._lock:
+            local = {"entries": len(self._local), "bytes": self._local_bytes, "max_bytes": self.local_max_bytes}
+
+        return {
+            "enabled": self.enabled,
+            "ttl_seconds": self.ttl_seconds,
+            "min_bytes": self.min_bytes,
+            "local_cache": local,
+            "by_task": by_task,
+            "reads": {series["labels"]["source"]: series["value"] for series in counters.get("context_store_reads_total", [])},
+            "writes": {series["labels"]["outcome"]: series["value"] for series in counters.get("context_store_writes_total", [])},
+        }
+
+    async def _aput(self, payload: bytes) -> str:
+        digest = hashlib.sha256(payload).hexdigest()
+        key = f"{self.KEY_PREFIX}{digest}"
+
+        with self._lock:
+            uploaded = digest in self._written
+
+        from common.redis_infrastructure import infra
+        # Every reference handed out gets a full TTL; EXPIRE returns 0 when the key is gone.
+        if uploaded and await infra.async_redis_client.expire(key, self.ttl_seconds):
+            metrics.increment("context_store_writes_total", outcome="refreshed")
+            return digest
+
+        await infra.async_redis_client.set(key, payload, ex=self.ttl_seconds)
+        metrics.increment("context_store_writes_total", outcome="written")
+        metrics.increment("context_store_written_bytes_total", value=len(payload))
+
+        with self._lock:
+            self._written[digest] = None
+            self._written.move_to_end(digest)
+            while len(self._written) > 4096:
+                self._written.popitem(last=False)
+
+        return digest
+
+    def _remember(self, digest: str, value: Any, size: int) -> None:
+        if size > self.local_max_bytes:
+            return
+
+        with self._lock:
+            if digest in self._local:
+                return
+            self._local[digest] = (value, size)
+            self._local_bytes += size
+            while self._local_bytes > self.local_max_bytes:
+                _, (_, evicted_size) = self._local.popitem(last=False)
+                self._local_bytes -= evicted_size
+
+
+context_store = ContextStore(
+    enabled=llm_config.CONTEXT_STORE_ENABLED,
+    ttl_seconds=llm_config.CONTEXT_STORE_TTL_SECONDS,
+    min_bytes=llm_config.CONTEXT_STORE_MIN_BYTES,
+    local_max_bytes=llm_config.CONTEXT_STORE_LOCAL_MAX_BYTES
+)
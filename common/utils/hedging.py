@@ -0,0 +1,244 @@
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+from common.configs.llm_config import llm_config
+from common.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+R = TypeVar("R")
+
+SAVED_BUCKETS: Tuple[float, ...] = (
+    0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+
+class LatencyTracker:
+    """Sliding window of recent call latencies per key, for percentile-based hedge delays."""
+
+    def __init__(self, window: int, min_samples: int):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, key: str, latency: float) -> None:
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window)
+            samples.append(latency)
+
+    def percentile(self, key: str, percentile: float) -> Optional[float]:
+        """Nearest-rank percentile, or None until min_samples latencies have been seen."""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+
+        if len(samples) < self.min_samples:
+            return None
+
+        rank = max(1, math.ceil(percentile / 100 * len(samples)))
+        return samples[rank - 1]
+
+    def expected_remaining(self, key: str, elapsed: float) -> float:
+        """Mean extra time of recent calls slower than elapsed; 0 when none were."""
+        with self._lock:
+            slower = [latency - elapsed for latency in self._samples.get(key, ()) if latency > elapsed]
+        return sum(slower) / len(slower) if slower else 0.0
+
+    def sample_count(self, key: str) -> int:
+        with self._lock:
+            return len(self._samples.get(key, ()))
+
+    def keys(self):
+        with self._lock:
+            return list(self._samples)
+
+
+class HedgeBudget:
+    """
+    Caps duplicate requests at a fraction of primary calls. Every primary call earns `ratio`
+    credits (up to `burst`), and a hedge spends one.
+    """
+
+    def __init__(self, ratio: float, burst: float):
+        self.ratio = ratio
+        self.burst = burst
+        self._credits = burst
+        self._lock = threading.Lock()
+
+    def earn(self) -> None:
+        with self._lock:
+            self._credits = min(self.burst, self._credits + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._credits < 1:
+                return False
+            self._credits -= 1
+            return True
+
+    @property
+    def credits(self) -> float:
+        with self._lock:
+            return self._credits
+
+
+class RequestHedger:
+    """
+    Opt-in hedging of idempotent LLM calls. If the primary call has not returned after the
+    configured percentile of recent latency for the same key, a duplicate is started. The
+    first response that passes validation wins and the other request is cancelled. When a
+    response fails validation or raises, the other request gets to finish. Hedges are limited
+    by a budget, so a slow upstream cannot double the load on it.
+    """
+
+    def __init__(
+            self,
+            enabled: bool,
+            percentile: float,
+            min_delay_seconds: float,
+            tracker: LatencyTracker,
+            budget: HedgeBudget
+    ):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_delay_seconds = min_delay_seconds
+        self.tracker = tracker
+        self.budget = budget
+
+    def hedge_delay(self, key: str) -> Optional[float]:
+        delay = self.tracker.percentile(key, self.percentile)
+        return None if delay is None else max(delay, self.min_delay_seconds)
+
+    async def run(
+            self,
+            key: str,
+            primary: Callable[[], Awaitable[R]],
+            hedge: Callable[[], Awaitable[R]],
+            validate: Optional[Callable[[R], bool]] = None
+    ) -> R:
+        """
+        Runs primary(), starting hedge() if it is slow. hedge is usually the same call with its own
+        admission checks; it may raise to decline, and then the primary result is awaited as usual.
+        """
+        if not self.enabled:
+            return await primary()
+
+        self.budget.earn()
+        started = time.perf_counter()
+        primary_task = asyncio.ensure_future(primary())
+        delay = self.hedge_delay(key)
+
+        try:
+            if delay is not None:
+                await asyncio.wait({primary_task}, timeout=delay)
+
+            if delay is None or primary_task.done():
+                result = await primary_task
+                self.tracker.observe(key, time.perf_counter() - started)
+                metrics.increment("llm_hedge_calls_total", key=key, outcome="not_needed")
+                return result
+
+            if not self.budget.try_spend():
+                metrics.increment("llm_hedge_calls_total", key=key, outcome="budget_exhausted")
+                result = await primary_task
+                self.tracker.observe(key, time.perf_counter() - started)
+                return result
+        except BaseException:
+            primary_task.cancel()
+            raise
+
+        logger.info(f"Hedging slow LLM call for {key} after {delay:.2f}s")
+        hedge_task = asyncio.ensure_future(hedge())
+        return await self._race(key, started, primary_task, hedge_task, validate)
+
+    async def _race(
+            self,
+            key: str,
+            started: float,
+            primary_task: asyncio.Future,
+            hedge_task: asyncio.Future,
+            validate: Optional[Callable[[Any], bool]]
+    ) -> Any:
+        pending = {primary_task, hedge_task}
+
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+                # Prefer the primary when both land in the same tick.
+                for task in sorted(done, key=lambda finished: finished is not primary_task):
+                    if task.cancelled() or task.exception() is not None:
+                        continue
+                    if validate is not None and not validate(task.result()):
+                        continue
+                    return self._won(key, started, task is hedge_task, task.result())
+        finally:
+            for task in pending:
+                task.cancel()
+
+        # Neither response was usable: hand back a result to the caller's own retry handling,
+        # or the primary's error.
+        metrics.increment("llm_hedge_calls_total", key=key, outcome="both_failed")
+        for task in (primary_task, hedge_task):
+            if not task.cancelled() and task.exception() is None:
+                return task.result()
+        return primary_task.result()
+
+    def _won(self, key: str, started: float, hedge_won: bool, result: Any) -> Any:
+        elapsed = time.perf_counter() - started
+        # A cancelled primary took at least this long, so it enters the window as a lower bound.
+        self.tracker.observe(key, elapsed)
+
+        if hedge_won:
+            metrics.increment("llm_hedge_calls_total", key=key, outcome="hedge_won")
+            metrics.observe(
+                "llm_hedge_latency_saved_seconds",
+                self.tracker.expected_remaining(key, elapsed),
+                buckets=SAVED_BUCKETS,
+                key=key
+            )
+        else:
+            metrics.increment("llm_hedge_calls_total", key=key, outcome="primary_won")
+
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        outcomes = ("not_needed", "budget_exhausted", "primary_won", "hedge_won", "both_failed")
+        by_key = {}
+
+        for key in self.tracker.keys():
+            counts = {outcome: metrics.get_counter("llm_hedge_calls_total", key=key, outcome=outcome) for outcome in outcomes}
+            total = sum(counts.values())
+            hedged = counts["primary_won"] + counts["hedge_won"] + counts["both_failed"]
+            by_key[key] = {
+                **counts,
+                "samples": self.tracker.sample_count(key),
+                "hedge_delay_seconds": self.hedge_delay(key),
+                "hedge_rate": round(hedged / total, 4) if total else 0.0,
+                "hedge_win_rate": round(counts["hedge_won"] / hedged, 4) if hedged else 0.0,
+            }
+
+        return {
+            "enabled": self.enabled,
+            "percentile": self.percentile,
+            "min_delay_seconds": self.min_delay_seconds,
+            "budget_ratio": self.budget.ratio,
+            "budget_credits": round(self.budget.credits, 2),
+            "by_key": by_key,
+        }
+
+
+request_hedger = RequestHedger(
+    enabled=llm_config.HEDGE_ENABLED,
+    percentile=llm_config.HEDGE_PERCENTILE,
+    min_delay_seconds=llm_config.HEDGE_MIN_DELAY_SECONDS,
+    tracker=LatencyTracker(window=llm_config.HEDGE_WINDOW, min_samples=llm_config.HEDGE_MIN_SAMPLES),
+    budget=HedgeBudget(ratio=llm_config.HEDGE_BUDGET_RATIO, burst=llm_config.HEDGE_BUDGET_BURST)
+)
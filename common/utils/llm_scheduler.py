@@ -0,0 +1,274 @@
+import asyncio
+import contextlib
+import itertools
+import logging
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+from common.configs.llm_config import llm_config
+from common.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_STREAMING = "streaming"
+PRIORITY_WORKFLOW = "workflow"
+PRIORITY_BACKGROUND = "background"
+
+ANONYMOUS_USER = "anonymous"
+
+QUEUE_DEPTH_BUCKETS: Tuple[float, ...] = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500)
+
+_request_context: ContextVar[Tuple[Optional[str], Optional[str]]] = ContextVar(
+    "llm_request_context", default=(None, None)
+)
+
+
+def set_request_context(user_id: Optional[str], session_id: Optional[str]) -> None:
+    """Tags LLM calls made from the current task/thread with the user and session they serve."""
+    _request_context.set((user_id, session_id))
+
+
+def get_request_context() -> Tuple[Optional[str], Optional[str]]:
+    return _request_context.get()
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """Parses "interactive=8,streaming=4" style settings."""
+    weights: Dict[str, float] = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        name, value = item.split("=", 1)
+        weights[name.strip().lower()] = float(value)
+    return weights
+
+
+class _Waiter:
+    __slots__ = ("priority", "user_id", "flow", "finish_tag", "start_tag", "seq", "enqueued_at", "notify")
+
+    def __init__(self, priority: str, user_id: str, flow: Tuple[str, str, str], seq: int, notify: Callable[[], None]):
+        self.priority = priority
+        self.user_id = user_id
+        self.flow = flow
+        self.seq = seq
+        self.notify = notify
+        self.enqueued_at = time.monotonic()
+        self.start_tag = 0.0
+        self.finish_tag = 0.0
+
+
+class LLMTicket:
+    """A granted scheduler slot; must be released once the LLM call finishes."""
+    __slots__ = ("priority", "user_id", "released")
+
+    def __init__(self, priority: str, user_id: str):
+        self.priority = priority
+        self.user_id = user_id
+        self.released = False
+
+
+class LLMScheduler:
+    """
+    Weighted fair queuing of LLM calls within one process.
+
+    Every call belongs to a flow (priority class, user, session). A call's virtual finish tag
+    advances by its cost divided by the flow weight. The weight is the class weight split
+    evenly across the user's sessions that have queued calls, so a user opening more sessions
+    does not get more throughput. The lowest tag runs next, within a global concurrency cap, a per-user
+    cap and optional per-class caps. Higher-weight classes (interactive routing, first-token
+    streaming) therefore overtake background work without starving it.
+
+    This orders work inside a process; the cluster-wide request/token budget is enforced
+    separately by the rate limiter.
+    """
+
+    def __init__(
+            self,
+            enabled: bool,
+            max_concurrency: int,
+            max_per_user: int,
+            class_weights: Dict[str, float],
+            class_caps: Dict[str, float]
+    ):
+        self.enabled = enabled
+        self.max_concurrency = max_concurrency
+        self.max_per_user = max_per_user
+        self.class_weights = class_weights
+        self.class_caps = {name: int(cap) for name, cap in class_caps.items()}
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._queue: List[_Waiter] = []
+        self._virtual_time = 0.0
+        self._flow_finish: Dict[Tuple[str, str, str], float] = {}
+        self._active_total = 0
+        self._active_by_user: Counter = Counter()
+        self._active_by_class: Counter = Counter()
+        self._sessions_by_user: Dict[str, Counter] = {}
+
+    async def acquire(self, priority: str, cost: float = 1.0) -> Optional[LLMTicket]:
+        if not self.enabled:
+            return None
+
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future = loop.create_future()
+
+        def notify() -> None:
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = self._enqueue(priority, cost, notify)
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+
+        return self._granted(waiter)
+
+    def acquire_sync(self, priority: str, cost: float = 1.0) -> Optional[LLMTicket]:
+        if not self.enabled:
+            return None
+
+        event = threading.Event()
+        waiter = self._enqueue(priority, cost, event.set)
+        event.wait()
+
+        return self._granted(waiter)
+
+    def release(self, ticket: Optional[LLMTicket]) -> None:
+        if ticket is None or ticket.released:
+            return
+
+        ticket.released = True
+        with self._lock:
+            self._active_total -= 1
+            self._active_by_user[ticket.user_id] -= 1
+            self._active_by_class[ticket.priority] -= 1
+            self._dispatch_locked()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority: str, cost: float = 1.0) -> AsyncIterator[None]:
+        ticket = await self.acquire(priority, cost)
+        try:
+            yield
+        finally:
+            self.release(ticket)
+
+    @contextlib.contextmanager
+    def slot_sync(self, priority: str, cost: float = 1.0) -> Iterator[None]:
+        ticket = self.acquire_sync(priority, cost)
+        try:
+            yield
+        finally:
+            self.release(ticket)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            queued: Counter = Counter(waiter.priority for waiter in self._queue)
+            return {
+                "enabled": self.enabled,
+                "max_concurrency": self.max_concurrency,
+                "max_per_user": self.max_per_user,
+                "class_weights": self.class_weights,
+                "class_caps": self.class_caps,
+                "active": self._active_total,
+                "active_by_class": dict(+self._active_by_class),
+                "queued_by_class": dict(queued),
+                "queued_users": len({waiter.user_id for waiter in self._queue}),
+            }
+
+    def _enqueue(self, priority: str, cost: float, notify: Callable[[], None]) -> _Waiter:
+        user_id, session_id = get_request_context()
+        user_id = user_id or session_id or ANONYMOUS_USER
+        session_id = session_id or user_id
+        flow = (priority, user_id, session_id)
+
+        with self._lock:
+            waiter = _Waiter(priority, user_id, flow, next(self._seq), notify)
+
+            sessions = self._sessions_by_user.setdefault(user_id, Counter())
+            sessions[session_id] += 1
+
+            weight = self.class_weights.get(priority, 1.0) / len(sessions)
+            waiter.start_tag = max(self._virtual_time, self._flow_finish.get(flow, 0.0))
+            waiter.finish_tag = waiter.start_tag + cost / weight
+            self._flow_finish[flow] = waiter.finish_tag
+
+            self._queue.append(waiter)
+            depth = sum(1 for queued in self._queue if queued.priority == priority)
+            self._dispatch_locked()
+
+        metrics.observe("llm_scheduler_queue_depth", depth, buckets=QUEUE_DEPTH_BUCKETS, priority=priority)
+        return waiter
+
+    def _granted(self, waiter: _Waiter) -> LLMTicket:
+        waited = time.monotonic() - waiter.enqueued_at
+        metrics.observe("llm_scheduler_wait_seconds", waited, priority=waiter.priority)
+        metrics.increment("llm_scheduler_calls_total", priority=waiter.priority)
+        return LLMTicket(waiter.priority, waiter.user_id)
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        with self._lock:
+            if waiter in self._queue:
+                self._queue.remove(waiter)
+                self._forget_session_locked(waiter)
+                return
+
+        # Granted between the notify and the cancellation: hand the slot back.
+        self.release(LLMTicket(waiter.priority, waiter.user_id))
+
+    def _dispatch_locked(self) -> None:
+        if self._active_total >= self.max_concurrency or not self._queue:
+            return
+
+        self._queue.sort(key=lambda queued: (queued.finish_tag, queued.seq))
+        remaining: List[_Waiter] = []
+
+        for waiter in self._queue:
+            class_cap = self.class_caps.get(waiter.priority)
+            if (
+                    self._active_total >= self.max_concurrency
+                    or self._active_by_user[waiter.user_id] >= self.max_per_user
+                    or (class_cap is not None and self._active_by_class[waiter.priority] >= class_cap)
+            ):
+                remaining.append(waiter)
+                continue
+
+            self._active_total += 1
+            self._active_by_user[waiter.user_id] += 1
+            self._active_by_class[waiter.priority] += 1
+            self._virtual_time = max(self._virtual_time, waiter.start_tag)
+            self._forget_session_locked(waiter)
+            waiter.notify()
+
+        self._queue = remaining
+
+        if not self._queue and len(self._flow_finish) > 10000:
+            self._flow_finish = {
+                flow: finish for flow, finish in self._flow_finish.items() if finish > self._virtual_time
+            }
+
+    def _forget_session_locked(self, waiter: _Waiter) -> None:
+        sessions = self._sessions_by_user.get(waiter.user_id)
+        if sessions is None:
+            return
+
+        session_id = waiter.flow[2]
+        sessions[session_id] -= 1
+        if sessions[session_id] <= 0:
+            del sessions[session_id]
+        if not sessions:
+            del self._sessions_by_user[waiter.user_id]
+
+
+llm_scheduler = LLMScheduler(
+    enabled=llm_config.SCHEDULER_ENABLED,
+    max_concurrency=llm_config.SCHEDULER_MAX_CONCURRENCY,
+    max_per_user=llm_config.SCHEDULER_MAX_PER_USER,
+    class_weights=parse_weights(llm_config.SCHEDULER_CLASS_WEIGHTS),
+    class_caps=parse_weights(llm_config.SCHEDULER_CLASS_CAPS)
+)
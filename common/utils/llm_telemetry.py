@@ -0,0 +1,340 @@
+import contextlib
+import logging
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from pydantic import BaseModel
+
+from common.configs.llm_config import llm_config
+from common.utils.llm_scheduler import get_request_context
+from common.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_AGENT = "unknown"
+
+TOKEN_BUCKETS: Tuple[float, ...] = (
+    10, 50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000
+)
+
+CACHE_RATIO_BUCKETS: Tuple[float, ...] = (0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0)
+
+# USD per million tokens: (input, cached input, output). Model names match by prefix.
+MODEL_PRICES: Dict[str, Tuple[float, float, float]] = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+}
+
+_turn_id: ContextVar[Optional[str]] = ContextVar("llm_turn_id", default=None)
+_call_scope: ContextVar[Tuple[str, int]] = ContextVar("llm_call_scope", default=(UNKNOWN_AGENT, 0))
+
+
+def begin_turn(turn_id: Optional[str] = None) -> str:
+    """Starts a conversation turn; LLM calls made from this task/thread are attributed to it."""
+    turn_id = turn_id or uuid.uuid4().hex
+    _turn_id.set(turn_id)
+    return turn_id
+
+
+def get_turn_id() -> Optional[str]:
+    return _turn_id.get()
+
+
+@contextlib.contextmanager
+def llm_call_scope(agent_name: Optional[str], attempt: int = 0) -> Iterator[None]:
+    """Labels LLM calls made inside the block with the agent and the structured-output attempt."""
+    token = _call_scope.set((agent_name or UNKNOWN_AGENT, attempt))
+    try:
+        yield
+    finally:
+        _call_scope.reset(token)
+
+
+def get_call_agent() -> str:
+    return _call_scope.get()[0]
+
+
+def parse_prices(spec: str) -> Dict[str, Tuple[float, float, float]]:
+    """Parses "gpt-4o-mini=0.15/0.075/0.6,..." price overrides (USD per million tokens)."""
+    prices: Dict[str, Tuple[float, float, float]] = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        model, values = item.split("=", 1)
+        input_price, cached_price, output_price = (float(value) for value in values.split("/"))
+        prices[model.strip()] = (input_price, cached_price, output_price)
+    return prices
+
+
+class LLMCallRecord(BaseModel):
+    agent_name: str
+    model: str
+    session_id: Optional[str] = None
+    attempt: int = 0
+    streamed: bool = False
+    ttft_seconds: float
+    latency_seconds: float
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    cost_usd: float = 0.0
+    error: Optional[str] = None
+
+
+class _RunState:
+    __slots__ = ("agent_name", "attempt", "turn_id", "session_id", "model", "started_at", "first_token_at")
+
+    def __init__(self, model: str):
+        self.agent_name, self.attempt = _call_scope.get()
+        self.turn_id = _turn_id.get()
+        self.session_id = get_request_context()[1]
+        self.model = model
+        self.started_at = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+
+
+class LLMTelemetryHandler(BaseCallbackHandler):
+    """
+    LangChain callback attached to every registry-built chat model. It times each call from start
+    to first streamed token and to completion, and reads token usage (including cached prompt
+    tokens) from the response. The agent, attempt, session and turn are captured from context
+    variables when the call starts.
+    """
+
+    def __init__(self, telemetry: "LLMTelemetry"):
+        self.telemetry = telemetry
+        self._runs: Dict[UUID, _RunState] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[Any], *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, serialized, kwargs)
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, serialized, kwargs)
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        state = self._runs.get(run_id)
+        if state is not None and state.first_token_at is None and token:
+            state.first_token_at = time.perf_counter()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            state = self._runs.pop(run_id, None)
+        if state is not None:
+            self.telemetry.record(self._build_record(state, *self._usage(response)))
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            state = self._runs.pop(run_id, None)
+        if state is not None:
+            self.telemetry.record(self._build_record(state, 0, 0, 0, error=type(error).__name__))
+
+    def _start(self, run_id: UUID, serialized: Dict[str, Any], kwargs: Dict[str, Any]) -> None:
+        invocation_params = kwargs.get("invocation_params") or {}
+        metadata = kwargs.get("metadata") or {}
+        model = (
+            invocation_params.get("model")
+            or invocation_params.get("model_name")
+            or metadata.get("ls_model_name")
+            or (serialized or {}).get("name")
+            or "unknown"
+        )
+        with self._lock:
+            self._runs[run_id] = _RunState(str(model))
+
+    @staticmethod
+    def _usage(response: LLMResult) -> Tuple[int, int, int]:
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    cached = (usage.get("input_token_details") or {}).get("cache_read") or 0
+                    return usage.get("input_tokens", 0), usage.get("output_tokens", 0), cached
+
+        token_usage = (response.llm_output or {}).get("token_usage") or {}
+        cached = (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+        return token_usage.get("prompt_tokens", 0), token_usage.get("completion_tokens", 0), cached
+
+    def _build_record(
+            self,
+            state: _RunState,
+            prompt_tokens: int,
+            completion_tokens: int,
+            cached_tokens: int,
+            error: Optional[str] = None
+    ) -> Tuple[Optional[str], LLMCallRecord]:
+        finished_at = time.perf_counter()
+        record = LLMCallRecord(
+            agent_name=state.agent_name,
+            model=state.model,
+            session_id=state.session_id,
+            attempt=state.attempt,
+            streamed=state.first_token_at is not None,
+            # A non-streamed reply arrives all at once, so its first token is its last.
+            ttft_seconds=round((state.first_token_at or finished_at) - state.started_at, 4),
+            latency_seconds=round(finished_at - state.started_at, 4),
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cached_tokens=cached_tokens,
+            cost_usd=self.telemetry.cost(state.model, prompt_tokens, completion_tokens, cached_tokens),
+            error=error
+        )
+        return state.turn_id, record
+
+
+class LLMTelemetry:
+    """
+    Per-call LLM telemetry: process-local histograms and counters labelled by agent, plus a
+    per-turn call log in Redis. The router, orchestration and refinement run in the backend and
+    the streamed reply runs in a worker, so the log has to be shared. The worker that publishes
+    the final `complete` message reads it back as the turn's breakdown.
+    """
+
+    KEY_PREFIX = "llm_telemetry:turn:"
+
+    def __init__(self, enabled: bool, turn_ttl_seconds: int, prices: Dict[str, Tuple[float, float, float]]):
+        self.enabled = enabled
+        self.turn_ttl_seconds = turn_ttl_seconds
+        # Longest prefix first so "gpt-4o-mini" wins over "gpt-4o".
+        self.prices = dict(sorted(prices.items(), key=lambda item: len(item[0]), reverse=True))
+        self.handler = LLMTelemetryHandler(self)
+        self._lock = threading.Lock()
+        self._totals: Dict[str, Counter] = defaultdict(Counter)
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int) -> float:
+        for prefix, (input_price, cached_price, output_price) in self.prices.items():
+            if model.startswith(prefix):
+                uncached = max(0, prompt_tokens - cached_tokens)
+                return round((uncached * input_price + cached_tokens * cached_price + completion_tokens * output_price) / 1_000_000, 8)
+        return 0.0
+
+    def record(self, entry: Tuple[Optional[str], LLMCallRecord]) -> None:
+        if not self.enabled:
+            return
+
+        turn_id, record = entry
+        agent = record.agent_name
+        outcome = ("cancelled" if record.error == "CancelledError" else "error") if record.error else "success"
+
+        metrics.increment("llm_calls_total", agent=agent, model=record.model, outcome=outcome)
+        if record.attempt:
+            metrics.increment("llm_call_retries_total", agent=agent)
+        if not record.error:
+            metrics.observe("llm_ttft_seconds", record.ttft_seconds, agent=agent, streamed=record.streamed)
+            metrics.observe("llm_latency_seconds", record.latency_seconds, agent=agent)
+            metrics.observe("llm_prompt_tokens", record.prompt_tokens, buckets=TOKEN_BUCKETS, agent=agent)
+            metrics.observe("llm_completion_tokens", record.completion_tokens, buckets=TOKEN_BUCKETS, agent=agent)
+            metrics.increment("llm_cached_tokens_total", record.cached_tokens, agent=agent)
+            metrics.increment("llm_uncached_prompt_tokens_total", record.prompt_tokens - record.cached_tokens, agent=agent)
+            if record.prompt_tokens:
+                metrics.observe(
+                    "llm_prompt_cache_hit_ratio",
+                    record.cached_tokens / record.prompt_tokens,
+                    buckets=CACHE_RATIO_BUCKETS,
+                    agent=agent
+                )
+            metrics.increment("llm_cost_usd_total", record.cost_usd, agent=agent, model=record.model)
+
+        with self._lock:
+            totals = self._totals[agent]
+            totals["calls"] += 1
+            totals["retries"] += 1 if record.attempt else 0
+            totals["errors"] += 1 if record.error else 0
+            totals["latency_seconds"] += record.latency_seconds
+            totals["prompt_tokens"] += record.prompt_tokens
+            totals["completion_tokens"] += record.completion_tokens
+            totals["cached_tokens"] += record.cached_tokens
+            totals["cost_usd"] += record.cost_usd
+
+        if turn_id:
+            self._append_to_turn(turn_id, record)
+
+    def turn_breakdown(self, turn_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Collects every LLM call recorded for a turn, from any process, into a per-agent summary."""
+        if not self.enabled or not turn_id:
+            return None
+
+        try:
+            from common.redis_infrastructure import infra
+            raw_records = infra.redis_client.lrange(f"{self.KEY_PREFIX}{turn_id}", 0, -1)
+        except Exception as e:
+            logger.warning(f"Failed to read LLM telemetry for turn {turn_id}: {e}")
+            return None
+
+        calls = [LLMCallRecord.model_validate_json(raw) for raw in raw_records]
+        by_agent: Dict[str, Dict[str, Any]] = {}
+
+        for call in calls:
+            summary = by_agent.setdefault(call.agent_name, {
+                "calls": 0, "retries": 0, "errors": 0, "ttft_seconds": call.ttft_seconds, "latency_seconds": 0.0,
+                "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "cost_usd": 0.0,
+            })
+            summary["calls"] += 1
+            summary["retries"] += 1 if call.attempt else 0
+            summary["errors"] += 1 if call.error else 0
+            summary["latency_seconds"] = round(summary["latency_seconds"] + call.latency_seconds, 4)
+            summary["prompt_tokens"] += call.prompt_tokens
+            summary["completion_tokens"] += call.completion_tokens
+            summary["cached_tokens"] += call.cached_tokens
+            summary["cost_usd"] = round(summary["cost_usd"] + call.cost_usd, 8)
+            summary["cached_prompt_ratio"] = self._cached_ratio(summary)
+
+        return {
+            "turn_id": turn_id,
+            "by_agent": by_agent,
+            "totals": {
+                "calls": len(calls),
+                "latency_seconds": round(sum(call.latency_seconds for call in calls), 4),
+                "prompt_tokens": sum(call.prompt_tokens for call in calls),
+                "completion_tokens": sum(call.completion_tokens for call in calls),
+                "cached_tokens": sum(call.cached_tokens for call in calls),
+                "cost_usd": round(sum(call.cost_usd for call in calls), 8),
+            },
+            "calls": [call.model_dump(exclude={"session_id"}) for call in calls],
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            by_agent = {
+                agent: {
+                    **dict(totals),
+                    "avg_latency_seconds": round(totals["latency_seconds"] / totals["calls"], 4) if totals["calls"] else 0.0,
+                    "cost_usd": round(totals["cost_usd"], 6),
+                    "uncached_prompt_tokens": totals["prompt_tokens"] - totals["cached_tokens"],
+                    "cached_prompt_ratio": self._cached_ratio(totals),
+                }
+                for agent, totals in self._totals.items()
+            }
+        return {"enabled": self.enabled, "by_agent": by_agent}
+
+    @staticmethod
+    def _cached_ratio(totals: Dict[str, Any]) -> float:
+        return round(totals["cached_tokens"] / totals["prompt_tokens"], 4) if totals["prompt_tokens"] else 0.0
+
+    def _append_to_turn(self, turn_id: str, record: LLMCallRecord) -> None:
+        try:
+            from common.redis_infrastructure import infra
+            key = f"{self.KEY_PREFIX}{turn_id}"
+            pipe = infra.redis_client.pipeline(transaction=False)
+            pipe.rpush(key, record.model_dump_json())
+            pipe.expire(key, self.turn_ttl_seconds)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to store LLM telemetry for turn {turn_id}: {e}")
+
+
+llm_telemetry = LLMTelemetry(
+    enabled=llm_config.TELEMETRY_ENABLED,
+    turn_ttl_seconds=llm_config.TELEMETRY_TURN_TTL_SECONDS,
+    prices={**MODEL_PRICES, **parse_prices(llm_config.TELEMETRY_PRICES)}
+)
@@ -0,0 +1,87 @@
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from langchain_openai import ChatOpenAI
+
+from common.configs.llm_config import llm_config
+from common.services.llm_client_registry import llm_registry
+from common.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+UNPARSEABLE = "unparseable"
+
+
+class ModelCascade:
+    """
+    Runs a structured-output call on a cheap model first and escalates only when its answer
+    fails local checks: it did not parse, or validate() reported a problem such as a tool
+    missing from the catalog. The last tier's answer is returned even if it fails, so the caller
+    keeps its existing handling of bad output.
+
+    Disabled, the cascade is a single tier (the agent's own model) and still records how
+    often that model's output fails validation.
+    """
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+
+    def tiers(self, agent_name: str, default_model: str) -> List[str]:
+        if not self.enabled:
+            return [default_model]
+        return llm_config.cascade_tiers(agent_name) or [default_model]
+
+    async def run(
+            self,
+            agent_name: str,
+            default_model: str,
+            llm_params: Dict[str, Any],
+            call: Callable[[ChatOpenAI], Awaitable[Optional[T]]],
+            validate: Optional[Callable[[T], Optional[str]]] = None
+    ) -> Optional[T]:
+        tiers = self.tiers(agent_name, default_model)
+        result: Optional[T] = None
+
+        for index, model in enumerate(tiers):
+            started = time.perf_counter()
+            result = await call(llm_registry.get_chat_model(model=model, **llm_params))
+            metrics.observe("llm_cascade_tier_latency_seconds", time.perf_counter() - started, agent=agent_name, tier=model)
+
+            reason = UNPARSEABLE if result is None else (validate(result) if validate else None)
+
+            if reason is None:
+                metrics.increment("llm_cascade_calls_total", agent=agent_name, tier=model, outcome="accepted")
+                return result
+
+            if index == len(tiers) - 1:
+                metrics.increment("llm_cascade_calls_total", agent=agent_name, tier=model, outcome="exhausted")
+                logger.warning(f"{agent_name}: {model} output failed validation ({reason}) with no tier left")
+                return result
+
+            metrics.increment("llm_cascade_calls_total", agent=agent_name, tier=model, outcome="escalated")
+            metrics.increment("llm_cascade_escalations_total", agent=agent_name, tier=model, reason=reason)
+            logger.info(f"{agent_name}: escalating from {model} to {tiers[index + 1]} ({reason})")
+
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        calls = metrics.snapshot()["counters"].get("llm_cascade_calls_total", [])
+        by_agent: Dict[str, Dict[str, Dict[str, float]]] = {}
+
+        for series in calls:
+            labels = series["labels"]
+            tier = by_agent.setdefault(labels["agent"], {}).setdefault(labels["tier"], {})
+            tier[labels["outcome"]] = tier.get(labels["outcome"], 0) + series["value"]
+
+        for tiers in by_agent.values():
+            for counts in tiers.values():
+                total = sum(counts.values())
+                counts["escalation_rate"] = round(counts.get("escalated", 0) / total, 4) if total else 0.0
+
+        return {"enabled": self.enabled, "tiers": llm_config.CASCADE_TIERS, "by_agent": by_agent}
+
+
+model_cascade = ModelCascade(enabled=llm_config.CASCADE_ENABLED)
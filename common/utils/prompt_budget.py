@@ -0,0 +1,330 @@
+import functools
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from common.configs.llm_config import llm_config
+from common.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+TOKEN_BUCKETS: Tuple[float, ...] = (
+    64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536
+)
+
+SLOT_HISTORY = "history"
+SLOT_TOOLS = "tools"
+SLOT_PREVIOUS_RESULT = "previous_result"
+
+# Per-message framing overhead of the chat format (role, separators).
+MESSAGE_OVERHEAD_TOKENS = 4
+TRUNCATION_MARKER = " …[truncated]"
+
+_FIRST_SENTENCE = re.compile(r"^(.+?[.!?])(\s|$)", re.DOTALL)
+
+
+class TokenCounter:
+    """
+    Local token counting with a tokenizer loaded once per process.
+
+    Uses tiktoken when it is installed and falls back to a ~4 characters per token estimate
+    otherwise, so budgeting keeps working (less precisely) without the optional dependency.
+    """
+
+    def __init__(self, encoding_name: str):
+        self.encoding_name = encoding_name
+
+    @functools.cached_property
+    def _encoding(self):
+        try:
+            import tiktoken
+            return tiktoken.get_encoding(self.encoding_name)
+        except ImportError:
+            logger.warning("tiktoken not installed, estimating prompt tokens from character counts.")
+        except Exception as e:
+            logger.warning(f"Failed to load tokenizer {self.encoding_name}, estimating from character counts: {e}")
+        return None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+
+        if self._encoding is None:
+            return max(1, len(text) // 4)
+
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def count_messages(self, messages: List[Dict[str, Any]]) -> int:
+        return sum(self.count(str(message.get("content", ""))) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text down to max_tokens, marking the cut."""
+        if max_tokens <= 0:
+            return ""
+
+        if self.count(text) <= max_tokens:
+            return text
+
+        if self._encoding is None:
+            return text[:max_tokens * 4] + TRUNCATION_MARKER
+
+        tokens = self._encoding.encode(text, disallowed_special=())
+        return self._encoding.decode(tokens[:max_tokens]) + TRUNCATION_MARKER
+
+
+class AgentBudget(BaseModel):
+    """Token budget for the dynamic slots of one agent's prompt, filled in priority order."""
+    max_tokens: int
+    slot_priority: List[str]
+    # A single history message may take at most this share of the history slot.
+    max_message_share: float = 0.5
+
+
+class BudgetedPrompt(BaseModel):
+    chat_history: List[Dict[str, Any]] = []
+    available_tools: str = ""
+    previous_result: str = ""
+    slot_tokens: Dict[str, int] = {}
+    compacted_slots: List[str] = []
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self.slot_tokens.values())
+
+
+def _budget(agent_name: str, default_tokens: int, slot_priority: List[str]) -> AgentBudget:
+    max_tokens = llm_config.prompt_budget_tokens(agent_name, default_tokens)
+    return AgentBudget(max_tokens=max_tokens, slot_priority=slot_priority)
+
+
+AGENT_BUDGETS: Dict[str, AgentBudget] = {
+    "router_agent": _budget("router_agent", 3000, [SLOT_TOOLS, SLOT_HISTORY]),
+    "fused_routing_agent": _budget("fused_routing_agent", 6000, [SLOT_TOOLS, SLOT_HISTORY]),
+    "tool_orchestration_agent": _budget("tool_orchestration_agent", 6000, [SLOT_TOOLS, SLOT_HISTORY]),
+    "tool_refinement_agent": _budget("tool_refinement_agent", 8000, [SLOT_TOOLS, SLOT_PREVIOUS_RESULT, SLOT_HISTORY]),
+    "chat_agent": _budget("chat_agent", 6000, [SLOT_HISTORY, SLOT_TOOLS]),
+    "summary_agent": _budget("summary_agent", 8000, [SLOT_PREVIOUS_RESULT, SLOT_HISTORY]),
+}
+
+
+class PromptBudgetManager:
+    """
+    Fits the variable parts of an agent prompt (chat history, tool catalog, previous tool
+    results) into that agent's token budget.
+
+    Slots are filled in the agent's priority order; each one is compacted just enough to fit
+    what is left of the budget, so low-priority context is the first to shrink. Every call
+    records per-slot prompt sizes so oversized sessions are visible on /metrics.
+    """
+
+    def __init__(self, token_counter: TokenCounter, budgets: Dict[str, AgentBudget], enabled: bool = True):
+        self.token_counter = token_counter
+        self.budgets = budgets
+        self.enabled = enabled
+
+    def fit(
+            self,
+            agent_name: str,
+            chat_history: Optional[List[Dict[str, Any]]] = None,
+            available_tools: Optional[str] = None,
+            previous_result: Optional[Any] = None,
+    ) -> BudgetedPrompt:
+        chat_history = chat_history or []
+        available_tools = available_tools or ""
+        previous_result_str = self._serialize_previous_result(previous_result)
+
+        budget = self.budgets.get(agent_name)
+        if not self.enabled or budget is None:
+            prompt = BudgetedPrompt(
+                chat_history=chat_history,
+                available_tools=available_tools,
+                previous_result=previous_result_str,
+                slot_tokens={
+                    SLOT_HISTORY: self.token_counter.count_messages(chat_history),
+                    SLOT_TOOLS: self.token_counter.count(available_tools),
+                    SLOT_PREVIOUS_RESULT: self.token_counter.count(previous_result_str),
+                },
+            )
+            self._record(agent_name, prompt)
+            return prompt
+
+        remaining = budget.max_tokens
+        prompt = BudgetedPrompt()
+
+        for slot in budget.slot_priority:
+            if slot == SLOT_HISTORY:
+                prompt.chat_history, used, compacted = self._fit_history(chat_history, remaining, budget.max_message_share)
+            elif slot == SLOT_TOOLS:
+                prompt.available_tools, used, compacted = self._fit_tools(available_tools, remaining)
+            elif slot == SLOT_PREVIOUS_RESULT:
+                prompt.previous_result, used, compacted = self._fit_previous_result(previous_result, previous_result_str, remaining)
+            else:
+                continue
+
+            prompt.slot_tokens[slot] = used
+            if compacted:
+                prompt.compacted_slots.append(slot)
+            remaining = max(0, remaining - used)
+
+        self._record(agent_name, prompt)
+
+        if prompt.compacted_slots:
+            logger.info(
+                f"Prompt budget for {agent_name}: compacted {prompt.compacted_slots} to fit "
+                f"{prompt.total_tokens}/{budget.max_tokens} tokens"
+            )
+
+        return prompt
+
+    def _fit_history(
+            self,
+            chat_history: List[Dict[str, Any]],
+            max_tokens: int,
+            max_message_share: float
+    ) -> Tuple[List[Dict[str, Any]], int, bool]:
+        used = self.token_counter.count_messages(chat_history)
+        if used <= max_tokens:
+            return chat_history, used, False
+
+        per_message_limit = max(1, int(max_tokens * max_message_share))
+        kept: List[Dict[str, Any]] = []
+        used = 0
+
+        # Newest messages carry the most relevant context, so walk backwards and stop once full.
+        for message in reversed(chat_history):
+            content = str(message.get("content", ""))
+            content = self.token_counter.truncate(content, per_message_limit)
+            cost = self.token_counter.count(content) + MESSAGE_OVERHEAD_TOKENS
+
+            if used + cost > max_tokens:
+                if not kept and max_tokens > MESSAGE_OVERHEAD_TOKENS:
+                    content = self.token_counter.truncate(content, max_tokens - MESSAGE_OVERHEAD_TOKENS)
+                    kept.append({**message, "content": content})
+                    used += self.token_counter.count(content) + MESSAGE_OVERHEAD_TOKENS
+                break
+
+            kept.append({**message, "content": content})
+            used += cost
+
+        kept.reverse()
+        return kept, used, True
+
+    def _fit_tools(self, available_tools: str, max_tokens: int) -> Tuple[str, int, bool]:
+        used = self.token_counter.count(available_tools)
+        if used <= max_tokens:
+            return available_tools, used, False
+
+        # Tool names and parameter lists are what the model needs to plan a call, so descriptions
+        # are shortened first, then dropped, before any tool is left out of the catalog.
+        blocks = [block for block in available_tools.split("\n\n") if block.strip()]
+
+        for compact in (self._first_sentence_descriptions, self._without_descriptions):
+            blocks = [compact(block) for block in blocks]
+            compacted = "\n\n".join(blocks)
+            used = self.token_counter.count(compacted)
+            if used <= max_tokens:
+                return compacted, used, True
+
+        kept: List[str] = []
+        used = 0
+        for block in blocks:
+            cost = self.token_counter.count(block) + 1
+            if used + cost > max_tokens:
+                break
+            kept.append(block)
+            used += cost
+
+        omitted = len(blocks) - len(kept)
+        compacted = "\n\n".join(kept) + f"\n\n({omitted} more tools omitted)"
+        return compacted, self.token_counter.count(compacted), True
+
+    @staticmethod
+    def _first_sentence_descriptions(block: str) -> str:
+        lines = []
+        for line in block.split("\n"):
+            if line.startswith("description: "):
+                description = line[len("description: "):]
+                match = _FIRST_SENTENCE.match(description)
+                line = f"description: {match.group(1) if match else description}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    @staticmethod
+    def _without_descriptions(block: str) -> str:
+        return "\n".join(line for line in block.split("\n") if not line.startswith("description: "))
+
+    def _fit_previous_result(
+            self,
+            previous_result: Optional[Any],
+            previous_result_str: str,
+            max_tokens: int
+    ) -> Tuple[str, int, bool]:
+        used = self.token_counter.count(previous_result_str)
+        if used <= max_tokens:
+            return previous_result_str, used, False
+
+        if isinstance(previous_result, list) and previous_result:
+            # Shrink long values in older results first; the latest result is usually what the
+            # next step consumes, so it keeps its detail the longest.
+            for max_chars in (2000, 500, 200):
+                older = [self._truncate_values(result, max_chars) for result in previous_result[:-1]]
+                compacted = self._serialize_previous_result(older + previous_result[-1:])
+                used = self.token_counter.count(compacted)
+                if used <= max_tokens:
+                    return compacted, used, True
+
+            for max_chars in (500, 200, 80):
+                compacted = self._serialize_previous_result(
+                    [self._truncate_values(result, max_chars) for result in previous_result]
+                )
+                used = self.token_counter.count(compacted)
+                if used <= max_tokens:
+                    return compacted, used, True
+
+            previous_result_str = compacted
+
+        compacted = self.token_counter.truncate(previous_result_str, max_tokens)
+        return compacted, self.token_counter.count(compacted), True
+
+    @classmethod
+    def _truncate_values(cls, value: Any, max_chars: int) -> Any:
+        if isinstance(value, str):
+            return value if len(value) <= max_chars else value[:max_chars] + TRUNCATION_MARKER
+        if isinstance(value, dict):
+            return {key: cls._truncate_values(item, max_chars) for key, item in value.items()}
+        if isinstance(value, list):
+            return [cls._truncate_values(item, max_chars) for item in value]
+        return value
+
+    @staticmethod
+    def _serialize_previous_result(previous_result: Optional[Any]) -> str:
+        if previous_result is None or previous_result == "":
+            return ""
+
+        if isinstance(previous_result, str):
+            return previous_result
+
+        # Compact separators: indentation alone was roughly a third of the tokens in this slot.
+        return json.dumps(previous_result, separators=(",", ":"), ensure_ascii=False, default=str)
+
+    @staticmethod
+    def _record(agent_name: str, prompt: BudgetedPrompt) -> None:
+        for slot, tokens in prompt.slot_tokens.items():
+            metrics.observe("prompt_slot_tokens", tokens, buckets=TOKEN_BUCKETS, agent=agent_name, slot=slot)
+
+        metrics.observe("prompt_dynamic_tokens", prompt.total_tokens, buckets=TOKEN_BUCKETS, agent=agent_name)
+
+        for slot in prompt.compacted_slots:
+            metrics.increment("prompt_slot_compactions_total", agent=agent_name, slot=slot)
+
+
+token_counter = TokenCounter(encoding_name=llm_config.PROMPT_TOKENIZER_ENCODING)
+
+prompt_budget = PromptBudgetManager(
+    token_counter=token_counter,
+    budgets=AGENT_BUDGETS,
+    enabled=llm_config.PROMPT_BUDGET_ENABLED
+)
@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from common.configs.llm_config import llm_config
+from common.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+WAIT_BUCKETS: Tuple[float, ...] = (
+    0.0, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+# Two token buckets in one hash, refilled continuously from the Redis clock so every node
+# agrees on time. A call is admitted only when both the request and the token bucket can pay
+# for it; otherwise the reply carries how long until they can.
+_ACQUIRE_SCRIPT = """
+local rpm = tonumber(ARGV[1])
+local tpm = tonumber(ARGV[2])
+local cost = math.min(tonumber(ARGV[3]), tpm)
+
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local state = redis.call("HMGET", KEYS[1], "requests", "tokens", "ts")
+local requests = tonumber(state[1]) or rpm
+local tokens = tonumber(state[2]) or tpm
+local elapsed = math.max(0, now - (tonumber(state[3]) or now))
+
+requests = math.min(rpm, requests + elapsed * rpm / 60)
+tokens = math.min(tpm, tokens + elapsed * tpm / 60)
+
+local wait = 0
+if requests < 1 then
+    wait = math.max(wait, (1 - requests) * 60 / rpm)
+end
+if tokens < cost then
+    wait = math.max(wait, (cost - tokens) * 60 / tpm)
+end
+
+local admitted = 0
+if wait == 0 then
+    requests = requests - 1
+    tokens = tokens - cost
+    admitted = 1
+end
+
+redis.call("HSET", KEYS[1], "requests", requests, "tokens", tokens, "ts", now)
+redis.call("EXPIRE", KEYS[1], 120)
+
+return {admitted, tostring(wait)}
+"""
+
+
+class LLMRateLimitExceeded(RuntimeError):
+    """Raised when the cluster-wide LLM budget cannot admit a call within the caller's policy."""
+
+
+class LLMRateLimiter:
+    """
+    Redis token-bucket limiter shared by the backend and every Celery worker.
+
+    Each model gets a requests-per-minute and a tokens-per-minute bucket. Callers reserve
+    one request plus an estimate of the tokens they will use, and either wait until the
+    budget refills ("wait", bounded by max_wait_seconds) or fail fast ("reject"). After the
+    call the estimate can be corrected with the real usage. If Redis is unreachable the limiter
+    fails open so an outage of the limiter never becomes an outage of the product.
+    """
+
+    KEY_PREFIX = "llm_rate_limit:"
+
+    def __init__(
+            self,
+            enabled: bool,
+            requests_per_minute: int,
+            tokens_per_minute: int,
+            policy: str,
+            max_wait_seconds: float
+    ):
+        self.enabled = enabled
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.policy = policy
+        self.max_wait_seconds = max_wait_seconds
+        self._sync_script = None
+        self._async_script = None
+
+    @staticmethod
+    def model_name(llm: Any) -> str:
+        return getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+
+    def acquire(self, model: str, estimated_tokens: int, policy: Optional[str] = None) -> float:
+        """Blocks until the call is admitted; returns the time spent queued in seconds."""
+        if not self.enabled:
+            return 0.0
+
+        policy = policy or self.policy
+        started = time.monotonic()
+
+        while True:
+            try:
+                admitted, wait = self._try_acquire_sync(model, estimated_tokens)
+            except Exception as e:
+                return self._fail_open(model, e)
+
+            queued = time.monotonic() - started
+            if admitted:
+                return self._admitted(model, queued)
+
+            self._check_policy(model, policy, queued, wait)
+            time.sleep(wait)
+
+    async def aacquire(self, model: str, estimated_tokens: int, policy: Optional[str] = None) -> float:
+        """Async counterpart of acquire; waits on the event loop instead of blocking a thread."""
+        if not self.enabled:
+            return 0.0
+
+        policy = policy or self.policy
+        started = time.monotonic()
+
+        while True:
+            try:
+                admitted, wait = await self._try_acquire_async(model, estimated_tokens)
+            except Exception as e:
+                return self._fail_open(model, e)
+
+            queued = time.monotonic() - started
+            if admitted:
+                return self._admitted(model, queued)
+
+            self._check_policy(model, policy, queued, wait)
+            await asyncio.sleep(wait)
+
+    def record_usage(self, model: str, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Returns over-reserved tokens to the bucket, or charges the shortfall. None (usage unknown) keeps the reservation."""
+        if not self.enabled or actual_tokens is None or actual_tokens == estimated_tokens:
+            return
+
+        try:
+            from common.redis_infrastructure import infra
+            infra.redis_client.hincrbyfloat(f"{self.KEY_PREFIX}{model}", "tokens", estimated_tokens - actual_tokens)
+        except Exception as e:
+            logger.warning(f"Failed to reconcile LLM token usage: {e}")
+
+    async def arecord_usage(self, model: str, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        if not self.enabled or actual_tokens is None or actual_tokens == estimated_tokens:
+            return
+
+        try:
+            from common.redis_infrastructure import infra
+            await infra.async_redis_client.hincrbyfloat(f"{self.KEY_PREFIX}{model}", "tokens", estimated_tokens - actual_tokens)
+        except Exception as e:
+            logger.warning(f"Failed to reconcile LLM token usage: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "policy": self.policy,
+            "requests_per_minute": self.requests_per_minute,
+            "tokens_per_minute": self.tokens_per_minute,
+            "max_wait_seconds": self.max_wait_seconds,
+        }
+
+    def _try_acquire_sync(self, model: str, estimated_tokens: int) -> Tuple[bool, float]:
+        if self._sync_script is None:
+            from common.redis_infrastructure import infra
+            self._sync_script = infra.redis_client.register_script(_ACQUIRE_SCRIPT)
+
+        admitted, wait = self._sync_script(
+            keys=[f"{self.KEY_PREFIX}{model}"],
+            args=[self.requests_per_minute, self.tokens_per_minute, estimated_tokens]
+        )
+        return bool(int(admitted)), float(wait)
+
+    async def _try_acquire_async(self, model: str, estimated_tokens: int) -> Tuple[bool, float]:
+        if self._async_script is None:
+            from common.redis_infrastructure import infra
+            self._async_script = infra.async_redis_client.register_script(_ACQUIRE_SCRIPT)
+
+        admitted, wait = await self._async_script(
+            keys=[f"{self.KEY_PREFIX}{model}"],
+            args=[self.requests_per_minute, self.tokens_per_minute, estimated_tokens]
+        )
+        return bool(int(admitted)), float(wait)
+
+    def _check_policy(self, model: str, policy: str, queued: float, wait: float) -> None:
+        if policy == "reject" or queued + wait > self.max_wait_seconds:
+            metrics.increment("llm_rate_limit_requests_total", model=model, outcome="rejected")
+            raise LLMRateLimitExceeded(
+                f"LLM rate limit reached for {model}: next slot in {wait:.2f}s (queued {queued:.2f}s, policy={policy})"
+            )
+
+    @staticmethod
+    def _admitted(model: str, queued: float) -> float:
+        metrics.observe("llm_rate_limit_wait_seconds", queued, buckets=WAIT_BUCKETS, model=model)
+        metrics.increment("llm_rate_limit_requests_total", model=model, outcome="queued" if queued > 0.001 else "admitted")
+        return queued
+
+    @staticmethod
+    def _fail_open(model: str, error: Exception) -> float:
+        logger.warning(f"LLM rate limiter unavailable, admitting call without a budget check: {error}")
+        metrics.increment("llm_rate_limit_requests_total", model=model, outcome="fail_open")
+        return 0.0
+
+
+rate_limiter = LLMRateLimiter(
+    enabled=llm_config.RATE_LIMIT_ENABLED,
+    requests_per_minute=llm_config.RATE_LIMIT_REQUESTS_PER_MINUTE,
+    tokens_per_minute=llm_config.RATE_LIMIT_TOKENS_PER_MINUTE,
+    policy=llm_config.RATE_LIMIT_POLICY,
+    max_wait_seconds=llm_config.RATE_LIMIT_MAX_WAIT_SECONDS
+)
@@ -0,0 +1,412 @@
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional
+
+from common.configs.llm_config import llm_config
+from common.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Delete the lock only if this node still owns it.
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def llm_fingerprint(llm: Any) -> str:
+    """Model name and sampling parameters, so only calls to an identically configured client coalesce."""
+    params = getattr(llm, "_identifying_params", None) or {"type": type(llm).__name__}
+    return json.dumps(params, sort_keys=True, default=str)
+
+
+class StreamFlight:
+    """Buffered fan-out of one upstream token stream to any number of local subscribers."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._chunks: List[str] = []
+        self._done = False
+        self._error: Optional[BaseException] = None
+
+    def publish(self, chunk: str) -> None:
+        with self._condition:
+            self._chunks.append(chunk)
+            self._condition.notify_all()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        with self._condition:
+            self._done = True
+            self._error = error
+            self._condition.notify_all()
+
+    def subscribe(self, timeout: float) -> Iterator[str]:
+        """Replays chunks already received, then follows the live stream until it finishes."""
+        index = 0
+        deadline = time.monotonic() + timeout
+
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: len(self._chunks) > index or self._done,
+                    timeout=max(0.0, deadline - time.monotonic())
+                )
+                pending = self._chunks[index:]
+                done = self._done
+                error = self._error
+
+            for chunk in pending:
+                yield chunk
+            index += len(pending)
+
+            if done and not pending:
+                if error is not None:
+                    raise RuntimeError(f"Shared upstream stream failed: {error}")
+                return
+
+            if not pending and time.monotonic() >= deadline:
+                raise TimeoutError("Timed out waiting for shared upstream stream")
+
+
+class SingleFlight:
+    """
+    In-flight deduplication of identical LLM calls.
+
+    Concurrent callers with the same key share one upstream call: the first caller (leader)
+    runs it and the rest wait for its result or follow its token stream. Within a process this
+    uses futures and buffered stream fan-out; with Redis enabled a lock extends it across nodes.
+    Followers on another node read the leader's result key, or mirror the leader's result
+    stream for token streams. Nothing is cached once the leader finishes; the result key only
+    lives long enough for waiting followers to pick it up.
+    """
+
+    LOCK_PREFIX = "singleflight:lock:"
+    RESULT_PREFIX = "singleflight:result:"
+
+    def __init__(
+            self,
+            enabled: bool,
+            redis_enabled: bool,
+            lock_ttl_seconds: int,
+            result_ttl_seconds: int,
+            wait_timeout_seconds: float,
+            poll_interval_seconds: float = 0.05
+    ):
+        self.enabled = enabled
+        self.redis_enabled = redis_enabled
+        self.lock_ttl_seconds = lock_ttl_seconds
+        self.result_ttl_seconds = result_ttl_seconds
+        self.wait_timeout_seconds = wait_timeout_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+        self._lock = threading.Lock()
+        self._sync_calls: Dict[str, Future] = {}
+        self._async_calls: Dict[str, asyncio.Future] = {}
+        self._streams: Dict[str, StreamFlight] = {}
+
+    @staticmethod
+    def build_key(*parts: str) -> str:
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    def do_sync(self, key: str, func: Callable[[], str], kind: str = "call") -> str:
+        if not self.enabled:
+            return func()
+
+        with self._lock:
+            future = self._sync_calls.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = self._sync_calls[key] = Future()
+
+        if not is_leader:
+            metrics.increment("singleflight_requests_total", kind=kind, role="local_follower")
+            return future.result(timeout=self.wait_timeout_seconds)
+
+        try:
+            result = self._lead_sync(key, func, kind)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._sync_calls.pop(key, None)
+
+    async def do(self, key: str, func: Callable[[], Awaitable[str]], kind: str = "call") -> str:
+        if not self.enabled:
+            return await func()
+
+        loop = asyncio.get_running_loop()
+
+        # Futures belong to one event loop; a caller on another loop just runs on its own.
+        while (future := self._async_calls.get(key)) is not None and future.get_loop() is loop:
+            metrics.increment("singleflight_requests_total", kind=kind, role="local_follower")
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # The leader's caller went away (websocket closed, speculative branch dropped); that
+                # is no reason to fail this request. Follow or become the next leader instead.
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                metrics.increment("singleflight_leader_cancelled_total", kind=kind)
+
+        future = loop.create_future()
+        self._async_calls[key] = future
+
+        try:
+            result = await self._lead_async(key, func, kind)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # Mark the exception retrieved so a leader without followers does not log a warning.
+                future.exception()
+            raise
+        finally:
+            if self._async_calls.get(key) is future:
+                del self._async_calls[key]
+
+    def stream(self, key: str, producer: Callable[[], Iterable[str]], result_channel: str) -> Iterator[str]:
+        """
+        Yields the chunks of producer(), sharing a single upstream stream between identical
+        concurrent requests. result_channel is the Redis stream the leader publishes to; with
+        Redis enabled, a leader on another node is followed by mirroring that channel.
+        """
+        if not self.enabled:
+            yield from producer()
+            return
+
+        with self._lock:
+            flight = self._streams.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = self._streams[key] = StreamFlight()
+
+        if not is_leader:
+            metrics.increment("singleflight_requests_total", kind="stream", role="local_follower")
+            yield from flight.subscribe(timeout=self.wait_timeout_seconds)
+            return
+
+        token = self._acquire_remote_lock_sync(key, value=result_channel)
+        remote_channel = None
+        if token is None and self.redis_enabled:
+            remote_channel = self._get_remote_owner_sync(key)
+
+        error: Optional[BaseException] = None
+        try:
+            if remote_channel:
+                metrics.increment("singleflight_requests_total", kind="stream", role="remote_follower")
+                chunks = self._mirror_remote_stream(remote_channel)
+            else:
+                metrics.increment("singleflight_requests_total", kind="stream", role="leader")
+                chunks = producer()
+
+            for chunk in chunks:
+                flight.publish(chunk)
+                yield chunk
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            flight.finish(error)
+            with self._lock:
+                self._streams.pop(key, None)
+            self._release_remote_lock_sync(key, token)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "redis_enabled": self.redis_enabled,
+            "in_flight_calls": len(self._sync_calls) + len(self._async_calls),
+            "in_flight_streams": len(self._streams),
+        }
+
+    def _lead_sync(self, key: str, func: Callable[[], str], kind: str) -> str:
+        if not self.redis_enabled:
+            metrics.increment("singleflight_requests_total", kind=kind, role="leader")
+            return func()
+
+        token = self._acquire_remote_lock_sync(key, value=uuid.uuid4().hex)
+        if token is None:
+            result = self._wait_remote_result_sync(key)
+            if result is not None:
+                metrics.increment("singleflight_requests_total", kind=kind, role="remote_follower")
+                return result
+            metrics.increment("singleflight_requests_total", kind=kind, role="fallback")
+            return func()
+
+        metrics.increment("singleflight_requests_total", kind=kind, role="leader")
+        try:
+            result = func()
+            self._store_remote_result_sync(key, result)
+            return result
+        finally:
+            self._release_remote_lock_sync(key, token)
+
+    async def _lead_async(self, key: str, func: Callable[[], Awaitable[str]], kind: str) -> str:
+        if not self.redis_enabled:
+            metrics.increment("singleflight_requests_total", kind=kind, role="leader")
+            return await func()
+
+        token = await self._acquire_remote_lock_async(key, value=uuid.uuid4().hex)
+        if token is None:
+            result = await self._wait_remote_result_async(key)
+            if result is not None:
+                metrics.increment("singleflight_requests_total", kind=kind, role="remote_follower")
+                return result
+            metrics.increment("singleflight_requests_total", kind=kind, role="fallback")
+            return await func()
+
+        metrics.increment("singleflight_requests_total", kind=kind, role="leader")
+        try:
+            result = await func()
+            await self._store_remote_result_async(key, result)
+            return result
+        finally:
+            await self._release_remote_lock_async(key, token)
+
+    @staticmethod
+    def _sync_redis():
+        from common.redis_infrastructure import infra
+        return infra.redis_client
+
+    @staticmethod
+    def _async_redis():
+        from common.redis_infrastructure import infra
+        return infra.async_redis_client
+
+    def _acquire_remote_lock_sync(self, key: str, value: str) -> Optional[str]:
+        if not self.redis_enabled:
+            return None
+        try:
+            acquired = self._sync_redis().set(f"{self.LOCK_PREFIX}{key}", value, nx=True, ex=self.lock_ttl_seconds)
+            return value if acquired else None
+        except Exception as e:
+            logger.warning(f"Singleflight lock unavailable, running locally: {e}")
+            return None
+
+    async def _acquire_remote_lock_async(self, key: str, value: str) -> Optional[str]:
+        try:
+            acquired = await self._async_redis().set(f"{self.LOCK_PREFIX}{key}", value, nx=True, ex=self.lock_ttl_seconds)
+            return value if acquired else None
+        except Exception as e:
+            logger.warning(f"Singleflight lock unavailable, running locally: {e}")
+            return None
+
+    def _release_remote_lock_sync(self, key: str, token: Optional[str]) -> None:
+        if token is None:
+            return
+        try:
+            self._sync_redis().eval(_RELEASE_LOCK_SCRIPT, 1, f"{self.LOCK_PREFIX}{key}", token)
+        except Exception as e:
+            logger.warning(f"Failed to release singleflight lock: {e}")
+
+    async def _release_remote_lock_async(self, key: str, token: Optional[str]) -> None:
+        try:
+            await self._async_redis().eval(_RELEASE_LOCK_SCRIPT, 1, f"{self.LOCK_PREFIX}{key}", token)
+        except Exception as e:
+            logger.warning(f"Failed to release singleflight lock: {e}")
+
+    def _store_remote_result_sync(self, key: str, result: str) -> None:
+        try:
+            self._sync_redis().set(f"{self.RESULT_PREFIX}{key}", result, ex=self.result_ttl_seconds)
+        except Exception as e:
+            logger.warning(f"Failed to share singleflight result: {e}")
+
+    async def _store_remote_result_async(self, key: str, result: str) -> None:
+        try:
+            await self._async_redis().set(f"{self.RESULT_PREFIX}{key}", result, ex=self.result_ttl_seconds)
+        except Exception as e:
+            logger.warning(f"Failed to share singleflight result: {e}")
+
+    def _get_remote_owner_sync(self, key: str) -> Optional[str]:
+        try:
+            owner = self._sync_redis().get(f"{self.LOCK_PREFIX}{key}")
+        except Exception as e:
+            logger.warning(f"Failed to read singleflight lock owner: {e}")
+            return None
+        return owner.decode("utf-8") if isinstance(owner, bytes) else owner
+
+    def _wait_remote_result_sync(self, key: str) -> Optional[str]:
+        """Polls for the leader's result; None if the leader gave up or the wait timed out."""
+        deadline = time.monotonic() + self.wait_timeout_seconds
+        redis_client = self._sync_redis()
+
+        try:
+            while time.monotonic() < deadline:
+                result = redis_client.get(f"{self.RESULT_PREFIX}{key}")
+                if result is not None:
+                    return result.decode("utf-8") if isinstance(result, bytes) else result
+                if not redis_client.exists(f"{self.LOCK_PREFIX}{key}"):
+                    return None
+                time.sleep(self.poll_interval_seconds)
+        except Exception as e:
+            logger.warning(f"Failed waiting for singleflight result: {e}")
+
+        return None
+
+    async def _wait_remote_result_async(self, key: str) -> Optional[str]:
+        deadline = time.monotonic() + self.wait_timeout_seconds
+        redis_client = self._async_redis()
+
+        try:
+            while time.monotonic() < deadline:
+                result = await redis_client.get(f"{self.RESULT_PREFIX}{key}")
+                if result is not None:
+                    return result.decode("utf-8") if isinstance(result, bytes) else result
+                if not await redis_client.exists(f"{self.LOCK_PREFIX}{key}"):
+                    return None
+                await asyncio.sleep(self.poll_interval_seconds)
+        except Exception as e:
+            logger.warning(f"Failed waiting for singleflight result: {e}")
+
+        return None
+
+    def _mirror_remote_stream(self, channel: str) -> Iterator[str]:
+        """Follows another node's result stream from the beginning until it completes."""
+        redis_client = self._sync_redis()
+        last_id = "0-0"
+        deadline = time.monotonic() + self.wait_timeout_seconds
+
+        while time.monotonic() < deadline:
+            response = redis_client.xread({channel: last_id}, block=1000, count=100)
+            for _, entries in response or []:
+                for entry_id, fields in entries:
+                    last_id = entry_id
+                    fields = {
+                        (k.decode("utf-8") if isinstance(k, bytes) else k): (v.decode("utf-8") if isinstance(v, bytes) else v)
+                        for k, v in fields.items()
+                    }
+                    progress = fields.get("progress")
+                    if progress == "streaming" and fields.get("chunk"):
+                        yield fields["chunk"]
+                    elif progress == "complete":
+                        return
+                    elif progress == "error":
+                        raise RuntimeError(f"Shared upstream stream failed on another node: {fields.get('chunk')}")
+
+        raise TimeoutError(f"Timed out mirroring shared stream {channel}")
+
+
+singleflight = SingleFlight(
+    enabled=llm_config.SINGLEFLIGHT_ENABLED,
+    redis_enabled=llm_config.SINGLEFLIGHT_REDIS_ENABLED,
+    lock_ttl_seconds=llm_config.SINGLEFLIGHT_LOCK_TTL_SECONDS,
+    result_ttl_seconds=llm_config.SINGLEFLIGHT_RESULT_TTL_SECONDS,
+    wait_timeout_seconds=llm_config.SINGLEFLIGHT_WAIT_TIMEOUT_SECONDS
+)
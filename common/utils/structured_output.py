@@ -0,0 +1,380 @@
+import functools
+import json
+import logging
+import re
+from typing import Any, Callable, Dict, Generic, List, Optional, Tuple, Type, TypeVar
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from common.utils.metrics import metrics
+
+T = TypeVar("T", bound=BaseModel)
+
+logger = logging.getLogger(__name__)
+
+_CODE_FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.DOTALL)
+_OPEN_CODE_FENCE = re.compile(r"^\s*```(?:json|JSON)?\s*", re.DOTALL)
+_PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+@functools.lru_cache(maxsize=128)
+def get_type_adapter(model: Type[T]) -> TypeAdapter:
+    """TypeAdapters compile the model's validator; build each one once per process."""
+    return TypeAdapter(model)
+
+
+def _strip_code_fences(text: str) -> str:
+    match = _CODE_FENCE.search(text)
+    if match:
+        return match.group(1).strip()
+
+    # A response cut off mid-answer has an opening fence and no closing one.
+    return _OPEN_CODE_FENCE.sub("", text).strip()
+
+
+def _extract_json_span(text: str) -> str:
+    starts = [index for index in (text.find("{"), text.find("[")) if index != -1]
+    if not starts:
+        return text
+
+    start = min(starts)
+    end = max(text.rfind("}"), text.rfind("]"))
+
+    if end > start:
+        in_string, stack, _ = _scan(text[start:end + 1])
+        if not in_string and not stack:
+            return text[start:end + 1]
+
+    # Unbalanced up to the last closing bracket means the output was truncated; keep the tail.
+    return text[start:]
+
+
+def _scan(text: str) -> Tuple[bool, List[str], int]:
+    """
+    Walks text tracking string and bracket state. Returns whether it ended inside a string,
+    the unclosed bracket stack and the offset of the last comma outside a string (-1 if none).
+    """
+    stack: List[str] = []
+    in_string = False
+    escaped = False
+    last_comma = -1
+
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+
+        if char == '"':
+            in_string = True
+        elif char in _CLOSERS:
+            stack.append(char)
+        elif char in "}]" and stack:
+            stack.pop()
+        elif char == ",":
+            last_comma = index
+
+    return in_string, stack, last_comma
+
+
+def _convert_single_quotes(text: str) -> str:
+    out: List[str] = []
+    in_double = False
+    in_single = False
+    escaped = False
+    buffer: List[str] = []
+
+    for char in text:
+        if in_single:
+            if escaped:
+                buffer.append(char)
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == "'":
+                out.append(json.dumps("".join(buffer)))
+                buffer = []
+                in_single = False
+            else:
+                buffer.append(char)
+            continue
+
+        if in_double:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_double = False
+            continue
+
+        if char == "'":
+            in_single = True
+        elif char == '"':
+            in_double = True
+            out.append(char)
+        else:
+            out.append(char)
+
+    if in_single:
+        out.append(json.dumps("".join(buffer)))
+
+    return "".join(out)
+
+
+def _replace_python_literals(text: str) -> str:
+    # Only touch bare words outside strings; "None" inside a string value is legitimate.
+    parts = re.split(r'("(?:[^"\\]|\\.)*")', text)
+    for index in range(0, len(parts), 2):
+        parts[index] = re.sub(r"\b(True|False|None)\b", lambda m: _PYTHON_LITERALS[m.group(1)], parts[index])
+    return "".join(parts)
+
+
+def _remove_trailing_commas(text: str) -> str:
+    parts = re.split(r'("(?:[^"\\]|\\.)*")', text)
+    for index in range(0, len(parts), 2):
+        parts[index] = re.sub(r",(\s*[}\]])", r"\1", parts[index])
+    return "".join(parts)
+
+
+def _close_truncated(text: str) -> str:
+    in_string, stack, _ = _scan(text)
+
+    if in_string:
+        text += '"'
+
+    text = text.rstrip()
+    if text.endswith(","):
+        text = text[:-1]
+    elif text.endswith(":"):
+        text += "null"
+
+    return text + "".join(_CLOSERS[bracket] for bracket in reversed(stack))
+
+
+def _cut_to_last_complete_value(text: str) -> str:
+    """Drops a dangling partial member (e.g. a key with no value) by cutting at the last comma."""
+    _, _, last_comma = _scan(text)
+
+    if last_comma == -1:
+        return text
+
+    return _close_truncated(text[:last_comma])
+
+
+def _drop_partial_element(text: str) -> str:
+    """
+    Drops the element of the innermost open array that the output was cut off inside, e.g. the
+    second invocation of {"tools": [{...}, {"tool_name": "b", "inp, keeping the complete ones.
+    """
+    # Open brackets as [bracket, offset, last comma at that depth].
+    stack: List[List[Any]] = []
+    in_string = False
+    escaped = False
+
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+
+        if char == '"':
+            in_string = True
+        elif char in _CLOSERS:
+            stack.append([char, index, -1])
+        elif char in "}]" and stack:
+            stack.pop()
+        elif char == "," and stack:
+            stack[-1][2] = index
+
+    arrays = [entry for entry in stack if entry[0] == "["]
+    if not arrays:
+        return text
+
+    _, start, last_comma = arrays[-1]
+    return _close_truncated(text[:last_comma] if last_comma != -1 else text[:start + 1])
+
+
+# Repairs that close truncated output; they are alternatives, not steps applied on top of each other.
+_CLOSING_REPAIRS = {"truncated", "dangling_member", "partial_element"}
+
+REPAIRS: List[Tuple[str, Callable[[str], str]]] = [
+    ("code_fence", _strip_code_fences),
+    ("extract_json", _extract_json_span),
+    ("python_literals", _replace_python_literals),
+    ("single_quotes", _convert_single_quotes),
+    ("trailing_commas", _remove_trailing_commas),
+    ("truncated", _close_truncated),
+    ("dangling_member", _cut_to_last_complete_value),
+    ("partial_element", _drop_partial_element),
+]
+
+
+def _is_json(text: str) -> bool:
+    try:
+        json.loads(text)
+        return True
+    except ValueError:
+        return False
+
+
+def _parse(text: str, adapter: TypeAdapter) -> Tuple[Any, str, List[str], Optional[Exception]]:
+    """Returns (result or None, outcome, repairs applied, last validation error)."""
+    try:
+        return adapter.validate_json(text), "direct", [], None
+    except ValidationError as e:
+        error = e
+
+    if _is_json(text):
+        # Well-formed JSON that does not match the schema: repairs cannot help.
+        return None, "schema_error", [], error
+
+    repaired = text
+    applied: List[str] = []
+
+    unclosed = text
+
+    for name, repair in REPAIRS:
+        closing = name in _CLOSING_REPAIRS
+        # A closing repair balances the text, after which the cut-off point can no longer be
+        # found, so each one starts from the text as it was before any of them ran.
+        candidate = repair(unclosed if closing else repaired)
+        if candidate == repaired:
+            continue
+
+        repaired = candidate
+        if closing:
+            applied = [applied_name for applied_name in applied if applied_name not in _CLOSING_REPAIRS]
+        else:
+            unclosed = candidate
+        applied.append(name)
+
+        try:
+            return adapter.validate_json(repaired), "repaired", applied, None
+        except ValidationError as e:
+            error = e
+
+    return None, "failed", applied, error
+
+
+def is_valid_structured_output(text: str, model: Type[BaseModel]) -> bool:
+    """True when text parses into model, with repairs; records no metrics, so callers can pre-check."""
+    return _parse(text, get_type_adapter(model))[0] is not None
+
+
+def parse_structured_output(text: str, model: Type[T]) -> Optional[T]:
+    """
+    Validates an LLM response straight into model with a cached TypeAdapter. When the fast
+    path fails on malformed JSON, applies local repairs one by one and re-validates after each
+    step. Returns None when the output cannot be repaired or is well-formed JSON of the wrong shape.
+    """
+    schema = model.__name__
+    result, outcome, applied, error = _parse(text, get_type_adapter(model))
+
+    metrics.increment("structured_output_parse_total", schema=schema, outcome=outcome)
+
+    if outcome == "repaired":
+        for repair_name in applied:
+            metrics.increment("structured_output_repairs_total", schema=schema, repair=repair_name)
+        logger.info(f"Repaired structured output for {schema} locally: {applied}")
+    elif outcome == "schema_error":
+        logger.error(f"Structured output does not match {schema}: {error}")
+        logger.debug(f"Raw response: {text}")
+    elif outcome == "failed":
+        logger.error(f"Could not parse structured output for {schema} after repairs {applied}: {error}")
+        logger.debug(f"Raw response: {text}")
+
+    return result
+
+
+class IncrementalArrayParser(Generic[T]):
+    """
+    Parses a streamed JSON object such as {"tools": [...]} chunk by chunk. Every element of the
+    first array under the root is validated into model as soon as its closing brace arrives, so
+    callers can act on it before the rest of the output exists. Elements that fail validation
+    are skipped here; the caller still holds the full text for parse_structured_output.
+    """
+
+    def __init__(self, model: Type[T]):
+        self.adapter = get_type_adapter(model)
+        self.text = ""
+        self._index = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escaped = False
+        self._array_depth: Optional[int] = None
+        self._item_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[T]:
+        self.text += chunk
+        items: List[T] = []
+
+        for index in range(self._index, len(self.text)):
+            char = self.text[index]
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in _CLOSERS:
+                if char == "[" and self._array_depth is None and len(self._stack) <= 1:
+                    self._array_depth = len(self._stack) + 1
+                elif char == "{" and self._array_depth is not None and len(self._stack) == self._array_depth:
+                    self._item_start = index
+                self._stack.append(char)
+            elif char in "}]" and self._stack:
+                self._stack.pop()
+                if char == "}" and self._item_start is not None and len(self._stack) == self._array_depth:
+                    item = self._validate(self.text[self._item_start:index + 1])
+                    if item is not None:
+                        items.append(item)
+                    self._item_start = None
+
+        self._index = len(self.text)
+        return items
+
+    def _validate(self, text: str) -> Optional[T]:
+        try:
+            return self.adapter.validate_json(text)
+        except ValidationError as e:
+            logger.warning(f"Skipping streamed element that does not validate: {e}")
+            return None
+
+
+def get_stats() -> Dict[str, Dict[str, float]]:
+    """Per-schema parse outcomes with repair and failure rates."""
+    counters = metrics.snapshot()["counters"]
+    stats: Dict[str, Dict[str, float]] = {}
+
+    for series in counters.get("structured_output_parse_total", []):
+        schema_stats = stats.setdefault(series["labels"]["schema"], {})
+        schema_stats[series["labels"]["outcome"]] = int(series["value"])
+
+    for series in counters.get("structured_output_retries_total", []):
+        stats.setdefault(series["labels"]["schema"], {})["retries"] = int(series["value"])
+
+    for schema_stats in stats.values():
+        total = sum(schema_stats.get(outcome, 0) for outcome in ("direct", "repaired", "schema_error", "failed"))
+        schema_stats["repair_rate"] = round(schema_stats.get("repaired", 0) / total, 4) if total else 0.0
+        schema_stats["failure_rate"] = round(
+            (schema_stats.get("schema_error", 0) + schema_stats.get("failed", 0)) / total, 4
+        ) if total else 0.0
+
+    return stats
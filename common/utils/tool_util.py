@@ -1,6 +1,7 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 from app.schemas.tool_summaries import ToolSummary, ToolsSummaryByServer
+from app.schemas.tool_invocation import ToolInvocation
 from app.schemas.tool_result import ToolResult
 
 
@@ -55,3 +56,42 @@ def format_final_summary_result(tool_results: List[ToolResult]) -> Dict[str, Any
         "success": True,
         "error_message": None
     }
+
+
+def find_invocation_errors(
+        tool_invocations: List[ToolInvocation],
+        tool_summaries: ToolsSummaryByServer,
+        check_dependencies: bool = True,
+        allow_optional_parameters: bool = False
+) -> Optional[str]:
+    """
+    Checks planned invocations against the tool catalog: every tool must exist and its
+    input_data keys must be exactly the tool's listed parameters. Returns the first problem
+    found ("unknown_tool", "unknown_parameter", "missing_parameter", "bad_dependency"), or None.
+    Dependencies can only be checked against a whole plan, not a single refined step.
+    Summaries list required parameters only, so plans built from the full tool schema
+    (native function calling) pass allow_optional_parameters.
+    """
+    catalog: Dict[str, ToolSummary] = {
+        tool.tool_name: tool
+        for tools in tool_summaries.servers.values()
+        for tool in tools
+        if tool.tool_name
+    }
+    ranks = {tool_invocation.rank for tool_invocation in tool_invocations}
+
+    for tool_invocation in tool_invocations:
+        tool = catalog.get(tool_invocation.tool_name)
+        if tool is None:
+            return "unknown_tool"
+
+        parameter_names = {parameter.param_name for parameter in tool.parameters}
+        if not allow_optional_parameters and set(tool_invocation.input_data) - parameter_names:
+            return "unknown_parameter"
+        if parameter_names - set(tool_invocation.input_data):
+            return "missing_parameter"
+
+        if check_dependencies and any(rank not in ranks or rank >= tool_invocation.rank for rank in tool_invocation.depends_on):
+            return "bad_dependency"
+
+    return None
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Pre-Router Evaluation Script
+Replays recorded RouterAgent decisions through the local pre-router and reports how often
+it settles a message on its own and how often it agrees with the LLM.
+
+Record decisions by running the backend with ROUTER_DECISION_LOG_PATH set (one JSON object
+per line: user_input, last_assistant_message, tool_summaries, use_tools), then run from the
+repository root. With the pre-router enabled, turns it settles are still sent to the LLM router
+in the background ("shadow" records), so the log covers every turn, not only the ones it passed on:
+
+    PYTHONPATH=. python evaluate_pre_router.py router_decisions.jsonl --thresholds 0.8 0.85 0.9 0.95
+"""
+
+import argparse
+import json
+import time
+from collections import Counter
+from typing import List
+
+from app.agents.router_agent.pre_router import PreRouter
+from app.schemas.tool_summaries import ToolsSummaryByServer
+from common.utils.tool_util import format_tool_by_server_name
+
+
+def load_records(path: str) -> List[dict]:
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                print(f"⚠️ Skipping line {line_number}: {e}")
+    return records
+
+
+def evaluate(records: List[dict], threshold: float) -> dict:
+    pre_router = PreRouter(confidence_threshold=threshold)
+    settled = agreed = 0
+    disagreements: Counter = Counter()
+    elapsed = 0.0
+
+    for record in records:
+        tool_summaries = ToolsSummaryByServer(**record["tool_summaries"])
+        tool_summaries_str = format_tool_by_server_name(tool_summaries)
+
+        started = time.perf_counter()
+        result = pre_router.classify(
+            record["user_input"],
+            tool_summaries,
+            tool_summaries_str,
+            record.get("last_assistant_message", "")
+        )
+        elapsed += time.perf_counter() - started
+
+        if result.decision is None or result.confidence < threshold:
+            continue
+
+        settled += 1
+        if result.decision.use_tools == record["use_tools"]:
+            agreed += 1
+        else:
+            disagreements[result.reason] += 1
+
+    total = len(records)
+    return {
+        "threshold": threshold,
+        "total": total,
+        "settled": settled,
+        "coverage": settled / total if total else 0.0,
+        "agreement": agreed / settled if settled else 0.0,
+        "avg_us": (elapsed / total) * 1_000_000 if total else 0.0,
+        "disagreements": dict(disagreements),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log_path", help="JSONL file of recorded LLM router decisions")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.75, 0.8, 0.85, 0.9, 0.95])
+    args = parser.parse_args()
+
+    records = load_records(args.log_path)
+    if not records:
+        print("No recorded decisions found.")
+        return
+
+    llm_tool_rate = sum(1 for record in records if record["use_tools"]) / len(records)
+    print(f"📊 {len(records)} recorded decisions ({llm_tool_rate:.1%} routed to tools by the LLM)")
+    print("threshold | settled locally | agreement | avg classify | disagreements by rule")
+
+    for threshold in args.thresholds:
+        row = evaluate(records, threshold)
+        print(
+            f"{row['threshold']:>9.2f} | {row['settled']:>6} ({row['coverage']:>6.1%}) | "
+            f"{row['agreement']:>9.1%} | {row['avg_us']:>9.1f}µs | {row['disagreements']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""
+OpenAI-compatible LLM Stand-in Server
+Serves /v1/chat/completions (streaming and non-streaming) with scripted answers per agent,
+so the whole backend and worker pipeline can be load-tested offline without OpenAI calls.
+
+The caller's agent is recognised from the output schema in its prompt:
+- RouterDecision: a use_tools flag.
+- FusedRoutingDecision: a mode and a tool plan.
+- ToolInvocations: a plan built from the tool catalog in the prompt.
+- ToolInvocation: the invocation under refinement, echoed back.
+- Requests carrying native `tools` get parallel tool calls planned from those definitions.
+- Anything else gets free-text chat.
+
+Latency follows a profile: time to first token, tokens per second, jitter and injected 429/500
+errors.
+Repeated prompt prefixes are reported as cached tokens, as provider prefix caching would report them.
+
+Run it, then point the backend and workers at it:
+
+    python llm_standin_server.py --port 8900 --profile realistic --error-rate 0.01
+    LLM_BASE_URL=http://localhost:8900/v1 OPENAI_API_KEY=standin ...
+"""
+
+import argparse
+import ast
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+PROFILES: Dict[str, Dict[str, float]] = {
+    "instant": {"ttft": 0.0, "tokens_per_second": 0.0, "jitter": 0.0},
+    "fast": {"ttft": 0.05, "tokens_per_second": 500.0, "jitter": 0.1},
+    "realistic": {"ttft": 0.45, "tokens_per_second": 80.0, "jitter": 0.3},
+    "slow": {"ttft": 1.5, "tokens_per_second": 25.0, "jitter": 0.5},
+}
+
+CHAT_SENTENCES = [
+    "Sure, I can help with that.",
+    "Here is a short overview of what I found.",
+    "The tools connected to this session can look that up if you need live data.",
+    "Let me know if you would like more detail on any part of this.",
+    "This answer was generated by the local stand-in server for load testing.",
+]
+
+_OUTPUT_SCHEMA = re.compile(r"Here is the output schema:\s*```\s*(\{.*?\})\s*```", re.DOTALL)
+_TOOL_BLOCK = re.compile(r"tool_name: (?P<name>[^\n]+)\n(?:description: (?P<description>[^\n]*)\n)?parameters: (?P<parameters>[^\n]*)")
+_INVOCATION_REPR = re.compile(r"tool_name='(?P<name>[^']*)' input_data=(?P<input>\{.*?\}) rank=(?P<rank>\d+)(?: depends_on=(?P<depends>\[[^\]]*\]))?")
+_USER_INPUT = re.compile(r"(?:Original user input|User input): ([^\n]*)")
+_WORD = re.compile(r"[a-z0-9]+")
+
+PARAMETER_SAMPLES: Dict[str, Any] = {
+    "str": "sample", "string": "sample", "int": 1, "integer": 1, "float": 1.0, "number": 1.0,
+    "bool": True, "boolean": True, "list": [], "array": [], "dict": {}, "object": {},
+}
+
+
+class StandinSettings:
+    def __init__(self, args: argparse.Namespace):
+        profile = PROFILES[args.profile]
+        self.ttft: float = args.ttft if args.ttft is not None else profile["ttft"]
+        self.tokens_per_second: float = args.tokens_per_second if args.tokens_per_second is not None else profile["tokens_per_second"]
+        self.jitter: float = args.jitter if args.jitter is not None else profile["jitter"]
+        self.error_rate: float = args.error_rate
+        self.tool_route_rate: float = args.tool_route_rate
+        self.chat_sentences: int = args.chat_sentences
+        self.agent_ttft: Dict[str, float] = dict(
+            (name, float(value)) for name, value in (item.split("=", 1) for item in args.agent_ttft)
+        )
+        self.prefix_cache_speedup: float = args.prefix_cache_speedup
+        self.seed: Optional[int] = args.seed
+
+
+class Stats:
+    def __init__(self):
+        self.requests: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.started_at = time.time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "requests_by_agent": dict(self.requests),
+            "injected_errors": dict(self.errors),
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cached_prompt_ratio": round(self.cached_tokens / self.prompt_tokens, 4) if self.prompt_tokens else 0.0,
+        }
+
+
+class PrefixCache:
+    """
+    Mimics provider prompt caching: prefixes of at least min_tokens are cached in increments
+    of block_tokens. A request reports as cached the longest block-aligned prefix that an
+    earlier request already sent. Tokens are approximated as 4 characters.
+    """
+
+    def __init__(self, min_tokens: int = 1024, block_tokens: int = 128, max_entries: int = 100000):
+        self.min_chars = min_tokens * 4
+        self.block_chars = block_tokens * 4
+        self.max_entries = max_entries
+        self._seen: OrderedDict = OrderedDict()
+
+    def lookup_and_store(self, prompt: str) -> int:
+        digest = hashlib.sha1()
+        cached_chars = 0
+        position = 0
+
+        for boundary in range(self.min_chars, len(prompt) + 1, self.block_chars):
+            digest.update(prompt[position:boundary].encode("utf-8"))
+            position = boundary
+            key = digest.hexdigest()
+            if key in self._seen:
+                cached_chars = boundary
+                self._seen.move_to_end(key)
+            else:
+                self._seen[key] = None
+
+        while len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+
+        return cached_chars // 4
+
+
+def _prompt_text(body: Dict[str, Any]) -> str:
+    parts = []
+    for message in body.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        parts.append(str(content or ""))
+    return "\n".join(parts)
+
+
+def detect_agent(prompt: str) -> str:
+    match = _OUTPUT_SCHEMA.search(prompt)
+    if not match:
+        return "chat"
+
+    try:
+        properties = set(json.loads(match.group(1)).get("properties", {}).keys())
+    except ValueError:
+        return "chat"
+
+    if "use_tools" in properties:
+        return "router"
+    if {"mode", "tools"} <= properties:
+        return "fused_routing"
+    if "tools" in properties:
+        return "tool_orchestration"
+    if {"tool_name", "input_data"} <= properties:
+        return "tool_refinement"
+    return "chat"
+
+
+def parse_tool_catalog(prompt: str) -> List[Dict[str, Any]]:
+    tools = []
+    seen = set()
+    for match in _TOOL_BLOCK.finditer(prompt):
+        name = match.group("name").strip()
+        if name in seen:
+            continue
+        seen.add(name)
+        parameters = {}
+        for parameter in filter(None, (item.strip() for item in match.group("parameters").split(","))):
+            param_name, _, param_type = parameter.partition(":")
+            parameters[param_name.strip()] = PARAMETER_SAMPLES.get(param_type.strip().lower(), "sample")
+        tools.append({"name": name, "description": match.group("description") or "", "parameters": parameters})
+    return tools
+
+
+def parse_invocations(prompt: str) -> List[Dict[str, Any]]:
+    invocations = []
+    for match in _INVOCATION_REPR.finditer(prompt):
+        try:
+            input_data = ast.literal_eval(match.group("input"))
+            depends_on = ast.literal_eval(match.group("depends")) if match.group("depends") else []
+        except (ValueError, SyntaxError):
+            input_data, depends_on = {}, []
+        invocations.append({
+            "tool_name": match.group("name"),
+            "input_data": input_data,
+            "rank": int(match.group("rank")),
+            "depends_on": depends_on,
+        })
+    return invocations
+
+
+def native_tool_catalog(body: Dict[str, Any]) -> List[Dict[str, Any]]:
+    tools = []
+    for definition in body.get("tools") or []:
+        function = definition.get("function", {})
+        schema = function.get("parameters") or {}
+        properties = schema.get("properties", {})
+        tools.append({
+            "name": function.get("name", ""),
+            "description": function.get("description", ""),
+            "parameters": {
+                name: PARAMETER_SAMPLES.get(str(properties.get(name, {}).get("type", "")).lower(), "sample")
+                for name in schema.get("required", [])
+            },
+        })
+    return tools
+
+
+def plan_tools(prompt: str, catalog: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    catalog = parse_tool_catalog(prompt) if catalog is None else catalog
+    if not catalog:
+        return []
+
+    user_input = _USER_INPUT.search(prompt)
+    words = set(_WORD.findall((user_input.group(1) if user_input else prompt[-500:]).lower()))
+
+    def score(tool: Dict[str, Any]) -> int:
+        return len(words & set(_WORD.findall(f"{tool['name']} {tool['description']}".lower().replace("_", " "))))
+
+    chosen = [tool for tool in sorted(catalog, key=score, reverse=True) if score(tool) > 0][:3] or catalog[:1]
+
+    return [
+        {"tool_name": tool["name"], "input_data": dict(tool["parameters"]), "rank": rank, "depends_on": []}
+        for rank, tool in enumerate(chosen, 1)
+    ]
+
+
+def scripted_response(agent: str, prompt: str, settings: StandinSettings) -> str:
+    digest = int(hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8], 16)
+    use_tools = (digest % 1000) / 1000 < settings.tool_route_rate
+
+    if agent == "router":
+        return json.dumps({"use_tools": use_tools})
+
+    if agent == "fused_routing":
+        tools = plan_tools(prompt) if use_tools else []
+        return json.dumps({"mode": "tools" if tools else "chat", "tools": tools})
+
+    if agent == "tool_orchestration":
+        return json.dumps({"tools": parse_invocations(prompt) or plan_tools(prompt)})
+
+    if agent == "tool_refinement":
+        invocations = parse_invocations(prompt)
+        return json.dumps(invocations[0] if invocations else {"tool_name": "unknown", "input_data": {}, "rank": 1})
+
+    sentences = [CHAT_SENTENCES[(digest + index) % len(CHAT_SENTENCES)] for index in range(settings.chat_sentences)]
+    return " ".join(sentences)
+
+
+def tokenize(text: str) -> List[str]:
+    """Splits into word-sized pieces that re-join to the original text, like streamed deltas."""
+    return re.findall(r"\s*\S+", text) or [text]
+
+
+class StandinServer:
+    def __init__(self, settings: StandinSettings):
+        self.settings = settings
+        self.stats = Stats()
+        self.random = random.Random(settings.seed)
+        self.prefix_cache = PrefixCache()
+
+    def _jittered(self, seconds: float) -> float:
+        if seconds <= 0:
+            return 0.0
+        return max(0.0, seconds * self.random.uniform(1 - self.settings.jitter, 1 + self.settings.jitter))
+
+    def _inject_error(self, agent: str) -> Optional[JSONResponse]:
+        if self.settings.error_rate <= 0 or self.random.random() >= self.settings.error_rate:
+            return None
+
+        if self.random.random() < 0.5:
+            self.stats.errors["429"] += 1
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after": "1"},
+                content={"error": {"message": f"Stand-in rate limit ({agent})", "type": "rate_limit_error", "code": "rate_limit_exceeded"}},
+            )
+
+        self.stats.errors["500"] += 1
+        return JSONResponse(
+            status_code=500,
+            content={"error": {"message": f"Stand-in server error ({agent})", "type": "server_error", "code": None}},
+        )
+
+    def _ttft(self, agent: str, cached_share: float = 0.0) -> float:
+        ttft = self.settings.agent_ttft.get(agent, self.settings.ttft)
+        return self._jittered(ttft * (1 - self.settings.prefix_cache_speedup * cached_share))
+
+    def _token_delay(self) -> float:
+        if self.settings.tokens_per_second <= 0:
+            return 0.0
+        return self._jittered(1.0 / self.settings.tokens_per_second)
+
+    @staticmethod
+    def _usage(prompt: str, completion_tokens: int, cached_tokens: int) -> Dict[str, Any]:
+        prompt_tokens = max(1, len(prompt) // 4)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": min(cached_tokens, prompt_tokens)},
+        }
+
+    async def chat_completions(self, request: Request):
+        body = await request.json()
+        prompt = _prompt_text(body)
+        agent = "tool_orchestration" if body.get("tools") else detect_agent(prompt)
+        model = body.get("model", "gpt-4o-mini")
+        self.stats.requests[agent] += 1
+
+        error = self._inject_error(agent)
+        if error is not None:
+            return error
+
+        if body.get("tools") and not body.get("stream"):
+            return await self._tool_calls(body, prompt, model)
+
+        content = scripted_response(agent, prompt, self.settings)
+        tokens = tokenize(content)
+        cached_tokens = self.prefix_cache.lookup_and_store(prompt)
+        usage = self._usage(prompt, len(tokens), cached_tokens)
+        cached_share = usage["prompt_tokens_details"]["cached_tokens"] / usage["prompt_tokens"]
+        self.stats.prompt_tokens += usage["prompt_tokens"]
+        self.stats.cached_tokens += usage["prompt_tokens_details"]["cached_tokens"]
+        completion_id = f"chatcmpl-standin-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+
+        if body.get("stream"):
+            include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+            return StreamingResponse(
+                self._stream(completion_id, created, model, agent, tokens, usage if include_usage else None, cached_share),
+                media_type="text/event-stream",
+            )
+
+        await asyncio.sleep(self._ttft(agent, cached_share) + sum(self._token_delay() for _ in tokens[1:]))
+
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+                "logprobs": None,
+            }],
+            "usage": usage,
+        }
+
+    async def _tool_calls(self, body: Dict[str, Any], prompt: str, model: str) -> Dict[str, Any]:
+        tool_calls = [
+            {
+                "id": f"call_{uuid.uuid4().hex[:24]}",
+                "type": "function",
+                "function": {"name": tool["tool_name"], "arguments": json.dumps(tool["input_data"])},
+            }
+            for tool in plan_tools(prompt, native_tool_catalog(body))
+        ]
+        completion_tokens = sum(len(tokenize(call["function"]["arguments"])) + 4 for call in tool_calls)
+        cached_tokens = self.prefix_cache.lookup_and_store(json.dumps(body["tools"], sort_keys=True) + prompt)
+        usage = self._usage(json.dumps(body["tools"]) + prompt, completion_tokens, cached_tokens)
+        self.stats.prompt_tokens += usage["prompt_tokens"]
+        self.stats.cached_tokens += usage["prompt_tokens_details"]["cached_tokens"]
+
+        cached_share = usage["prompt_tokens_details"]["cached_tokens"] / usage["prompt_tokens"]
+        await asyncio.sleep(self._ttft("tool_orchestration", cached_share) + sum(self._token_delay() for _ in range(completion_tokens)))
+
+        return {
+            "id": f"chatcmpl-standin-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": None, "tool_calls": tool_calls},
+                "finish_reason": "tool_calls",
+                "logprobs": None,
+            }],
+            "usage": usage,
+        }
+
+    async def _stream(
+            self,
+            completion_id: str,
+            created: int,
+            model: str,
+            agent: str,
+            tokens: List[str],
+            usage: Optional[Dict[str, Any]],
+            cached_share: float
+    ) -> AsyncIterator[str]:
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None, usage: Optional[Dict[str, Any]] = None) -> str:
+            payload: Dict[str, Any] = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [] if usage is not None else [{"index": 0, "delta": delta, "finish_reason": finish_reason, "logprobs": None}],
+            }
+            if usage is not None:
+                payload["usage"] = usage
+            return f"data: {json.dumps(payload)}\n\n"
+
+        await asyncio.sleep(self._ttft(agent, cached_share))
+        yield chunk({"role": "assistant", "content": ""})
+
+        for index, token in enumerate(tokens):
+            if index:
+                await asyncio.sleep(self._token_delay())
+            yield chunk({"content": token})
+
+        yield chunk({}, finish_reason="stop")
+
+        if usage is not None:
+            yield chunk({}, usage=usage)
+
+        yield "data: [DONE]\n\n"
+
+
+def create_app(settings: StandinSettings) -> FastAPI:
+    server = StandinServer(settings)
+    app = FastAPI(title="LLM stand-in")
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        return await server.chat_completions(request)
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model", "owned_by": "standin"}]}
+
+    @app.get("/stats")
+    async def stats():
+        return server.stats.snapshot()
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="realistic")
+    parser.add_argument("--ttft", type=float, default=None, help="Seconds to first token (overrides profile)")
+    parser.add_argument("--tokens-per-second", type=float, default=None, help="Streaming rate, 0 = no delay (overrides profile)")
+    parser.add_argument("--jitter", type=float, default=None, help="Relative +/- jitter on every delay (overrides profile)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429/500")
+    parser.add_argument("--tool-route-rate", type=float, default=0.5, help="Fraction of router decisions that pick tools")
+    parser.add_argument("--chat-sentences", type=int, default=4, help="Length of free-text chat answers")
+    parser.add_argument("--agent-ttft", action="append", default=[], metavar="AGENT=SECONDS",
+                        help="Per-agent TTFT override: router, fused_routing, tool_orchestration, tool_refinement, chat")
+    parser.add_argument("--prefix-cache-speedup", type=float, default=0.5,
+                        help="TTFT reduction at a fully cached prompt prefix (0 = caching does not speed up)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for jitter and error injection")
+    args = parser.parse_args()
+
+    settings = StandinSettings(args)
+    print(f"🧪 LLM stand-in on http://{args.host}:{args.port}/v1 "
+          f"(ttft={settings.ttft}s, {settings.tokens_per_second} tok/s, jitter={settings.jitter}, errors={settings.error_rate})")
+    uvicorn.run(create_app(settings), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
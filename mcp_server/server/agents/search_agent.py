@@ -2,8 +2,8 @@ from typing import Optional
 
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
 
+from common.services.llm_client_registry import llm_registry
 from common.utils.agent_utils import Utils
 from common.utils.validator import validate_query_not_empty
 from mcp_server.server.schemas.search_result import SearchResponse
@@ -39,7 +39,7 @@ class SearchAgent:
         utils = Utils[SearchResponse]
 
         parsed_response: Optional[SearchResponse] = utils.run_agent_query(
-            llm=ChatOpenAI(model="gpt-4o-mini"),
+            llm=llm_registry.get_chat_model(model="gpt-4o-mini"),
             tools=[search_tool()],
             parser=self.parser,
             prompt=self.build_prompt(),
@@ -0,0 +1,34 @@
+import pytest
+
+pytest.importorskip("pydantic")
+
+from app.schemas.tool_invocation import ToolInvocations
+from common.utils.structured_output import parse_structured_output
+
+COMPLETE = '{"tool_name": "a", "input_data": {"q": "x"}, "rank": 1}'
+
+
+@pytest.mark.parametrize("cut", [
+    '{"tool_name": "b", "inp',
+    '{"tool_name": "b", "input_data": {}, "ra',
+    '{"tool_name": "b", "input_data": {"q": "half a val',
+    '{"tool_name": "b", "input_data": {"q": "y"}, "rank":',
+    '{',
+    '',
+])
+def test_truncated_array_element_is_dropped(cut):
+    result = parse_structured_output(f'{{"tools": [{COMPLETE}, {cut}', ToolInvocations)
+
+    assert result is not None
+    assert [tool.tool_name for tool in result.tools] == ["a"]
+
+
+def test_truncation_inside_optional_field_keeps_the_element():
+    text = f'{{"tools": [{COMPLETE}, {{"tool_name": "b", "input_data": {{}}, "rank": 2, "depends_on": [1'
+    result = parse_structured_output(text, ToolInvocations)
+
+    assert [(tool.tool_name, tool.depends_on) for tool in result.tools] == [("a", []), ("b", [1])]
+
+
+def test_well_formed_wrong_shape_is_not_repaired():
+    assert parse_structured_output('{"tools": [{"tool_name": "b"}]}', ToolInvocations) is None
@@ -1,6 +1,7 @@
 import logging
 
 from celery import Celery
+from celery.signals import worker_process_init
 
 from common.services.redis_service import REDIS_URL
 
@@ -14,3 +15,14 @@ worker_app = Celery(
     backend=REDIS_URL,
     broker=REDIS_URL,
 )
+
+
+@worker_process_init.connect
+def warm_up_agents(**kwargs):
+    """Build prompts, parsers and the streaming model client once per worker process, before the first task."""
+    from app.agents.agent_registry import agent_registry
+
+    try:
+        agent_registry.warm_up()
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Agent registry warm-up failed, falling back to lazy build: {e}")
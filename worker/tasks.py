@@ -4,8 +4,12 @@ from worker.config import worker_app
 
 logger = logging.getLogger(__name__)
 
+# Passed by reference through common.utils.context_store when large enough.
+STREAMED_RESPONSE_CONTEXT_FIELDS = ("tool_summaries_str", "chat_history_str", "final_result")
 
-@worker_app.task(name="invoke_unified_stream")
+
+# Nothing reads the return value, so it is not written to the result backend.
+@worker_app.task(name="invoke_unified_stream", ignore_result=True)
 def invoke_streamed_response(
         agent_name: str,
         session_id: str,
@@ -13,10 +17,30 @@ def invoke_streamed_response(
         result_channel: str,
         tool_summaries_str: str,
         chat_history_str: str,
-        final_result: str | None = None
+        final_result: str | None = None,
+        user_id: str | None = None,
+        turn_id: str | None = None,
+        speculative: bool = False
 ) -> bool:
     try:
-        from app.agents.streaming_agent.streaming_agent import streaming_handler
+        from app.agents.streaming_agent.streaming_agent import streaming_handler, _publish_chunk
+        from common.utils.context_store import context_store, ContextMissingError
+
+        try:
+            tool_summaries_str = context_store.resolve(tool_summaries_str)
+            chat_history_str = context_store.resolve(chat_history_str)
+            final_result = context_store.resolve(final_result)
+        except ContextMissingError as e:
+            logger.error(f"Streamed response for {result_channel} lost its context: {e}")
+            _publish_chunk(
+                chunk="",
+                channel=result_channel,
+                agent_name=agent_name,
+                progress="error",
+                session_id=session_id,
+                final_result={"error": str(e)}
+            )
+            return False
 
         return streaming_handler(
             agent_name=agent_name,
@@ -25,7 +49,10 @@ def invoke_streamed_response(
             result_channel=result_channel,
             tool_summaries_str=tool_summaries_str,
             chat_history_str=chat_history_str,
-            final_result=final_result
+            final_result=final_result,
+            user_id=user_id,
+            turn_id=turn_id,
+            speculative=speculative
         )
 
     except Exception as e: